@@ -1,3 +1,4 @@
+import os
 import sys
 import platform
 
@@ -18,10 +19,36 @@ def _warn_if_not_linux() -> None:
             file=sys.stderr,
         )
 
+def _run_async() -> None:
+    import asyncio
+    from bot.async_dispatcher import AsyncDispatcher
+    from bot.async_long_polling import startAsyncLongPolling
+
+    from bot.handlers import getAsyncHandlers
+
+    dispatcher = AsyncDispatcher()
+    dispatcher.addHandlers(*getAsyncHandlers())
+    asyncio.run(startAsyncLongPolling(dispatcher))
+
 if __name__ == "__main__":
+    # LNH_MODE: polling (по умолчанию, потоки) | async (asyncio event loop) | webhook
+    mode = (os.getenv("LNH_MODE") or "polling").strip().lower()
     try:
-        dispatcher = Dispatcher()
-        dispatcher.addHandlers(*getHandlers())
-        startLongPolling(dispatcher)
+        if mode == "async":
+            _run_async()
+        elif mode == "webhook":
+            from bot.webhook import startWebhook
+            dispatcher = Dispatcher()
+            dispatcher.addHandlers(*getHandlers())
+            startWebhook(dispatcher)
+        else:
+            dispatcher = Dispatcher()
+            dispatcher.addHandlers(*getHandlers())
+            startLongPolling(dispatcher)
     except KeyboardInterrupt:
-        print("\nbb")
\ No newline at end of file
+        print("\nbb")
+    finally:
+        from bot.update_journal import closeJournal
+        from bot.db_client import closeConnections
+        closeJournal()
+        closeConnections()
\ No newline at end of file
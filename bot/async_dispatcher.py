@@ -0,0 +1,42 @@
+from __future__ import annotations
+import asyncio
+import traceback
+
+from bot.handlers.handler import Handler
+from bot.handlers.async_handler import AsyncHandler, SyncHandlerAdapter
+from bot.handlers.handler_status import HandlerStatus
+from bot.router import Router
+from bot.user_context import UserContext
+from bot.dispatcher import getTelegramId
+
+class AsyncDispatcher:
+    """
+    Dispatcher для asyncio-режима. Принимает как AsyncHandler, так и обычные Handler —
+    последние оборачиваются в SyncHandlerAdapter и выполняются в пуле потоков.
+    """
+
+    def __init__(self) -> None:
+        self._handlers: list[AsyncHandler] = []
+        self._router = Router(self._handlers)
+
+    def addHandlers(self, *handlers: Handler | AsyncHandler) -> None:
+        for h in handlers:
+            self._handlers.append(h if isinstance(h, AsyncHandler) else SyncHandlerAdapter(h))
+        self._router = Router(self._handlers)
+
+    async def dispatch(self, update: dict) -> None:
+        # sqlite3 блокирующий — читаем и пишем пользователя вне event loop
+        ctx = await asyncio.to_thread(UserContext.load, getTelegramId(update))
+        try:
+            for handler in self._router.candidates(update, ctx):
+                if await handler.canHandle(update, ctx):
+                    try:
+                        res = await handler.handle(update, ctx)
+                    except Exception:
+                        traceback.print_exc()
+                        break
+
+                    if res is False or res == HandlerStatus.STOP:
+                        break
+        finally:
+            await asyncio.to_thread(ctx.flush)
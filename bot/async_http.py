@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import asyncio
+import ssl
+import time
+from urllib.parse import urlsplit
+
+# ошибки, по которым переиспользованное keep-alive соединение считаем «протухшим»
+_STALE_ERRORS = (
+    asyncio.IncompleteReadError,
+    ConnectionResetError,
+    BrokenPipeError,
+    ConnectionAbortedError,
+)
+
+
+class _Conn:
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.last_used = time.monotonic()
+
+    def close(self) -> None:
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class AsyncHttpPool:
+    """
+    Асинхронный аналог HttpPool: пул keep-alive HTTP/1.1 соединений к одному хосту
+    поверх asyncio streams. Поддерживает ответы с Content-Length и chunked.
+    """
+
+    def __init__(self, base_url: str, max_size: int = 16, idle_timeout: float = 60.0, timeout: float = 30.0) -> None:
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported base url: {base_url!r}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._ssl = ssl.create_default_context() if self.scheme == "https" else None
+        self._slots = asyncio.Semaphore(max(1, int(max_size)))
+        self._idle: list[_Conn] = []
+
+    async def _checkout(self) -> tuple[_Conn, bool]:
+        now = time.monotonic()
+        while self._idle:
+            conn = self._idle.pop()
+            if now - conn.last_used > self.idle_timeout or conn.reader.at_eof():
+                conn.close()
+                continue
+            return conn, True
+        return await self._connect(), False
+
+    async def _connect(self) -> _Conn:
+        reader, writer = await asyncio.open_connection(
+            self.host, self.port, ssl=self._ssl,
+            server_hostname=self.host if self._ssl else None,
+        )
+        return _Conn(reader, writer)
+
+    def _checkin(self, conn: _Conn) -> None:
+        conn.last_used = time.monotonic()
+        self._idle.append(conn)
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        body: bytes | None = None,
+        headers: dict | None = None,
+        timeout: float | None = None,
+    ) -> tuple[int, bytes]:
+        timeout = self.timeout if timeout is None else timeout
+        async with self._slots:
+            return await asyncio.wait_for(self._request(method, path, body, headers), timeout=timeout)
+
+    async def _request(self, method: str, path: str, body: bytes | None, headers: dict | None) -> tuple[int, bytes]:
+        body = body or b""
+        hdrs = {
+            "Host": self.host if self.port in (80, 443) else f"{self.host}:{self.port}",
+            "Connection": "keep-alive",
+            "Content-Length": str(len(body)),
+        }
+        if headers:
+            hdrs.update(headers)
+        head = f"{method} {self.base_path}{path} HTTP/1.1\r\n" + "".join(
+            f"{k}: {v}\r\n" for k, v in hdrs.items()
+        ) + "\r\n"
+
+        conn, reused = await self._checkout()
+        while True:
+            try:
+                conn.writer.write(head.encode("latin-1") + body)
+                await conn.writer.drain()
+                status, keep_alive, data = await self._read_response(conn.reader)
+            except _STALE_ERRORS:
+                conn.close()
+                if not reused:
+                    raise
+                conn, reused = await self._connect(), False
+                continue
+            except BaseException:
+                conn.close()
+                raise
+            if keep_alive:
+                self._checkin(conn)
+            else:
+                conn.close()
+            return status, data
+
+    @staticmethod
+    async def _read_response(reader: asyncio.StreamReader) -> tuple[int, bool, bytes]:
+        status_line = await reader.readuntil(b"\r\n")
+        parts = status_line.decode("latin-1").split(" ", 2)
+        version, status = parts[0], int(parts[1])
+
+        headers: dict[str, str] = {}
+        while True:
+            line = await reader.readuntil(b"\r\n")
+            if line == b"\r\n":
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+
+        keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            chunks = []
+            while True:
+                size_line = await reader.readuntil(b"\r\n")
+                size = int(size_line.split(b";", 1)[0].strip(), 16)
+                if size == 0:
+                    # trailer-заголовки до пустой строки
+                    while (await reader.readuntil(b"\r\n")) != b"\r\n":
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            return status, keep_alive, b"".join(chunks)
+        if "content-length" in headers:
+            return status, keep_alive, await reader.readexactly(int(headers["content-length"]))
+        # ни длины, ни chunked — тело до закрытия соединения
+        return status, False, await reader.read()
+
+    async def close(self) -> None:
+        idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
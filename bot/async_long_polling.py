@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import traceback
+from collections import deque
+from typing import Hashable
+
+from bot.async_dispatcher import AsyncDispatcher
+from bot.dispatcher import getTelegramId
+from bot.long_polling import POLL_LIMIT, POLL_QUEUE_SIZE
+from bot.worker_pool import OffsetTracker
+import bot.async_telegram_client
+
+ASYNC_CONCURRENCY = int(os.getenv("LNH_ASYNC_CONCURRENCY") or 256)
+
+
+class _KeyedRunner:
+    """
+    asyncio-аналог KeyedWorkerPool: апдейты разных ключей выполняются конкурентно
+    (не более `concurrency` одновременно), одного ключа — строго по порядку.
+    """
+
+    def __init__(self, dispatcher: AsyncDispatcher, concurrency: int, queue_size: int, tracker: OffsetTracker) -> None:
+        self._dispatcher = dispatcher
+        self._tracker = tracker
+        self._running = asyncio.Semaphore(max(1, concurrency))
+        self._slots = asyncio.Semaphore(max(1, queue_size))
+        self._pending: dict[Hashable, deque[dict]] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self.progress = asyncio.Event()
+
+    async def submit(self, key: Hashable, upd: dict) -> None:
+        await self._slots.acquire()
+        q = self._pending.get(key)
+        if q is not None:
+            q.append(upd)
+            return
+        self._pending[key] = deque([upd])
+        task = asyncio.create_task(self._drain(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _drain(self, key: Hashable) -> None:
+        q = self._pending[key]
+        while q:
+            upd = q[0]
+            try:
+                async with self._running:
+                    await self._dispatcher.dispatch(upd)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                q.popleft()
+                self._slots.release()
+                self._tracker.markDone(upd["update_id"])
+                self.progress.set()
+        del self._pending[key]
+
+    async def close(self) -> None:
+        for t in list(self._tasks):
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+
+async def startAsyncLongPolling(dispatcher: AsyncDispatcher, concurrency: int | None = None, queue_size: int | None = None) -> None:
+    """
+    Long polling в event loop: getUpdates, dispatch и запросы к Telegram — корутины.
+    Семантика offset та же, что у потокового режима (см. long_polling._poll_with_pool).
+    """
+    concurrency = ASYNC_CONCURRENCY if concurrency is None else concurrency
+    queue_size = POLL_QUEUE_SIZE if queue_size is None else queue_size
+    tracker = OffsetTracker()
+    runner = _KeyedRunner(dispatcher, concurrency, queue_size, tracker)
+    try:
+        while True:
+            try:
+                updates = await bot.async_telegram_client.getUpdates(
+                    offset=tracker.committed(POLL_LIMIT), timeout=50, limit=POLL_LIMIT
+                )
+            except Exception as e:
+                logging.warning("getUpdates failed: %s", e)
+                await asyncio.sleep(2)
+                continue
+
+            fresh = [u for u in updates if tracker.isNew(u["update_id"])]
+            if updates and not fresh:
+                runner.progress.clear()
+                try:
+                    await asyncio.wait_for(runner.progress.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            for upd in fresh:
+                tracker.markSeen(upd["update_id"])
+                key = getTelegramId(upd) or ("update", upd["update_id"])
+                await runner.submit(key, upd)
+    finally:
+        await runner.close()
+        await bot.async_telegram_client.close()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+
+from bot.async_http import AsyncHttpPool
+from bot.outbound import MAX_RETRIES, MAX_RETRY_AFTER, PRIORITY_INTERACTIVE, PRIORITY_PROGRESS, getScheduler
+from bot.telegram_client import HTTP_IDLE_TIMEOUT, HTTP_POOL_SIZE, TelegramAPIError, apiError, isBenignEditError
+
+_pool: AsyncHttpPool | None = None
+
+def _getPool() -> AsyncHttpPool:
+    # пул привязан к event loop, в котором создан; у бота он один на процесс
+    global _pool
+    if _pool is None:
+        _pool = AsyncHttpPool(
+            os.getenv("TELEGRAM_BASE_URI") or "",
+            max_size=HTTP_POOL_SIZE,
+            idle_timeout=HTTP_IDLE_TIMEOUT,
+        )
+    return _pool
+
+async def makeRequest(method: str, **param) -> dict:
+    # 429: ждём retry_after в event loop и повторяем
+    attempt = 0
+    while True:
+        try:
+            return await _makeRequest(method, **param)
+        except TelegramAPIError as e:
+            if e.retry_after is None or attempt >= MAX_RETRIES:
+                raise
+            attempt += 1
+            await asyncio.sleep(min(float(e.retry_after), MAX_RETRY_AFTER))
+
+async def _makeRequest(method: str, **param) -> dict:
+    json_data = json.dumps(param).encode("utf-8")
+    timeout = 30.0
+    if method == "getUpdates" and param.get("timeout"):
+        timeout = max(timeout, float(param["timeout"]) + 10)
+    try:
+        _status, raw = await _getPool().request(
+            "POST", f"/{method}",
+            body=json_data,
+            headers={"Content-Type": "application/json"},
+            timeout=timeout,
+        )
+        body = raw.decode("utf-8")
+        data = json.loads(body)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        raise RuntimeError(f"HTTP error calling {method}: {e}") from e
+
+    if not isinstance(data, dict) or not data.get("ok"):
+        raise apiError(method, body, data)
+
+    return data["result"]
+
+async def getUpdates(**params) -> list[dict]:
+    return await makeRequest("getUpdates", **params)
+
+# отправки в чат — через тот же OutboundScheduler, что и в потоковом режиме: общие лимиты и повтор после 429
+async def _scheduled(chat_id: int, method: str, priority: int, **payload) -> dict:
+    return await getScheduler().callAsync(chat_id, lambda: _makeRequest(method, chat_id=chat_id, **payload), priority)
+
+async def sendMessage(chat_id: int, text: str, reply_markup: dict | None = None, parse_mode: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    payload = {"text": text}
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
+    return await _scheduled(chat_id, "sendMessage", priority, **payload)
+
+async def editMessageText(chat_id: int, message_id: int, text: str, reply_markup: dict | None = None, parse_mode: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    payload = {"message_id": message_id, "text": text}
+    if reply_markup:
+        payload["reply_markup"] = reply_markup
+    if parse_mode:
+        payload["parse_mode"] = parse_mode
+    return await _scheduled(chat_id, "editMessageText", priority, **payload)
+
+async def answerCallbackQuery(callback_query_id: str, **kwargs) -> dict:
+    return await makeRequest("answerCallbackQuery", callback_query_id=callback_query_id, **kwargs)
+
+async def sendChatAction(chat_id: int, action: str = "typing") -> dict:
+    return await _scheduled(chat_id, "sendChatAction", PRIORITY_PROGRESS, action=action)
+
+async def safe_edit_message_text(chat_id: int, message_id: int, *, text: str, reply_markup: dict | None = None, parse_mode: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> bool:
+    try:
+        await editMessageText(chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode, priority=priority)
+        return True
+    except RuntimeError as e:
+        if isBenignEditError(e):
+            return False
+        raise
+
+async def close() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
@@ -1,56 +1,204 @@
-import os, json, sqlite3
+import os, json, sqlite3, threading
 from dotenv import load_dotenv
+
+from bot.user_cache import UserCache, MISSING
+
 load_dotenv()
 
 DB_PATH = os.getenv("SQLITE_DB_PATH")
 if not DB_PATH:
     raise RuntimeError("SQLITE_DB_PATH is not set")
 
+SQLITE_CACHE_KB = int(os.getenv("LNH_SQLITE_CACHE_KB") or 8192)
+SQLITE_MMAP_BYTES = int(os.getenv("LNH_SQLITE_MMAP_BYTES") or 64 * 1024 * 1024)
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("LNH_SQLITE_BUSY_TIMEOUT_MS") or 5000)
+SQLITE_STATEMENT_CACHE = 128
+
+USER_CACHE_SIZE = int(os.getenv("LNH_USER_CACHE_SIZE") or 10000)
+USER_CACHE_TTL = float(os.getenv("LNH_USER_CACHE_TTL") or 300)
+
+# write-through кэш users: чтения из памяти, записи сначала в SQLite, затем в кэш
+_user_cache = UserCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+# Одно постоянное соединение на поток: sqlite3-соединение нельзя делить между потоками,
+# а открывать новое на каждый запрос — это открытие файла, разбор схемы и PRAGMA каждый раз.
+_local = threading.local()
+_connections: list[tuple[threading.Thread, sqlite3.Connection]] = []
+_connections_lock = threading.Lock()
+
+# таблицы, добавленные после первых релизов: создаются и в уже существующей базе
+# при первом подключении процесса, без ручного recreate_database
+_MIGRATIONS = """
+    -- кэш результатов net_tools (WHOIS, RDAP, TLS): value — JSON, время — unix
+    CREATE TABLE IF NOT EXISTS result_cache (
+        tool       TEXT NOT NULL,
+        key        TEXT NOT NULL,
+        value      TEXT NOT NULL,
+        stored_at  REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        PRIMARY KEY (tool, key)
+    );
+
+    CREATE INDEX IF NOT EXISTS idx_result_cache_expires ON result_cache(expires_at);
+"""
+_migrated = False
+
+def _migrate(con: sqlite3.Connection) -> None:
+    global _migrated
+    with _connections_lock:
+        if _migrated:
+            return
+        con.executescript(_MIGRATIONS)
+        _migrated = True
+
+def _configure(con: sqlite3.Connection) -> None:
+    con.execute("PRAGMA journal_mode=WAL;")
+    con.execute("PRAGMA synchronous=NORMAL;")
+    con.execute("PRAGMA foreign_keys=ON;")
+    con.execute("PRAGMA temp_store=MEMORY;")
+    con.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS};")
+    con.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB};")
+    con.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES};")
+
+def _connection() -> sqlite3.Connection:
+    con = getattr(_local, "con", None)
+    if con is not None:
+        return con
+    # check_same_thread=False только ради закрытия из другого потока (closeConnections);
+    # запросы по соединению выполняет лишь поток-владелец
+    con = sqlite3.connect(
+        DB_PATH,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+        check_same_thread=False,
+    )
+    _configure(con)
+    _migrate(con)
+    _local.con = con
+    with _connections_lock:
+        # соединения завершившихся потоков закрываем здесь же
+        alive = []
+        for t, c in _connections:
+            if t.is_alive():
+                alive.append((t, c))
+            else:
+                c.close()
+        alive.append((threading.current_thread(), con))
+        _connections[:] = alive
+    return con
+
+def closeConnections() -> None:
+    """Закрывает все соединения (при остановке бота)."""
+    with _connections_lock:
+        conns, _connections[:] = list(_connections), []
+    for _t, c in conns:
+        c.close()
+    _local.con = None
+
+def userCacheStats() -> dict:
+    return _user_cache.stats()
+
 def getUser(telegram_id: int) -> dict | None:
-    with sqlite3.connect(DB_PATH) as con:
-        cur = con.execute(
-            "SELECT telegram_id, state, data FROM users WHERE telegram_id = ?",
-            (telegram_id,),
-        )
-        row = cur.fetchone()
-        if not row:
-            return None
-        # data в БД хранится как JSON-строка; здесь всегда возвращаем dict
-        raw = row[2] or "{}"
-        try:
-            data = json.loads(raw) if isinstance(raw, str) else (raw or {})
-        except Exception:
-            data = {}
-        return {"telegram_id": row[0], "state": row[1] or "", "data": data}
+    cached = _user_cache.get(telegram_id)
+    if cached is not MISSING:
+        return cached
+    user = _loadUser(telegram_id)
+    _user_cache.put(telegram_id, user)
+    return user
+
+def _loadUser(telegram_id: int) -> dict | None:
+    cur = _connection().execute(
+        "SELECT telegram_id, state, data FROM users WHERE telegram_id = ?",
+        (telegram_id,),
+    )
+    row = cur.fetchone()
+    if not row:
+        return None
+    # data в БД хранится как JSON-строка; здесь всегда возвращаем dict
+    raw = row[2] or "{}"
+    try:
+        data = json.loads(raw) if isinstance(raw, str) else (raw or {})
+    except Exception:
+        data = {}
+    return {"telegram_id": row[0], "state": row[1] or "", "data": data}
 
 def ensureUserExists(telegram_id: int) -> None:
-    with sqlite3.connect(DB_PATH) as con:
+    if _user_cache.isKnown(telegram_id):
+        return
+    with _connection() as con:
         con.execute(
             "INSERT OR IGNORE INTO users (telegram_id, state, data) VALUES (?, '', '{}')",
             (telegram_id,),
         )
-        con.commit()
+    _user_cache.invalidate(telegram_id)
 
 def setUserState(telegram_id: int, state: str) -> None:
-    with sqlite3.connect(DB_PATH) as con:
+    with _connection() as con:
         con.execute("UPDATE users SET state = ? WHERE telegram_id = ?", (state, telegram_id))
-        con.commit()
+    _user_cache.update(telegram_id, state=state)
 
 def setUserData(telegram_id: int, data: dict) -> None:
-    with sqlite3.connect(DB_PATH) as con:
+    with _connection() as con:
         con.execute(
             "UPDATE users SET data = ? WHERE telegram_id = ?",
             (json.dumps(data, ensure_ascii=False), telegram_id),
         )
-        con.commit()
+    _user_cache.update(telegram_id, data=data)
+
+def clearUserState(telegram_id: int, expected: str) -> bool:
+    """Сбрасывает state в '', только если он всё ещё expected: фоновая задача не затирает новый режим пользователя."""
+    with _connection() as con:
+        cur = con.execute("UPDATE users SET state = '' WHERE telegram_id = ? AND state = ?", (telegram_id, expected))
+    if cur.rowcount:
+        _user_cache.update(telegram_id, state="")
+    return cur.rowcount > 0
+
+def saveUser(telegram_id: int, state: str, data: dict) -> None:
+    """Создаёт пользователя или обновляет state и data одной транзакцией."""
+    with _connection() as con:
+        con.execute(
+            "INSERT INTO users (telegram_id, state, data) VALUES (?, ?, ?) "
+            "ON CONFLICT(telegram_id) DO UPDATE SET state = excluded.state, data = excluded.data",
+            (telegram_id, state, json.dumps(data, ensure_ascii=False)),
+        )
+    _user_cache.put(telegram_id, {"telegram_id": telegram_id, "state": state, "data": data})
 
 def persistUpdates(updates) -> None:
     if isinstance(updates, dict):
         updates = [updates]
     rows = [(json.dumps(u, ensure_ascii=False),) for u in updates]
-    with sqlite3.connect(DB_PATH) as con:
+    with _connection() as con:
         con.executemany("INSERT INTO telegram_updates (payload) VALUES (?)", rows)
-        con.commit()
+
+def getCachedResult(tool: str, key: str, now: float) -> tuple[str, float, float] | None:
+    """(JSON результата, stored_at, expires_at) из result_cache; просроченные не возвращаются."""
+    cur = _connection().execute(
+        "SELECT value, stored_at, expires_at FROM result_cache WHERE tool = ? AND key = ? AND expires_at > ?",
+        (tool, key, now),
+    )
+    return cur.fetchone()
+
+def putCachedResult(tool: str, key: str, value: str, stored_at: float, expires_at: float) -> None:
+    with _connection() as con:
+        con.execute(
+            "INSERT INTO result_cache (tool, key, value, stored_at, expires_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(tool, key) DO UPDATE SET value = excluded.value, "
+            "stored_at = excluded.stored_at, expires_at = excluded.expires_at",
+            (tool, key, value, stored_at, expires_at),
+        )
+
+def pruneCachedResults(now: float, max_rows: int) -> int:
+    """Удаляет просроченные записи result_cache и, сверх max_rows, ближайшие к истечению. Возвращает число удалённых."""
+    with _connection() as con:
+        deleted = con.execute("DELETE FROM result_cache WHERE expires_at <= ?", (now,)).rowcount
+        extra = con.execute("SELECT COUNT(*) FROM result_cache").fetchone()[0] - max_rows
+        if extra > 0:
+            deleted += con.execute(
+                "DELETE FROM result_cache WHERE rowid IN "
+                "(SELECT rowid FROM result_cache ORDER BY expires_at LIMIT ?)",
+                (extra,),
+            ).rowcount
+    return deleted
 
 def recreateDatabase(drop_existing: bool = False) -> None:
     import pathlib
@@ -86,5 +234,6 @@ def recreateDatabase(drop_existing: bool = False) -> None:
             CREATE INDEX IF NOT EXISTS idx_users_state ON users(state);
             """
         )
+        cur.executescript(_MIGRATIONS)
 
         con.commit()
\ No newline at end of file
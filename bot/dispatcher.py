@@ -1,42 +1,50 @@
 from __future__ import annotations
-import json
 import traceback
 
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
-from bot.db_client import getUser
+from bot.router import Router
+from bot.user_context import UserContext
+
+def getTelegramId(update: dict) -> int | None:
+    if "message" in update:
+        return update["message"]["from"]["id"]
+    if "callback_query" in update:
+        return update["callback_query"]["from"]["id"]
+    return None
 
 class Dispatcher:
     def __init__(self) -> None:
         self._handlers: list[Handler] = []
+        self._router = Router(self._handlers)
 
     def _get_telegram_id_from_update(self, update: dict) -> int | None:
-        if "message" in update:
-            return update["message"]["from"]["id"]
-        if "callback_query" in update:
-            return update["callback_query"]["from"]["id"]
-        return None
+        return getTelegramId(update)
 
     def addHandlers(self, *handlers: Handler) -> None:
         self._handlers.extend(handlers)
+        self._router = Router(self._handlers)
 
     def dispatch(self, update: dict) -> None:
-        telegram_id = self._get_telegram_id_from_update(update)
-        user = getUser(telegram_id) if telegram_id else None
-        state = (user.get("state") if user else "") or ""
-        data_raw = user.get("data") if user else None
+        ctx = UserContext.load(self._get_telegram_id_from_update(update))
         try:
-            user_data = json.loads(data_raw) if isinstance(data_raw, str) and data_raw else (data_raw or {})
-        except Exception:
-            user_data = {}
-
-        for handler in self._handlers:
-            if handler.canHandle(update):
-                try:
-                    res = handler.handle(update, state, user_data)
-                except Exception:
-                    traceback.print_exc()
-                    break
-
-                if res is False or res == HandlerStatus.STOP:
-                    break
\ No newline at end of file
+            for handler in self._router.candidates(update, ctx):
+                if handler.canHandle(update, ctx):
+                    try:
+                        res = handler.handle(update, ctx)
+                    except Exception:
+                        traceback.print_exc()
+                        break
+
+                    if res is False or res == HandlerStatus.STOP:
+                        break
+        finally:
+            # все изменения пользователя за апдейт — одной транзакцией
+            ctx.flush()
+
+def dispatchSafe(dispatcher: Dispatcher, update: dict) -> None:
+    """dispatch() для воркеров приёма апдейтов: исключение печатается и не роняет воркер."""
+    try:
+        dispatcher.dispatch(update)
+    except Exception:
+        traceback.print_exc()
@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from bot import async_telegram_client, telegram_client
+from bot.outbound import PRIORITY_INTERACTIVE, PRIORITY_PROGRESS
+
+EDIT_MIN_INTERVAL = float(os.getenv("LNH_EDIT_MIN_INTERVAL") or 1.0)  # секунд между правками одного сообщения
+
+
+class EditCoalescer:
+    """
+    «Живое» сообщение с прогрессом. update() только запоминает новый текст и сразу возвращается —
+    его можно звать из любого потока и сколь угодно часто. Фоновый поток правит сообщение
+    последней версией текста не чаще min_interval; промежуточные версии выбрасываются,
+    текст, совпадающий с уже показанным, не отправляется. finish() ставит итоговый текст.
+    """
+
+    def __init__(self, chat_id: int, message_id: int, parse_mode: str | None = None,
+                 min_interval: float = EDIT_MIN_INTERVAL) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.parse_mode = parse_mode
+        self.min_interval = min_interval
+
+        self._cond = threading.Condition()
+        self._pending: str | None = None
+        self._shown: str | None = None
+        self._last_edit = 0.0
+        self._closed = False
+        self._thread: threading.Thread | None = None
+        self.edits = 0
+        self.skipped = 0
+
+    def update(self, text: str) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            if self._pending is not None:
+                self.skipped += 1
+            self._pending = text
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="edit-coalescer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and (
+                    self._pending is None or time.monotonic() - self._last_edit < self.min_interval
+                ):
+                    wait = None if self._pending is None else self.min_interval - (time.monotonic() - self._last_edit)
+                    self._cond.wait(wait)
+                if self._closed:
+                    return
+                text, self._pending = self._pending, None
+                if text == self._shown:
+                    self.skipped += 1
+                    continue
+                self._last_edit = time.monotonic()
+            try:
+                telegram_client.safe_edit_message_text(
+                    chat_id=self.chat_id, message_id=self.message_id, text=text,
+                    parse_mode=self.parse_mode, priority=PRIORITY_PROGRESS,
+                )
+                with self._cond:
+                    self._shown = text
+                    self.edits += 1
+            except Exception:
+                logging.exception("progress edit failed")
+
+    def finish(self, text: str, reply_markup: dict | None = None) -> bool:
+        """
+        Останавливает промежуточные правки и ставит итоговый текст (с приоритетом ответа).
+        Возвращает результат safe_edit_message_text: False — сообщение не изменилось.
+        """
+        with self._cond:
+            self._closed = True
+            self._pending = None
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+        if text == self._shown and reply_markup is None:
+            return True
+        return telegram_client.safe_edit_message_text(
+            chat_id=self.chat_id, message_id=self.message_id, text=text,
+            reply_markup=reply_markup, parse_mode=self.parse_mode, priority=PRIORITY_INTERACTIVE,
+        )
+
+
+class AsyncEditCoalescer:
+    """
+    EditCoalescer для event loop: те же правила, вместо фонового потока — задача loop.
+    update() и finish() — только из потока event loop (из другого потока — через call_soon_threadsafe).
+    """
+
+    def __init__(self, chat_id: int, message_id: int, parse_mode: str | None = None,
+                 min_interval: float = EDIT_MIN_INTERVAL) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.parse_mode = parse_mode
+        self.min_interval = min_interval
+
+        self._wake = asyncio.Event()
+        self._pending: str | None = None
+        self._shown: str | None = None
+        self._last_edit = 0.0
+        self._closed = False
+        self._task: asyncio.Task | None = None
+        self.edits = 0
+        self.skipped = 0
+
+    def update(self, text: str) -> None:
+        if self._closed:
+            return
+        if self._pending is not None:
+            self.skipped += 1
+        self._pending = text
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._wake.set()
+
+    async def _run(self) -> None:
+        while True:
+            while not self._closed and (
+                self._pending is None or time.monotonic() - self._last_edit < self.min_interval
+            ):
+                wait = None if self._pending is None else self.min_interval - (time.monotonic() - self._last_edit)
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+            if self._closed:
+                return
+            text, self._pending = self._pending, None
+            if text == self._shown:
+                self.skipped += 1
+                continue
+            self._last_edit = time.monotonic()
+            try:
+                await async_telegram_client.safe_edit_message_text(
+                    chat_id=self.chat_id, message_id=self.message_id, text=text,
+                    parse_mode=self.parse_mode, priority=PRIORITY_PROGRESS,
+                )
+                self._shown = text
+                self.edits += 1
+            except Exception:
+                logging.exception("progress edit failed")
+
+    async def finish(self, text: str, reply_markup: dict | None = None) -> bool:
+        """Как EditCoalescer.finish(): дожидается начатой правки и ставит итоговый текст."""
+        self._closed = True
+        self._pending = None
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+        if text == self._shown and reply_markup is None:
+            return True
+        return await async_telegram_client.safe_edit_message_text(
+            chat_id=self.chat_id, message_id=self.message_id, text=text,
+            reply_markup=reply_markup, parse_mode=self.parse_mode, priority=PRIORITY_INTERACTIVE,
+        )
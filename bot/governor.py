@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Callable, Iterator
+
+# сколько запусков каждого инструмента допускается одновременно на весь бот
+TOOL_LIMITS = {
+    "ping": int(os.getenv("LNH_LIMIT_PING") or 16),
+    "dns": int(os.getenv("LNH_LIMIT_DNS") or 64),
+    "whois": int(os.getenv("LNH_LIMIT_WHOIS") or 8),
+    "tls": int(os.getenv("LNH_LIMIT_TLS") or 16),
+}
+QUEUE_MAX_WAIT = float(os.getenv("LNH_QUEUE_MAX_WAIT") or 60)   # секунд в очереди, дальше задача снимается
+QUEUE_MAX_SIZE = int(os.getenv("LNH_QUEUE_MAX_SIZE") or 500)    # ожидающих на инструмент
+
+
+class Overloaded(RuntimeError):
+    """Задача не допущена: очередь переполнена или ждала дольше max_wait."""
+
+
+class _Ticket:
+    __slots__ = ("user_id", "deadline", "admitted", "shed")
+
+    def __init__(self, user_id: int, deadline: float) -> None:
+        self.user_id = user_id
+        self.deadline = deadline
+        self.admitted = False
+        self.shed = False
+
+
+class ToolGovernor:
+    """
+    Допуск к дорогому инструменту (ping, TLS, WHOIS…): не больше limit запусков одновременно.
+    Ожидающие стоят в FIFO-очереди своего пользователя, свободный слот достаётся пользователям
+    по кругу — пакетная задача одного не задерживает одиночные запросы остальных.
+    Ждавшие дольше max_wait снимаются с очереди (acquire() -> False).
+    """
+
+    def __init__(self, name: str, limit: int, max_wait: float = QUEUE_MAX_WAIT, max_queue: int = QUEUE_MAX_SIZE) -> None:
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+
+        self._cond = threading.Condition()
+        self._running = 0
+        self._queued = 0
+        # очередь каждого пользователя; порядок ключей — порядок обхода по кругу
+        self._queues: OrderedDict[int, deque[_Ticket]] = OrderedDict()
+        self.admitted = 0
+        self.shed = 0
+
+    def _admit(self) -> None:
+        while self._running < self.limit and self._queues:
+            user_id, q = next(iter(self._queues.items()))
+            t = q.popleft()
+            if q:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            t.admitted = True
+            self._running += 1
+            self._queued -= 1
+        self._cond.notify_all()
+
+    def _shed_stale(self, now: float) -> None:
+        shed = 0
+        for user_id in list(self._queues):
+            q = self._queues[user_id]
+            while q and q[0].deadline <= now:
+                q.popleft().shed = True
+                shed += 1
+            if not q:
+                del self._queues[user_id]
+        if shed:
+            self._queued -= shed
+            self.shed += shed
+            self._cond.notify_all()  # места в очереди сдвинулись
+
+    def _position(self, t: _Ticket) -> int:
+        """Место в очереди (1 — следующий) с учётом обхода пользователей по кругу."""
+        q = self._queues[t.user_id]
+        k = q.index(t)
+        ahead = k
+        before = True  # пользователи до t.user_id в порядке обхода получат слот раньше на своём круге
+        for user_id, other in self._queues.items():
+            if user_id == t.user_id:
+                before = False
+                continue
+            ahead += min(len(other), k + 1 if before else k)
+        return ahead + 1
+
+    def _admitNow(self) -> bool:
+        """Слот без очереди, если он свободен и никто не ждёт. Вызывается под self._cond."""
+        if self._running < self.limit and not self._queues:
+            self._running += 1
+            self.admitted += 1
+            return True
+        return False
+
+    def acquire(self, user_id: int, on_position: Callable[[int], None] | None = None) -> bool:
+        """
+        Ждёт слот. on_position(n) вызывается в этом же потоке, пока задача в очереди,
+        при каждом изменении места. False — задача снята (перегрузка).
+        """
+        with self._cond:
+            if self._admitNow():
+                return True
+            if self._queued >= self.max_queue:
+                self.shed += 1
+                return False
+            t = _Ticket(user_id, time.monotonic() + self.max_wait)
+            self._queues.setdefault(user_id, deque()).append(t)
+            self._queued += 1
+
+        shown = None
+        while True:
+            with self._cond:
+                self._shed_stale(time.monotonic())
+                if t.admitted:
+                    self.admitted += 1
+                    return True
+                if t.shed:
+                    return False
+                pos = self._position(t)
+                if pos == shown:
+                    self._cond.wait(max(0.0, t.deadline - time.monotonic()))
+                    continue
+            shown = pos
+            if on_position:
+                try:
+                    on_position(pos)
+                except Exception:
+                    logging.exception("%s queue position callback failed", self.name)
+
+    def release(self) -> None:
+        with self._cond:
+            self._running -= 1
+            self._admit()
+
+    @contextmanager
+    def slot(self, user_id: int, on_position: Callable[[int], None] | None = None) -> Iterator[None]:
+        if not self.acquire(user_id, on_position):
+            raise Overloaded("сервис перегружен, попробуйте через минуту")
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def slotAsync(self, user_id: int, on_position: Callable[[int], None] | None = None) -> AsyncIterator[None]:
+        """
+        slot() для event loop: свободный слот берётся сразу, ожидание в очереди — в потоке.
+        on_position вызывается из этого потока, не из event loop.
+        """
+        with self._cond:
+            ok = self._admitNow()
+        if not ok and not await asyncio.to_thread(self.acquire, user_id, on_position):
+            raise Overloaded("сервис перегружен, попробуйте через минуту")
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "running": self._running,
+                "queued": self._queued,
+                "limit": self.limit,
+                "admitted": self.admitted,
+                "shed": self.shed,
+            }
+
+
+_governors: dict[str, ToolGovernor] = {}
+_governors_lock = threading.Lock()
+
+def getGovernor(tool: str) -> ToolGovernor:
+    g = _governors.get(tool)
+    if g is None:
+        with _governors_lock:
+            g = _governors.get(tool)
+            if g is None:
+                g = _governors[tool] = ToolGovernor(tool, TOOL_LIMITS.get(tool, 16))
+    return g
+
+def governorStats() -> dict[str, dict]:
+    return {name: g.stats() for name, g in list(_governors.items())}
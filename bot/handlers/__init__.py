@@ -1,9 +1,10 @@
 from bot.handlers.handler import Handler
+from bot.handlers.async_handler import AsyncHandler
 from bot.handlers.ensure_user_exists import EnsureUserExists
 from bot.handlers.db_handler import UpdateDB
 from bot.handlers.menu_handler import MessageMenu
 from bot.handlers.ping_handler import MessagePing
-from bot.handlers.dns_handler import MessageDNS
+from bot.handlers.dns_handler import AsyncMessageDNS, MessageDNS
 from bot.handlers.whois_handler import MessageWhois
 from bot.handlers.tls_handler import MessageTLS
 from bot.handlers.myip_handler import MessageMyIP
@@ -19,4 +20,9 @@ def getHandlers() -> list[Handler]:
         MessageMyIP(),
         MessageTLS(),
         MessagePing(),
-    ]
\ No newline at end of file
+    ]
+
+
+def getAsyncHandlers() -> list[Handler | AsyncHandler]:
+    """Для asyncio-режима: хэндлеры, переведённые на AsyncHandler, заменяют свои синхронные версии."""
+    return [AsyncMessageDNS() if isinstance(h, MessageDNS) else h for h in getHandlers()]
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from bot.handlers.handler import Handler
+from bot.handlers.handler_status import HandlerStatus
+
+if TYPE_CHECKING:
+    from bot.user_context import UserContext
+
+SYNC_HANDLER_WORKERS = int(os.getenv("LNH_ASYNC_SYNC_WORKERS") or 32)
+
+_executor: ThreadPoolExecutor | None = None
+
+def _getExecutor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=SYNC_HANDLER_WORKERS, thread_name_prefix="lnh-sync-handler")
+    return _executor
+
+
+class AsyncHandler(ABC):
+    """Хэндлер для asyncio-режима: тот же контракт, что у Handler, но методы — корутины."""
+
+    commands: tuple[str, ...] = ()
+    callbacks: tuple[str, ...] = ()
+    states: tuple[str, ...] = ()
+
+    @abstractmethod
+    async def canHandle(self, update: dict, ctx: UserContext) -> bool:
+        pass
+
+    @abstractmethod
+    async def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
+        pass
+
+
+class SyncHandlerAdapter(AsyncHandler):
+    """
+    Запускает обычный (блокирующий) Handler в отдельном пуле потоков,
+    чтобы не останавливать event loop. Позволяет переводить хэндлеры на async по одному.
+    """
+
+    def __init__(self, handler: Handler) -> None:
+        self.handler = handler
+        self.commands = handler.commands
+        self.callbacks = handler.callbacks
+        self.states = handler.states
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_getExecutor(), lambda: fn(*args))
+
+    async def canHandle(self, update: dict, ctx: UserContext) -> bool:
+        # canHandle смотрит только на update и ctx, без I/O — вызываем прямо в event loop
+        return self.handler.canHandle(update, ctx)
+
+    async def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
+        return await self._run(self.handler.handle, update, ctx)
+
+    def __repr__(self) -> str:
+        return f"SyncHandlerAdapter({self.handler.__class__.__name__})"
@@ -1,11 +1,13 @@
-import bot.db_client
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
+from bot.update_journal import getJournal
+from bot.user_context import UserContext
 
 class UpdateDB(Handler):
-    def canHandle(self, update: dict, state: str = "", data: dict | None = None) -> bool:
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         return True
 
-    def handle(self, update: dict, state: str = "", data: dict | None = None) -> HandlerStatus:
-        bot.db_client.persistUpdates([update])
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
+        # запись в telegram_updates — пакетами в фоне, не на пути обработки апдейта
+        getJournal().append(update)
         return HandlerStatus.CONTINUE
\ No newline at end of file
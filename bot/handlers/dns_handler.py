@@ -1,18 +1,32 @@
 from __future__ import annotations
 
+import asyncio
 import ipaddress
+import os
 import re
+from concurrent.futures import FIRST_COMPLETED, wait
 from typing import Tuple
 
+from bot.handlers.async_handler import AsyncHandler, SyncHandlerAdapter
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
-from bot import telegram_client, db_client
+from bot.handlers import upload
+from bot import async_telegram_client, telegram_client
+from bot.edit_coalescer import AsyncEditCoalescer, EditCoalescer
+from bot.governor import Overloaded, getGovernor
 from bot.net_tools import dns as dns_tool
+from bot.user_context import UserContext
 
 DNS_WAIT_TARGET = "DNS_WAIT_TARGET"
 DNS_RUNNING = "DNS_RUNNING"
 
 DNS_TYPES = ("A", "AAAA", "CNAME", "MX", "TXT", "NS", "PTR")
+# "ALL" — сводный отчёт: эти типы запрашиваются параллельно
+DNS_ALL = "ALL"
+DNS_ALL_TYPES = ("A", "AAAA", "CNAME", "MX", "TXT", "NS")
+_ANSWERS_PER_TYPE = 20
+BULK_DNS_CONCURRENCY = int(os.getenv("LNH_BULK_DNS_CONCURRENCY") or 16)
+_BULK_HINT = "\nИли пришлите файл `.txt`/`.csv` со списком — по одной цели в строке."
 
 def _is_valid_domain(s: str) -> bool:
     s = (s or "").strip()
@@ -51,7 +65,8 @@ def _type_kb() -> dict:
             [{"text": "MX", "callback_data": "dns:type:MX"},
              {"text": "TXT", "callback_data": "dns:type:TXT"},
              {"text": "NS", "callback_data": "dns:type:NS"}],
-            [{"text": "PTR", "callback_data": "dns:type:PTR"}],
+            [{"text": "PTR", "callback_data": "dns:type:PTR"},
+             {"text": "Все типы", "callback_data": "dns:type:ALL"}],
             [{"text": "🏠 Меню", "callback_data": "menu"}],
         ]
     }
@@ -74,38 +89,32 @@ def _result_kb() -> dict:
     }
 
 class MessageDNS(Handler):
-    def canHandle(self, update: dict, state: str = "", data: dict | None = None) -> bool:
+    callbacks = ("dns:",)
+    states = (DNS_WAIT_TARGET, DNS_RUNNING)
+
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         if "callback_query" in update:
             d = (update["callback_query"].get("data") or "")
             return d.startswith("dns:")
-        if "message" in update and "text" in update["message"]:
-            telegram_id = update["message"]["from"]["id"]
-            user = db_client.getUser(telegram_id)
-            st = (user.get("state") if user else "") or ""
-            return st in (DNS_WAIT_TARGET, DNS_RUNNING)
+        if "message" in update and ("text" in update["message"] or "document" in update["message"]):
+            return ctx.state in (DNS_WAIT_TARGET, DNS_RUNNING)
         return False
 
-    def handle(self, update: dict, state: str = "", data=None) -> HandlerStatus:
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
         # если RUNNING — “занято”
         def _busy(chat_id: int):
             telegram_client.sendMessage(chat_id=chat_id, text="⏳ Выполняю предыдущий DNS-запрос. Подождите, пожалуйста…")
 
         if "callback_query" in update:
             cq = update["callback_query"]
-            from_id = cq["from"]["id"]
             chat_id = cq["message"]["chat"]["id"]
             message_id = cq["message"]["message_id"]
             d = (cq.get("data") or "")
             telegram_client.answerCallbackQuery(cq["id"])
 
             if d in ("dns:start", "dns:choose_type"):
-                user = db_client.getUser(from_id) or {"data": {}}
-                data_obj = user.get("data") or {}
-                if not isinstance(data_obj, dict):
-                    data_obj = {}
-                data_obj.pop("dns_type", None)
-                db_client.setUserData(from_id, data_obj)
-                db_client.setUserState(from_id, "")
+                ctx.popData("dns_type")
+                ctx.setState("")
                 telegram_client.editMessageText(
                     chat_id=chat_id, message_id=message_id,
                     text="Выберите тип DNS-записи:", reply_markup=_type_kb()
@@ -114,88 +123,99 @@ class MessageDNS(Handler):
 
             if d.startswith("dns:type:"):
                 rrtype = d.split(":")[-1].upper()
-                if rrtype not in DNS_TYPES:
+                if rrtype not in DNS_TYPES and rrtype != DNS_ALL:
                     rrtype = "A"
-                user = db_client.getUser(from_id) or {"data": {}}
-                data_obj = user.get("data") or {}
-                if not isinstance(data_obj, dict):
-                    data_obj = {}
-                data_obj["dns_type"] = rrtype
-                db_client.setUserData(from_id, data_obj)
-                db_client.setUserState(from_id, DNS_WAIT_TARGET)
+                ctx.updateData(dns_type=rrtype)
+                ctx.setState(DNS_WAIT_TARGET)
                 prompt = "Введите домен (FQDN), например: `example.com`"
                 if rrtype == "PTR":
                     prompt = "Введите публичный IPv4 для PTR, например: `8.8.8.8`"
                 telegram_client.editMessageText(
                     chat_id=chat_id, message_id=message_id,
-                    text=prompt, parse_mode="Markdown", reply_markup=_prompt_kb()
+                    text=prompt + _BULK_HINT, parse_mode="Markdown", reply_markup=_prompt_kb()
                 )
                 return HandlerStatus.STOP
 
             if d == "dns:repeat":
                 # теперь "Повторить" просит новую цель для текущего типа
-                user = db_client.getUser(from_id)
-                data_obj = (user.get("data") if user else {}) or {}
-                if not isinstance(data_obj, dict):
-                    data_obj = {}
-                rrtype = (data_obj.get("dns_type") or "A").upper()
-                db_client.setUserState(from_id, DNS_WAIT_TARGET)
+                rrtype = (ctx.data.get("dns_type") or "A").upper()
+                ctx.setState(DNS_WAIT_TARGET)
                 prompt = "Введите домен (FQDN), например: `example.com`"
                 if rrtype == "PTR":
                     prompt = "Введите публичный IPv4 для PTR, например: `8.8.8.8`"
                 telegram_client.editMessageText(
                     chat_id=chat_id,
                     message_id=message_id,
-                    text=prompt,
+                    text=prompt + _BULK_HINT,
                     parse_mode="Markdown",
                     reply_markup=_prompt_kb(),
                 )
                 return HandlerStatus.STOP
 
+        # DOCUMENT: список целей
+        if "message" in update and "document" in update["message"]:
+            chat_id = update["message"]["chat"]["id"]
+            if ctx.state == DNS_RUNNING:
+                _busy(chat_id)
+                return HandlerStatus.STOP
+            doc = upload.list_document(update)
+            why = upload.check_document(doc) if doc else "ожидается файл .txt или .csv"
+            if why:
+                telegram_client.sendMessage(chat_id=chat_id, text=f"Некорректный файл: {why}", reply_markup=_prompt_kb())
+                return HandlerStatus.STOP
+
+            rrtype = (ctx.data.get("dns_type") or "A").upper()
+            ctx.updateData(dns_type=rrtype)
+            placeholder = telegram_client.sendMessage(chat_id=chat_id, text=f"⏳ DNS {rrtype}: читаю список…")
+            user_id, ph_id = ctx.telegram_id, placeholder["message_id"]
+            upload.start_job(ctx, DNS_RUNNING, lambda: _bulk_lookup(chat_id, ph_id, user_id, doc, rrtype))
+            return HandlerStatus.STOP
+
         # TEXT INPUT
         if "message" in update and "text" in update["message"]:
             msg = update["message"]
             chat_id = msg["chat"]["id"]
-            user_id = msg["from"]["id"]
-            st = (db_client.getUser(user_id) or {}).get("state") or ""
-            if st == DNS_RUNNING:
+            if ctx.state == DNS_RUNNING:
                 _busy(chat_id)
                 return HandlerStatus.STOP
 
-            user = db_client.getUser(user_id)
-            data_obj = (user.get("data") if user else {}) or {}
-            if not isinstance(data_obj, dict):
-                data_obj = {}
-            rrtype = (data_obj.get("dns_type") or "A").upper()
+            rrtype = (ctx.data.get("dns_type") or "A").upper()
 
             target = (msg["text"] or "").strip()
             ok, why = _validate_input(rrtype, target)
             if not ok:
                 telegram_client.sendMessage(chat_id=chat_id, text=f"Некорректный ввод: {why}", reply_markup=_prompt_kb())
-                db_client.setUserState(user_id, DNS_WAIT_TARGET)
+                ctx.setState(DNS_WAIT_TARGET)
                 return HandlerStatus.STOP
 
             # RUNNING + плейсхолдер (новое сообщение)
-            db_client.setUserState(user_id, DNS_RUNNING)
+            ctx.setState(DNS_RUNNING)
             telegram_client.sendChatAction(chat_id, "typing")
-            placeholder = telegram_client.sendMessage(
-                chat_id=chat_id, text=f"⏳ DNS `{rrtype}` для `{target}`…", parse_mode="Markdown"
-            )
+            if rrtype == DNS_ALL:
+                placeholder_text = _format_dns_all(target, {})
+            else:
+                placeholder_text = f"⏳ DNS `{rrtype}` для `{target}`…"
+            placeholder = telegram_client.sendMessage(chat_id=chat_id, text=placeholder_text, parse_mode="Markdown")
             ph_id = placeholder["message_id"]
 
-            res = dns_tool.lookup(target, rrtype, timeout=4.0)
-            text = _format_dns_result(target, rrtype, res)
+            editor = EditCoalescer(chat_id, ph_id, parse_mode="Markdown")
+            try:
+                with getGovernor("dns").slot(
+                    ctx.telegram_id, lambda pos: editor.update(f"⏳ DNS `{rrtype}` для `{target}` — в очереди: {pos}")
+                ):
+                    if rrtype == DNS_ALL:
+                        text = _lookup_all(editor, target)
+                    else:
+                        res = dns_tool.lookup(target, rrtype, timeout=4.0)
+                        text = _format_dns_result(target, rrtype, res)
+            except Overloaded as e:
+                text = f"DNS `{rrtype}` для `{target}`\n❌ {e}"
 
             # сохранить контекст для "Повторить"
-            data_obj["dns_last_target"] = target
-            data_obj["dns_type"] = rrtype
-            db_client.setUserData(user_id, data_obj)
-            db_client.setUserState(user_id, "")  # выходим из RUNNING
-
-            ok2 = telegram_client.safe_edit_message_text(
-                chat_id=chat_id, message_id=ph_id,
-                text=text, parse_mode="Markdown", reply_markup=_result_kb()
-            )
+            ctx.updateData(dns_last_target=target, dns_type=rrtype)
+            ctx.setState("")  # выходим из RUNNING
+
+            ok2 = editor.finish(text, reply_markup=_result_kb())
             if not ok2:
                 telegram_client.sendMessage(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=_result_kb())
 
@@ -203,21 +223,187 @@ class MessageDNS(Handler):
 
         return HandlerStatus.CONTINUE
 
-def _format_dns_result(target: str, rrtype: str, res: dns_tool.DnsResult) -> str:
-    head = f"DNS `{rrtype}` для `{target}`"
+class AsyncMessageDNS(AsyncHandler):
+    """
+    MessageDNS для asyncio-режима: запрос по введённой цели (и «Все типы») — корутины
+    dns.lookup_async, поток на время ожидания ответа не занимается. Кнопки, файлы со списком
+    и «занято» — через обычный MessageDNS в SyncHandlerAdapter.
+    """
+
+    callbacks = MessageDNS.callbacks
+    states = MessageDNS.states
+
+    def __init__(self) -> None:
+        self._sync = SyncHandlerAdapter(MessageDNS())
+
+    async def canHandle(self, update: dict, ctx: UserContext) -> bool:
+        return await self._sync.canHandle(update, ctx)
+
+    async def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
+        msg = update.get("message") or {}
+        if "text" not in msg or ctx.state != DNS_WAIT_TARGET:
+            return await self._sync.handle(update, ctx)
+
+        chat_id = msg["chat"]["id"]
+        rrtype = (ctx.data.get("dns_type") or "A").upper()
+        target = (msg["text"] or "").strip()
+        ok, why = _validate_input(rrtype, target)
+        if not ok:
+            await async_telegram_client.sendMessage(chat_id=chat_id, text=f"Некорректный ввод: {why}", reply_markup=_prompt_kb())
+            return HandlerStatus.STOP
+
+        ctx.setState(DNS_RUNNING)
+        await async_telegram_client.sendChatAction(chat_id, "typing")
+        if rrtype == DNS_ALL:
+            placeholder_text = _format_dns_all(target, {})
+        else:
+            placeholder_text = f"⏳ DNS `{rrtype}` для `{target}`…"
+        placeholder = await async_telegram_client.sendMessage(chat_id=chat_id, text=placeholder_text, parse_mode="Markdown")
+
+        editor = AsyncEditCoalescer(chat_id, placeholder["message_id"], parse_mode="Markdown")
+        loop = asyncio.get_running_loop()
+        try:
+            async with getGovernor("dns").slotAsync(
+                ctx.telegram_id,
+                lambda pos: loop.call_soon_threadsafe(editor.update, f"⏳ DNS `{rrtype}` для `{target}` — в очереди: {pos}"),
+            ):
+                if rrtype == DNS_ALL:
+                    text = await _lookup_all_async(editor, target)
+                else:
+                    res = await dns_tool.lookup_async(target, rrtype, timeout=4.0)
+                    text = _format_dns_result(target, rrtype, res)
+        except Overloaded as e:
+            text = f"DNS `{rrtype}` для `{target}`\n❌ {e}"
+
+        ctx.updateData(dns_last_target=target, dns_type=rrtype)
+        ctx.setState("")
+
+        if not await editor.finish(text, reply_markup=_result_kb()):
+            await async_telegram_client.sendMessage(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=_result_kb())
+        return HandlerStatus.STOP
+
+def _lookup_all(editor: EditCoalescer, target: str) -> str:
+    """
+    Запрашивает DNS_ALL_TYPES параллельно; пока готовы не все, плейсхолдер дополняется
+    готовыми секциями через editor — тот же, что показывал место в очереди, поэтому правки
+    не обгоняют друг друга и идут с одним ограничением частоты. Возвращает итоговый текст.
+    """
+    results: dict[str, dns_tool.DnsResult] = {}
+    pending = set(dns_tool.lookup_many(target, DNS_ALL_TYPES, timeout=4.0))
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            res = f.result()
+            results[res.rrtype] = res
+        if pending:
+            editor.update(_format_dns_all(target, results))
+    return _format_dns_all(target, results)
+
+async def _lookup_all_async(editor: AsyncEditCoalescer, target: str) -> str:
+    """_lookup_all() для event loop: те же секции по мере готовности, запросы — задачи loop."""
+    results: dict[str, dns_tool.DnsResult] = {}
+    tasks = [asyncio.ensure_future(dns_tool.lookup_async(target, t, timeout=4.0)) for t in DNS_ALL_TYPES]
+    for next_done in asyncio.as_completed(tasks):
+        res = await next_done
+        results[res.rrtype] = res
+        if len(results) < len(tasks):
+            editor.update(_format_dns_all(target, results))
+    return _format_dns_all(target, results)
+
+def _bulk_lookup(chat_id: int, message_id: int, user_id: int, doc: dict, rrtype: str) -> None:
+    """
+    Пакетный режим (в пуле upload.start_job): каждая уникальная цель из файла → строки CSV,
+    результат — документом. message_id — плейсхолдер для прогресса.
+    """
+    rrtypes = DNS_ALL_TYPES if rrtype == DNS_ALL else (rrtype,)
+    progress = upload.Progress(chat_id, message_id)
+
+    def resolve(target: str) -> list[dns_tool.DnsResult] | None:
+        ok, _ = _validate_input(rrtypes[0], target)
+        if not ok:
+            return None
+        # каждая цель — отдельная задача в общей очереди DNS: пакет не вытесняет одиночные запросы
+        try:
+            with getGovernor("dns").slot(user_id):
+                return [f.result() for f in dns_tool.lookup_many(target, rrtypes, timeout=4.0, bulk=True)]
+        except Overloaded as e:
+            return [dns_tool.DnsResult(False, t, target, [], error=str(e)) for t in rrtypes]
+
+    done = failed = 0
+    try:
+        with upload.CsvResult(["target", "type", "ok", "answers", "ttl", "error"]) as out:
+            for target, results in upload.bulk_map(resolve, upload.iter_targets(doc), BULK_DNS_CONCURRENCY):
+                done += 1
+                if results is None:
+                    failed += 1
+                    out.add([target, rrtype, 0, "", "", "invalid target"])
+                else:
+                    if not any(r.ok for r in results):
+                        failed += 1
+                    for r in results:
+                        ttls = [a.ttl for a in r.answers if a.ttl is not None]
+                        out.add([
+                            target, r.rrtype, int(r.ok),
+                            " | ".join(a.value for a in r.answers),
+                            min(ttls) if ttls else "", r.error or "",
+                        ])
+                progress.update(f"⏳ DNS {rrtype}: проверено {done}, с ошибками {failed}…")
+
+            caption = f"DNS {rrtype}: {done} целей, с ошибками {failed}"
+            if done >= upload.BULK_MAX_TARGETS:
+                caption += f" (обработаны первые {upload.BULK_MAX_TARGETS})"
+            if done == 0:
+                caption = "В файле не нашлось ни одной цели"
+            telegram_client.safe_edit_message_text(chat_id=chat_id, message_id=message_id, text=caption)
+            if done:
+                out.send(chat_id, f"dns_{rrtype.lower()}.csv", caption=caption, reply_markup=_result_kb())
+    except (RuntimeError, OSError) as e:
+        telegram_client.sendMessage(chat_id=chat_id, text=f"❌ Не удалось обработать файл: {e}", reply_markup=_prompt_kb())
+
+def _answer_lines(rrtype: str, res: dns_tool.DnsResult, limit: int) -> list[str]:
     if not res.ok:
-        err = res.error or "ошибка"
-        return f"{head}\n❌ {err}"
-    lines = [head]
+        return [f"❌ {res.error or 'ошибка'}"]
+    lines = []
     if res.cname and rrtype != "CNAME":
         lines.append(f"↪ CNAME: `{res.cname}`")
     if res.answers:
         lines.append("```\n" + "\n".join(
             f"{a.value}" + (f"  (TTL {a.ttl})" if a.ttl is not None else "")
-            for a in res.answers[:50]
+            for a in res.answers[:limit]
         ) + "\n```")
-        if len(res.answers) > 50:
-            lines.append(f"…и ещё {len(res.answers)-50} записей")
+        if len(res.answers) > limit:
+            lines.append(f"…и ещё {len(res.answers)-limit} записей")
     else:
         lines.append("Нет ответов (No answer)")
-    return "\n".join(lines)
+    return lines
+
+def _format_dns_result(target: str, rrtype: str, res: dns_tool.DnsResult) -> str:
+    head = f"DNS `{rrtype}` для `{target}`"
+    if res.cached:
+        head += " (из кэша)"
+    return "\n".join([head] + _answer_lines(rrtype, res, 50))
+
+def _format_dns_all(target: str, results: dict[str, dns_tool.DnsResult]) -> str:
+    done = len(results)
+    head = f"DNS для `{target}` (все типы)"
+    if done < len(DNS_ALL_TYPES):
+        head = f"⏳ {head}: {done}/{len(DNS_ALL_TYPES)}"
+    lines = [head]
+    for rrtype in DNS_ALL_TYPES:
+        res = results.get(rrtype)
+        if res is None:
+            lines.append(f"\n*{rrtype}* — ⏳")
+            continue
+        if not res.ok and res.error == "No answer":
+            lines.append(f"\n*{rrtype}* — нет записей")
+            continue
+        lines.append(f"\n*{rrtype}*" + (" (из кэша)" if res.cached else ""))
+        lines.extend(_answer_lines(rrtype, res, _ANSWERS_PER_TYPE))
+    text = "\n".join(lines)
+    # лимит сообщения Telegram — 4096 символов
+    if len(text) > 4000:
+        text = text[:3990].rsplit("\n", 1)[0]
+        if text.count("```") % 2:
+            text += "\n```"
+        text += "\n…отчёт обрезан"
+    return text
@@ -1,13 +1,13 @@
-from bot.db_client import ensureUserExists
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
+from bot.user_context import UserContext
 
 
 class EnsureUserExists(Handler):
-    def canHandle(self, update: dict, state: str = "", data: dict | None = None) -> bool:
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         return "message" in update and "from" in update["message"]
 
-    def handle(self, update: dict, state: str = "", data: dict | None = None) -> HandlerStatus:
-        telegram_id = update["message"]["from"]["id"]
-        ensureUserExists(telegram_id)
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
+        # INSERT отложен до ctx.flush() в конце dispatch; для известного пользователя его не будет вовсе
+        ctx.ensureExists()
         return HandlerStatus.CONTINUE
\ No newline at end of file
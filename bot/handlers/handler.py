@@ -1,15 +1,28 @@
-import json
+from __future__ import annotations
 from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING
 from bot.handlers.handler_status import HandlerStatus
 
+if TYPE_CHECKING:
+    from bot.user_context import UserContext
+
 class Handler(ABC):
+    # маршруты для Router: команды (/start), callback_data ("ping:" — префикс, "menu" — точно)
+    # и users.state, в которых хэндлер принимает сообщения. Без маршрутов хэндлер
+    # проверяется на каждом апдейте (общая цепочка).
+    commands: tuple[str, ...] = ()
+    callbacks: tuple[str, ...] = ()
+    states: tuple[str, ...] = ()
+
     @abstractmethod
-    def canHandle(self, update: dict, state: str = "", data: dict | None = None) -> bool:
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         pass
 
     @abstractmethod
-    def handle(self, update: dict, state: str = "", data: dict | None = None) -> HandlerStatus:
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
         """
+        ctx — состояние пользователя на время апдейта; изменения через ctx.setState/setData,
+        в БД они попадут одной транзакцией после обработки.
         return options:
         - true signal for dispatchr to continue processing;
         - false - signal for dispatcher to stop processing
@@ -1,6 +1,7 @@
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
-from bot import telegram_client, db_client
+from bot import telegram_client
+from bot.user_context import UserContext
 
 MAIN_MENU_KB = {
     "inline_keyboard": [
@@ -13,7 +14,10 @@ MAIN_MENU_KB = {
 }
 
 class MessageMenu(Handler):
-    def canHandle(self, update: dict) -> bool:
+    commands = ("/start", "/menu")
+    callbacks = ("menu",)
+
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         # /start или /menu в личке; либо callback "menu"
         if "message" in update and "text" in update["message"]:
             txt = (update["message"]["text"] or "").strip()
@@ -22,7 +26,7 @@ class MessageMenu(Handler):
             return update["callback_query"].get("data") == "menu"
         return False
 
-    def handle(self, update: dict, state: str = "", data=None) -> HandlerStatus:
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
         if "callback_query" in update:
             cq = update["callback_query"]
             telegram_client.answerCallbackQuery(cq["id"])
@@ -44,10 +48,6 @@ class MessageMenu(Handler):
             )
 
         # сброс состояния
-        if "message" in update:
-            telegram_id = update["message"]["from"]["id"]
-        else:
-            telegram_id = update["callback_query"]["from"]["id"]
-        db_client.setUserState(telegram_id, "")
-        db_client.setUserData(telegram_id, {})
+        ctx.setState("")
+        ctx.setData({})
         return HandlerStatus.STOP
\ No newline at end of file
@@ -1,13 +1,24 @@
 import ipaddress
+import math
+import os
 import re
 
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
-from bot import telegram_client, db_client
+from bot.handlers import upload
+from bot import telegram_client
+from bot.edit_coalescer import EditCoalescer
+from bot.governor import Overloaded, getGovernor
 from bot.net_tools import ping as ping_tool
+from bot.user_context import UserContext
 
 PING_WAIT_STATE = "PING_WAIT_TARGET"
 PING_RUNNING_STATE = "PING_RUNNING"
+PING_SWEEP_MAX_TARGETS = int(os.getenv("LNH_PING_SWEEP_MAX_TARGETS") or 100)
+_PROMPT = (
+    "Введите IPv4-адрес или домен (публичный):\n"
+    "несколько адресов через пробел/с новой строки или файл .txt/.csv — проверю списком."
+)
 
 def _is_valid_host(text: str) -> bool:
     s = (text or "").strip()
@@ -28,20 +39,20 @@ def _is_valid_host(text: str) -> bool:
     return bool(re.fullmatch(rf"(?:{label}\.)+{label}", s))
 
 class MessagePing(Handler):
-    def canHandle(self, update: dict, state: str = "", data: dict | None = None) -> bool:
+    callbacks = ("ping:",)
+    states = (PING_WAIT_STATE, PING_RUNNING_STATE)
+
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         # callbacks
         if "callback_query" in update:
             d = (update["callback_query"].get("data") or "")
             return d in ("ping:start", "ping:repeat")
         # ожидание адреса
-        if "message" in update and "text" in update["message"]:
-            telegram_id = update["message"]["from"]["id"]
-            user = db_client.getUser(telegram_id)
-            st = (user.get("state") if user else "") or ""
-            return st in (PING_WAIT_STATE, PING_RUNNING_STATE)
+        if "message" in update and ("text" in update["message"] or "document" in update["message"]):
+            return ctx.state in (PING_WAIT_STATE, PING_RUNNING_STATE)
         return False
 
-    def handle(self, update: dict, state: str = "", data=None) -> HandlerStatus:
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
         # если сейчас RUNNING — вежливо сообщаем и выходим
         def _busy_reply(chat_id: int):
             telegram_client.sendMessage(chat_id=chat_id, text="⏳ Выполняю предыдущий пинг. Подождите, пожалуйста…")
@@ -49,67 +60,79 @@ class MessagePing(Handler):
         # CALLBACKS
         if "callback_query" in update:
             cq = update["callback_query"]
-            from_id = cq["from"]["id"]
             chat_id = cq["message"]["chat"]["id"]
             message_id = cq["message"]["message_id"]
             d = (cq.get("data") or "")
             telegram_client.answerCallbackQuery(cq["id"])
 
             if d == "ping:start":
-                db_client.setUserState(from_id, PING_WAIT_STATE)
-                db_client.setUserData(from_id, {})
+                ctx.setState(PING_WAIT_STATE)
+                ctx.setData({})
                 # просим ввод
                 telegram_client.editMessageText(
                     chat_id=chat_id,
                     message_id=message_id,
-                    text="Введите IPv4-адрес или домен (публичный):",
+                    text=_PROMPT,
                 )
                 return HandlerStatus.STOP
 
             if d == "ping:repeat":
-                db_client.setUserState(from_id, PING_WAIT_STATE)
+                ctx.setState(PING_WAIT_STATE)
                 # очищаем прошлую цель
-                user = db_client.getUser(from_id) or {"data": {}}
-                data_obj = user.get("data") or {}
-                if isinstance(data_obj, dict) and "last_ping_target" in data_obj:
-                    data_obj.pop("last_ping_target", None)
-                    db_client.setUserData(from_id, data_obj)
+                ctx.popData("last_ping_target")
                 telegram_client.editMessageText(
                     chat_id=chat_id,
                     message_id=message_id,
-                    text="Введите IPv4-адрес или домен (публичный):",
+                    text=_PROMPT,
                 )
                 return HandlerStatus.STOP
 
+        # DOCUMENT: список адресов
+        if "message" in update and "document" in update["message"]:
+            chat_id = update["message"]["chat"]["id"]
+            if ctx.state == PING_RUNNING_STATE:
+                _busy_reply(chat_id)
+                return HandlerStatus.STOP
+            doc = upload.list_document(update)
+            why = upload.check_document(doc) if doc else "ожидается файл .txt или .csv"
+            if why:
+                telegram_client.sendMessage(chat_id=chat_id, text=f"Некорректный файл: {why}")
+                return HandlerStatus.STOP
+            placeholder = telegram_client.sendMessage(chat_id=chat_id, text="⏳ Ping: читаю список…")
+            user_id, ph_id = ctx.telegram_id, placeholder["message_id"]
+            upload.start_job(ctx, PING_RUNNING_STATE, lambda: _sweep_document(chat_id, ph_id, user_id, doc))
+            return HandlerStatus.STOP
+
         # TEXT INPUT
         if "message" in update and "text" in update["message"]:
             msg = update["message"]
             chat_id = msg["chat"]["id"]
-            user_id = msg["from"]["id"]
-            st = (db_client.getUser(user_id) or {}).get("state") or ""
 
-            if st == PING_RUNNING_STATE:
+            if ctx.state == PING_RUNNING_STATE:
                 _busy_reply(chat_id)
                 return HandlerStatus.STOP
 
             target = (msg["text"] or "").strip()
+            targets = _split_targets(target)
+            if len(targets) > 1:
+                targets = targets[:PING_SWEEP_MAX_TARGETS]
+                telegram_client.sendChatAction(chat_id, "typing")
+                placeholder = telegram_client.sendMessage(chat_id=chat_id, text=f"⏳ Пингую список ({len(targets)})…")
+                user_id, ph_id = ctx.telegram_id, placeholder["message_id"]
+                upload.start_job(ctx, PING_RUNNING_STATE, lambda: _sweep(chat_id, ph_id, user_id, targets))
+                return HandlerStatus.STOP
             if not _is_valid_host(target):
                 telegram_client.sendMessage(
                     chat_id=chat_id,
                     text="Некорректный адрес.\nПример: `8.8.8.8` или `example.com`",
                     parse_mode="Markdown",
                 )
-                db_client.setUserState(user_id, PING_WAIT_STATE)
+                ctx.setState(PING_WAIT_STATE)
                 return HandlerStatus.STOP
 
             # сохраняем, включаем RUNNING, показываем плейсхолдер
-            user = db_client.getUser(user_id) or {"data": {}}
-            data_obj = user.get("data") or {}
-            if not isinstance(data_obj, dict):
-                data_obj = {}
-            data_obj["last_ping_target"] = target
-            db_client.setUserData(user_id, data_obj)
-            db_client.setUserState(user_id, PING_RUNNING_STATE)
+            ctx.updateData(last_ping_target=target)
+            ctx.setState(PING_RUNNING_STATE)
 
             telegram_client.sendChatAction(chat_id, "typing")
             placeholder = telegram_client.sendMessage(
@@ -117,20 +140,108 @@ class MessagePing(Handler):
             )
             ph_id = placeholder["message_id"]
 
-            res = ping_tool.run(target, count=10, deadline_s=20, per_reply_timeout_s=2)
-            text = _format_ping_result(target, res)
-            ok = telegram_client.safe_edit_message_text(
-                chat_id=chat_id, message_id=ph_id,
-                text=text, reply_markup=_result_kb(), parse_mode="Markdown"
-            )
+            # плейсхолдер обновляется по мере ответов, не чаще раза в секунду
+            editor = EditCoalescer(chat_id, ph_id, parse_mode="Markdown")
+            try:
+                with getGovernor("ping").slot(
+                    ctx.telegram_id, lambda pos: editor.update(f"⏳ Пингую `{target}` — в очереди: {pos}")
+                ):
+                    res = ping_tool.run(
+                        target, count=10, deadline_s=20, per_reply_timeout_s=2,
+                        # последний пакет сразу покажет итог — промежуточная правка не нужна
+                        on_progress=lambda partial: partial.transmitted < 10 and editor.update(_format_ping_progress(target, partial)),
+                    )
+                text = _format_ping_result(target, res)
+            except Overloaded as e:
+                text = f"Ping `{target}`\n❌ {e}"
+            ok = editor.finish(text, reply_markup=_result_kb())
             if not ok:
                 telegram_client.sendMessage(chat_id=chat_id, text=text, reply_markup=_result_kb(), parse_mode="Markdown")
 
-            db_client.setUserState(user_id, "")
+            ctx.setState("")
             return HandlerStatus.STOP
 
         return HandlerStatus.CONTINUE
 
+def _split_targets(text: str) -> list[str]:
+    """Адреса через пробелы/запятые/переводы строк; повторы (без учёта регистра) — один раз."""
+    seen: set[str] = set()
+    out = []
+    for t in re.split(r"[\s,;]+", text or ""):
+        if t and t.lower() not in seen:
+            seen.add(t.lower())
+            out.append(t)
+    return out
+
+def _sweep_document(chat_id: int, message_id: int, user_id: int, doc: dict) -> None:
+    """Список из файла (в пуле upload.start_job): чтение файла — тоже вне потока диспетчера."""
+    try:
+        targets = list(upload.iter_targets(doc, max_targets=PING_SWEEP_MAX_TARGETS))
+    except (RuntimeError, OSError) as e:
+        telegram_client.safe_edit_message_text(
+            chat_id=chat_id, message_id=message_id, text=f"❌ Не удалось прочитать файл: {e}", reply_markup=_result_kb()
+        )
+        return
+    _sweep(chat_id, message_id, user_id, targets)
+
+def _sweep(chat_id: int, message_id: int, user_id: int, targets: list[str]) -> None:
+    """
+    Пинг списка (в пуле upload.start_job): все цели параллельно (общий лимит в ping.sweep),
+    итог — таблица по потерям и rtt. message_id — плейсхолдер для прогресса и итога.
+    """
+    valid = [t for t in targets if _is_valid_host(t)]
+    rejected = [t for t in targets if not _is_valid_host(t)]
+    editor = EditCoalescer(chat_id, message_id, parse_mode="Markdown")
+    if not valid:
+        editor.finish("В списке нет ни одного публичного IPv4-адреса или домена.", reply_markup=_result_kb())
+        return
+
+    results: list[tuple[str, ping_tool.PingResult]] = []
+    for host, res in ping_tool.sweep(valid, gate=lambda: getGovernor("ping").slot(user_id)):
+        results.append((host, res))
+        if len(results) < len(valid):
+            editor.update(f"⏳ Пингую список: готово {len(results)}/{len(valid)}")
+
+    results.sort(key=lambda hr: (hr[1].loss_pct, hr[1].avg_ms if hr[1].avg_ms is not None else math.inf))
+    summary = f"Ping списка ({len(results)}): без потерь {sum(1 for _, r in results if r.loss_pct == 0)}"
+    if rejected:
+        summary += f", пропущено {len(rejected)} (не публичные/некорректные)"
+
+    text = _format_sweep_table(summary, results, rejected)
+    if len(text) <= 4000:
+        if not editor.finish(text, reply_markup=_result_kb()):
+            telegram_client.sendMessage(chat_id=chat_id, text=text, reply_markup=_result_kb(), parse_mode="Markdown")
+        return
+    # длинный список — файлом
+    editor.finish(summary)
+    with upload.CsvResult(["host", "transmitted", "received", "loss_pct", "min_ms", "avg_ms", "max_ms", "jitter_ms"]) as out:
+        for host, r in results:
+            out.add([host, r.transmitted, r.received, r.loss_pct, _ms(r.min_ms), _ms(r.avg_ms), _ms(r.max_ms), _ms(r.jitter_ms)])
+        out.send(chat_id, "ping_sweep.csv", caption=summary, reply_markup=_result_kb())
+
+def _ms(v: float | None) -> str:
+    return f"{v:.2f}" if v is not None else ""
+
+def _format_sweep_table(summary: str, results: list[tuple[str, ping_tool.PingResult]], rejected: list[str]) -> str:
+    rows = [f"{'host':<24} {'loss':>5} {'avg':>8} {'max':>8}"]
+    for host, r in results:
+        name = host if len(host) <= 24 else host[:23] + "…"
+        rows.append(f"{name:<24} {r.loss_pct:>4.0f}% {_ms(r.avg_ms) or '—':>8} {_ms(r.max_ms) or '—':>8}")
+    if rejected:
+        # ввод пользователя — только внутри блока кода, без обратных кавычек
+        shown = ", ".join(t.replace("`", "") for t in rejected[:10])
+        rows.append(f"\nпропущены: {shown}" + (" …" if len(rejected) > 10 else ""))
+    return summary + "\n```\n" + "\n".join(rows) + "\n```"
+
+def _format_ping_progress(target: str, res: ping_tool.PingResult) -> str:
+    lines = [
+        f"⏳ Ping `{target}`: {res.transmitted}/10",
+        f"📨 получено: {res.received}, потери: {res.loss_pct:.0f}%",
+    ]
+    if res.avg_ms is not None:
+        lines.append(f"⏱️ rtt (мс): min {res.min_ms:.2f} | avg {res.avg_ms:.2f} | max {res.max_ms:.2f}")
+    return "\n".join(lines)
+
 def _format_ping_result(target: str, res: ping_tool.PingResult) -> str:
     if not res.ok and res.received == 0:
         return (
@@ -146,6 +257,11 @@ def _format_ping_result(target: str, res: ping_tool.PingResult) -> str:
         lines.append(
             f"⏱️ rtt (мс): min {res.min_ms:.2f} | avg {res.avg_ms:.2f} | max {res.max_ms:.2f} | σ {res.stddev_ms:.2f}"
         )
+    if res.p50_ms is not None:
+        extra = f"📊 p50 {res.p50_ms:.2f} | p95 {res.p95_ms:.2f}"
+        if res.jitter_ms is not None:
+            extra += f" | jitter {res.jitter_ms:.2f}"
+        lines.append(extra)
     lines += ["", "```", res.raw_tail, "```"]
     return "\n".join(lines)
 
@@ -1,16 +1,29 @@
 from __future__ import annotations
 
 import ipaddress
+import os
 import re
 
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
-from bot import telegram_client, db_client
+from bot.handlers import upload
+from bot import telegram_client
+from bot.telegram_client import escapeMarkdown
+from bot.edit_coalescer import EditCoalescer
+from bot.governor import Overloaded, getGovernor
 from bot.net_tools import tls as tls_tool
+from bot.net_tools.result_cache import cache_note
+from bot.user_context import UserContext
 
 TLS_WAIT_TARGET = "TLS_WAIT_TARGET"
 TLS_RUNNING = "TLS_RUNNING"
 
+_CHAIN_MAX_LINKS = 6
+BULK_TLS_CONCURRENCY = int(os.getenv("LNH_BULK_TLS_CONCURRENCY") or 16)
+BULK_TLS_TIMEOUT = float(os.getenv("LNH_BULK_TLS_TIMEOUT") or 5.0)  # секунд на хост в пакетном режиме
+_PROMPT = "Введите `host[:port]` (по умолчанию 443):"
+_BULK_HINT = "\nИли пришлите файл `.txt`/`.csv` со списком — по одному `host[:port]` в строке, отчёт по срокам придёт CSV."
+
 def _is_valid_public_ipv4(s: str) -> bool:
     try:
         ip = ipaddress.ip_address((s or "").strip())
@@ -70,110 +83,243 @@ def _result_kb() -> dict:
     return {
         "inline_keyboard": [
             [{"text": "🔁 Повторить", "callback_data": "tls:repeat"}],
+            [{"text": "🔄 Обновить (без кэша)", "callback_data": "tls:refresh"}],
+            [{"text": "🧪 Версии и шифры", "callback_data": "tls:scan"}],
             [{"text": "🏠 Меню", "callback_data": "menu"}],
         ]
     }
 
 class MessageTLS(Handler):
-    def canHandle(self, update: dict, state: str = "", data: dict | None = None) -> bool:
+    callbacks = ("tls:",)
+    states = (TLS_WAIT_TARGET, TLS_RUNNING)
+
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         if "callback_query" in update:
             d = (update["callback_query"].get("data") or "")
             return d.startswith("tls:")
-        if "message" in update and "text" in update["message"]:
-            telegram_id = update["message"]["from"]["id"]
-            user = db_client.getUser(telegram_id)
-            st = (user.get("state") if user else "") or ""
-            return st in (TLS_WAIT_TARGET, TLS_RUNNING)
+        if "message" in update and ("text" in update["message"] or "document" in update["message"]):
+            return ctx.state in (TLS_WAIT_TARGET, TLS_RUNNING)
         return False
 
-    def handle(self, update: dict, state: str = "", data=None) -> HandlerStatus:
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
         def _busy(chat_id: int):
             telegram_client.sendMessage(chat_id=chat_id, text="⏳ Выполняю предыдущий TLS-запрос. Подождите, пожалуйста…")
 
         # CALLBACKS
         if "callback_query" in update:
             cq = update["callback_query"]
-            from_id = cq["from"]["id"]
             chat_id = cq["message"]["chat"]["id"]
             message_id = cq["message"]["message_id"]
             d = (cq.get("data") or "")
             telegram_client.answerCallbackQuery(cq["id"])
 
             if d == "tls:start":
-                db_client.setUserState(from_id, TLS_WAIT_TARGET)
+                ctx.setState(TLS_WAIT_TARGET)
                 telegram_client.editMessageText(
                     chat_id=chat_id, message_id=message_id,
-                    text="Введите `host[:port]` (по умолчанию 443):",
+                    text=_PROMPT + _BULK_HINT,
                     parse_mode="Markdown",
                 )
                 return HandlerStatus.STOP
 
             if d == "tls:repeat":
                 # теперь "Повторить" просит новый host[:port]
-                db_client.setUserState(from_id, TLS_WAIT_TARGET)
+                ctx.setState(TLS_WAIT_TARGET)
                 telegram_client.editMessageText(
                     chat_id=chat_id, message_id=message_id,
-                    text="Введите `host[:port]` (по умолчанию 443):",
+                    text=_PROMPT + _BULK_HINT,
                     parse_mode="Markdown",
                     reply_markup=_prompt_kb(),
                 )
                 return HandlerStatus.STOP
 
+            if d in ("tls:scan", "tls:refresh"):
+                data = ctx.data
+                host, port = data.get("tls_last_host"), data.get("tls_last_port") or 443
+                if not host:
+                    ctx.setState(TLS_WAIT_TARGET)
+                    telegram_client.sendMessage(
+                        chat_id=chat_id, text=_PROMPT + _BULK_HINT,
+                        parse_mode="Markdown", reply_markup=_prompt_kb(),
+                    )
+                    return HandlerStatus.STOP
+                if ctx.state == TLS_RUNNING:
+                    _busy(chat_id)
+                    return HandlerStatus.STOP
+                if d == "tls:refresh":
+                    # тот же host:port, но мимо кэша результатов
+                    _run(chat_id, ctx, host, port, use_cache=False)
+                    return HandlerStatus.STOP
+
+                ctx.setState(TLS_RUNNING)
+                placeholder = telegram_client.sendMessage(
+                    chat_id=chat_id, text=f"⏳ Проверяю версии TLS и шифры `{host}:{port}`…", parse_mode="Markdown"
+                )
+                editor = EditCoalescer(chat_id, placeholder["message_id"], parse_mode="Markdown")
+                try:
+                    # весь скан — один слот: его хэндшейки и так ограничены пулом LNH_TLS_SCAN_CONCURRENCY
+                    with getGovernor("tls").slot(
+                        ctx.telegram_id, lambda pos: editor.update(f"⏳ Скан TLS `{host}:{port}` — в очереди: {pos}")
+                    ):
+                        res = tls_tool.scan(host, port)
+                    text = _format_scan(res)
+                except Overloaded as e:
+                    text = f"TLS scan `{host}:{port}`\n❌ {e}"
+                ctx.setState("")
+
+                if not editor.finish(text, reply_markup=_result_kb()):
+                    telegram_client.sendMessage(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=_result_kb())
+                return HandlerStatus.STOP
+
+        # DOCUMENT: список хостов
+        if "message" in update and "document" in update["message"]:
+            chat_id = update["message"]["chat"]["id"]
+            if ctx.state == TLS_RUNNING:
+                _busy(chat_id)
+                return HandlerStatus.STOP
+            doc = upload.list_document(update)
+            why = upload.check_document(doc) if doc else "ожидается файл .txt или .csv"
+            if why:
+                telegram_client.sendMessage(chat_id=chat_id, text=f"Некорректный файл: {why}", reply_markup=_prompt_kb())
+                return HandlerStatus.STOP
+
+            placeholder = telegram_client.sendMessage(chat_id=chat_id, text="⏳ TLS: читаю список…")
+            user_id, ph_id = ctx.telegram_id, placeholder["message_id"]
+            upload.start_job(ctx, TLS_RUNNING, lambda: _bulk_audit(chat_id, ph_id, user_id, doc))
+            return HandlerStatus.STOP
+
         # TEXT INPUT
         if "message" in update and "text" in update["message"]:
             msg = update["message"]
             chat_id = msg["chat"]["id"]
-            user_id = msg["from"]["id"]
-            st = (db_client.getUser(user_id) or {}).get("state") or ""
-            if st == TLS_RUNNING:
+            if ctx.state == TLS_RUNNING:
                 _busy(chat_id)
                 return HandlerStatus.STOP
 
             ok, host, port, why = _parse_target(msg["text"])
             if not ok:
                 telegram_client.sendMessage(chat_id=chat_id, text=f"Некорректный ввод: {why}", reply_markup=_prompt_kb())
-                db_client.setUserState(user_id, TLS_WAIT_TARGET)
+                ctx.setState(TLS_WAIT_TARGET)
                 return HandlerStatus.STOP
 
-            db_client.setUserState(user_id, TLS_RUNNING)
-            telegram_client.sendChatAction(chat_id, "typing")
-            placeholder = telegram_client.sendMessage(
-                chat_id=chat_id, text=f"⏳ TLS `{host}:{port}`…", parse_mode="Markdown"
-            )
-            ph_id = placeholder["message_id"]
-
-            info = tls_tool.fetch(host, port, timeout=7.0)
-            text = _format_tls(info)
-
-            # context
-            user = db_client.getUser(user_id) or {"data": {}}
-            data_obj = user.get("data") or {}
-            if not isinstance(data_obj, dict):
-                data_obj = {}
-            data_obj["tls_last_host"] = host
-            data_obj["tls_last_port"] = port
-            db_client.setUserData(user_id, data_obj)
-            db_client.setUserState(user_id, "")
-
-            ok2 = telegram_client.safe_edit_message_text(
-                chat_id=chat_id, message_id=ph_id,
-                text=text, parse_mode="Markdown", reply_markup=_result_kb()
-            )
-            if not ok2:
-                telegram_client.sendMessage(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=_result_kb())
+            _run(chat_id, ctx, host, port)
             return HandlerStatus.STOP
 
         return HandlerStatus.CONTINUE
 
+def _run(chat_id: int, ctx: UserContext, host: str, port: int, use_cache: bool = True) -> None:
+    ctx.setState(TLS_RUNNING)
+    telegram_client.sendChatAction(chat_id, "typing")
+    placeholder = telegram_client.sendMessage(
+        chat_id=chat_id, text=f"⏳ TLS `{host}:{port}`…", parse_mode="Markdown"
+    )
+    ph_id = placeholder["message_id"]
+
+    editor = EditCoalescer(chat_id, ph_id, parse_mode="Markdown")
+    try:
+        with getGovernor("tls").slot(
+            ctx.telegram_id, lambda pos: editor.update(f"⏳ TLS `{host}:{port}` — в очереди: {pos}")
+        ):
+            info = tls_tool.fetch(host, port, timeout=7.0, use_cache=use_cache)
+        text = _format_tls(info)
+    except Overloaded as e:
+        text = f"TLS `{host}:{port}`\n❌ {e}"
+
+    # context
+    ctx.updateData(tls_last_host=host, tls_last_port=port)
+    ctx.setState("")
+
+    ok2 = editor.finish(text, reply_markup=_result_kb())
+    if not ok2:
+        telegram_client.sendMessage(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=_result_kb())
+
+def _audit_flags(info: tls_tool.TlsInfo) -> list[str]:
+    flags = []
+    if info.days_left is not None and info.days_left < 0:
+        flags.append("EXPIRED")
+    elif info.days_left is not None and info.days_left < tls_tool.TLS_EXPIRY_WARN_DAYS:
+        flags.append("EXPIRING")
+    if info.hostname_ok is False:
+        flags.append("HOSTNAME_MISMATCH")
+    if info.chain_issues:
+        flags.append("CHAIN")
+    return flags
+
+def _bulk_audit(chat_id: int, message_id: int, user_id: int, doc: dict) -> None:
+    """
+    Пакетный режим (в пуле upload.start_job): срок сертификата каждого host[:port] из файла.
+    Хосты проверяются параллельно (BULK_TLS_CONCURRENCY), у каждого свой таймаут — зависший
+    хост держит только свой поток. Отчёт — CSV, отсортированный по days_left (ошибки в конце).
+    """
+    progress = upload.Progress(chat_id, message_id)
+
+    def check(line: str) -> tls_tool.TlsInfo | str:
+        ok, host, port, why = _parse_target(line)
+        if not ok:
+            return why or "некорректный ввод"
+        # каждый хост — отдельная задача в общей очереди TLS: пакет не вытесняет одиночные запросы
+        try:
+            with getGovernor("tls").slot(user_id):
+                return tls_tool.fetch(host, port, timeout=BULK_TLS_TIMEOUT)
+        except Overloaded as e:
+            return tls_tool.TlsInfo(ok=False, host=host, port=port, error=str(e))
+
+    rows: list[tuple] = []
+    done = failed = expiring = mismatched = 0
+    try:
+        for line, info in upload.bulk_map(check, upload.iter_targets(doc), BULK_TLS_CONCURRENCY):
+            done += 1
+            if isinstance(info, str):
+                failed += 1
+                rows.append((None, [line, "", "", "", "", "", "", "", "", "", f"invalid target: {info}"]))
+            elif not info.ok or info.days_left is None:
+                failed += 1
+                rows.append((None, [info.host, info.port, info.address or "", "", "", "", "", "", "", "", info.error or "нет сертификата"]))
+            else:
+                flags = _audit_flags(info)
+                expiring += "EXPIRED" in flags or "EXPIRING" in flags
+                mismatched += "HOSTNAME_MISMATCH" in flags
+                rows.append((info.days_left, [
+                    info.host, info.port, info.address or "", info.days_left, info.not_after or "",
+                    {True: 1, False: 0}.get(info.hostname_ok, ""), " ".join(flags),
+                    info.subject_cn or "", info.issuer_cn or info.issuer_full or "", info.protocol or "", "",
+                ]))
+            progress.update(f"⏳ TLS: проверено {done}, истекают {expiring}, ошибок {failed}…")
+
+        if done == 0:
+            telegram_client.safe_edit_message_text(
+                chat_id=chat_id, message_id=message_id, text="В файле не нашлось ни одного хоста"
+            )
+            return
+
+        rows.sort(key=lambda r: (r[0] is None, r[0] if r[0] is not None else 0))
+        caption = (
+            f"TLS: {done} хостов; истекли или истекают в {tls_tool.TLS_EXPIRY_WARN_DAYS} дн.: {expiring}; "
+            f"имя не совпадает: {mismatched}; ошибок: {failed}"
+        )
+        if done >= upload.BULK_MAX_TARGETS:
+            caption += f" (обработаны первые {upload.BULK_MAX_TARGETS})"
+        telegram_client.safe_edit_message_text(chat_id=chat_id, message_id=message_id, text=caption)
+        with upload.CsvResult([
+            "host", "port", "address", "days_left", "not_after", "hostname_ok", "flags", "subject_cn", "issuer", "protocol", "error",
+        ]) as out:
+            for _days, row in rows:
+                out.add(row)
+            out.send(chat_id, "tls_expiry.csv", caption=caption, reply_markup=_result_kb())
+    except (RuntimeError, OSError) as e:
+        telegram_client.sendMessage(chat_id=chat_id, text=f"❌ Не удалось обработать файл: {e}", reply_markup=_prompt_kb())
+
 def _format_tls(info: tls_tool.TlsInfo) -> str:
     if not info.ok:
-        return f"TLS `{info.host}:{info.port}`\n❌ {info.error or 'ошибка'}"
+        return f"TLS `{info.host}:{info.port}`\n❌ {escapeMarkdown(info.error or 'ошибка')}"
 
-    lines = [f"TLS `{info.host}:{info.port}`"]
+    lines = [f"TLS `{info.host}:{info.port}`" + (cache_note(info.cached_at) if info.cached_at is not None else "")]
+    if info.address:
+        lines.append(f"Address: `{info.address}`" + (f" (TCP {info.connect_ms:.0f} ms)" if info.connect_ms is not None else ""))
     if info.protocol:
-        lines.append(f"Protocol: {info.protocol}")
+        lines.append(f"Protocol: {escapeMarkdown(info.protocol)}")
     if info.cipher:
-        lines.append(f"Cipher: {info.cipher}")
+        lines.append(f"Cipher: {escapeMarkdown(info.cipher)}")
 
     if info.subject_cn:
         lines.append(f"Subject CN: `{info.subject_cn}`")
@@ -190,6 +336,10 @@ def _format_tls(info: tls_tool.TlsInfo) -> str:
         short_serial = info.serial[:32] + ("…" if len(info.serial or "") > 32 else "")
         lines.append(f"Serial: `{short_serial}`")
 
+    if info.key_type:
+        key = info.key_type + (f" {info.key_bits} bit" if info.key_bits and not info.key_type.startswith("EC ") else "")
+        lines.append(f"Key: {escapeMarkdown(key)}" + (f", {escapeMarkdown(info.sig_alg)}" if info.sig_alg else ""))
+
     if info.not_before or info.not_after:
         span = f"{info.not_before or '?'} → {info.not_after or '?'}"
         if info.days_left is not None:
@@ -201,8 +351,60 @@ def _format_tls(info: tls_tool.TlsInfo) -> str:
         lines.append("SAN: " + ", ".join(f"`{x}`" for x in show) + (" …" if len(info.san) > 10 else ""))
 
     if info.ocsp_urls:
-        lines.append("OCSP: " + ", ".join(info.ocsp_urls[:2]) + (" …" if len(info.ocsp_urls) > 2 else ""))
+        lines.append("OCSP: " + ", ".join(escapeMarkdown(u) for u in info.ocsp_urls[:2]) + (" …" if len(info.ocsp_urls) > 2 else ""))
     if info.ca_issuers:
-        lines.append("CA Issuers: " + ", ".join(info.ca_issuers[:2]) + (" …" if len(info.ca_issuers) > 2 else ""))
+        lines.append("CA Issuers: " + ", ".join(escapeMarkdown(u) for u in info.ca_issuers[:2]) + (" …" if len(info.ca_issuers) > 2 else ""))
+
+    if info.chain:
+        lines.append("")
+        lines.append(f"Chain ({len(info.chain)}):")
+        for i, link in enumerate(info.chain[:_CHAIN_MAX_LINKS]):
+            parts = [p for p in (
+                f"D-{link.days_left}" if link.days_left is not None else None, link.key, link.sig_alg,
+            ) if p]
+            lines.append(
+                f"{i}. `{link.subject}`" + (" (self-signed)" if link.self_signed else "")
+                + (" — " + escapeMarkdown(", ".join(parts)) if parts else "")
+            )
+            for issue in link.issues or ():
+                lines.append(f"   ⚠️ {escapeMarkdown(issue)}")
+        if len(info.chain) > _CHAIN_MAX_LINKS:
+            lines.append("…")
+        if info.chain_issues:
+            lines.extend(f"⚠️ {escapeMarkdown(x)}" for x in info.chain_issues)
+        elif not any(link.issues for link in info.chain):
+            lines.append("✅ порядок и сроки в норме")
+
+    return "\n".join(lines)
 
+def _scan_mark(p: tls_tool.ScanProbe) -> str:
+    if p.accepted is None:
+        return "?  не проверено"
+    if not p.accepted:
+        return "—"
+    return ("⚠️ " if p.weak else "✅ ") + (p.cipher or "")
+
+def _format_scan(res: tls_tool.TlsScan) -> str:
+    if not res.ok:
+        return f"TLS scan `{res.host}:{res.port}`\n❌ {escapeMarkdown(res.error or 'ошибка')}"
+
+    head = f"TLS scan `{res.host}:{res.port}`"
+    if res.address and res.address != res.host:
+        head += f" ({res.address})"
+    if res.elapsed is not None:
+        head += f", {res.elapsed:.1f} с"
+
+    probes = (res.versions or []) + (res.ciphers or [])
+    width = max(len(p.label) for p in probes)
+    rows = [f"{p.label.ljust(width)}  {_scan_mark(p)}" for p in res.versions or []]
+    rows.append("")
+    rows += [f"{p.label.ljust(width)}  {_scan_mark(p)}" for p in res.ciphers or []]
+
+    lines = [head, "```", *rows, "```"]
+    weak = [p.label for p in probes if p.accepted and p.weak]
+    if weak:
+        lines.append("⚠️ Принимаются устаревшие: " + ", ".join(weak))
+    else:
+        lines.append("✅ Устаревшие версии и слабые шифры не принимаются")
+    lines.append("Для TLS 1.3 показан набор, выбранный сервером; шифры — для TLS ≤ 1.2, по группам.")
     return "\n".join(lines)
@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import csv
+import io
+import logging
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from bot import db_client, telegram_client
+from bot.outbound import PRIORITY_PROGRESS
+from bot.user_context import UserContext
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# общие помощники для «пакетных» режимов: список целей приходит файлом .txt/.csv
+BULK_MAX_FILE_BYTES = int(os.getenv("LNH_BULK_MAX_FILE_BYTES") or 2 * 1024 * 1024)
+BULK_MAX_TARGETS = int(os.getenv("LNH_BULK_MAX_TARGETS") or 5000)
+BULK_PROGRESS_EVERY = 3.0  # секунд между правками прогресса
+BULK_JOBS = int(os.getenv("LNH_BULK_JOBS") or 4)  # пакетных задач одновременно на весь бот
+
+_LIST_EXTENSIONS = (".txt", ".csv")
+
+
+def list_document(update: dict) -> dict | None:
+    """document из сообщения, если это список целей (.txt/.csv), иначе None."""
+    doc = (update.get("message") or {}).get("document")
+    if not doc:
+        return None
+    name = (doc.get("file_name") or "").lower()
+    return doc if name.endswith(_LIST_EXTENSIONS) else None
+
+def check_document(doc: dict) -> str | None:
+    """Причина отказа или None."""
+    size = doc.get("file_size") or 0
+    if size > BULK_MAX_FILE_BYTES:
+        return f"файл больше {BULK_MAX_FILE_BYTES // 1024} КБ"
+    return None
+
+def iter_targets(doc: dict, max_targets: int = BULK_MAX_TARGETS) -> Iterator[str]:
+    """
+    Потоково читает загруженный список: по строке, из CSV — первая колонка.
+    Пустые строки и строки с # пропускаются, повторы (без учёта регистра) отдаются один раз.
+    Не больше max_targets уникальных целей.
+    """
+    info = telegram_client.getFile(doc["file_id"])
+    seen: set[str] = set()
+    with telegram_client.openFile(info["file_path"]) as raw:
+        text = io.TextIOWrapper(raw, encoding="utf-8-sig", errors="replace", newline="")
+        for row in csv.reader(text):
+            # первая колонка; CSV из Excel бывает с разделителем ";"
+            cell = (row[0] if row else "").split(";", 1)[0].strip()
+            if not cell or cell.startswith("#"):
+                continue
+            key = cell.lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            yield cell
+            if len(seen) >= max_targets:
+                return
+
+_jobs: ThreadPoolExecutor | None = None
+_jobs_lock = threading.Lock()
+
+def _job_executor() -> ThreadPoolExecutor:
+    global _jobs
+    if _jobs is None:
+        with _jobs_lock:
+            if _jobs is None:
+                _jobs = ThreadPoolExecutor(max_workers=max(1, BULK_JOBS), thread_name_prefix="bulk-job")
+    return _jobs
+
+def start_job(ctx: UserContext, running_state: str, job: Callable[[], None]) -> None:
+    """
+    Пакетная задача — в своём пуле (BULK_JOBS), handle() сразу возвращается: поток диспетчера
+    и очередь апдейтов пользователя не заняты на минуты, а его следующие сообщения получают
+    «занято» по running_state. Состояние записывается до старта задачи и снимается после неё,
+    если пользователь за это время не перешёл в другой режим.
+    """
+    ctx.setState(running_state)
+    ctx.flush()  # раньше, чем задача успеет завершиться и снять состояние
+    user_id = ctx.telegram_id
+
+    def run() -> None:
+        try:
+            job()
+        except Exception:
+            logging.exception("bulk job failed")
+        finally:
+            try:
+                db_client.clearUserState(user_id, running_state)
+            except Exception:
+                logging.exception("bulk job: failed to reset user state")
+
+    _job_executor().submit(run)
+
+def bulk_map(fn: Callable[[T], R], items: Iterable[T], concurrency: int) -> Iterator[tuple[T, R]]:
+    """
+    fn(item) для каждого item не более чем в concurrency потоков; результаты — по готовности.
+    items читаются по мере освобождения мест, так что в памяти — только окно из concurrency задач.
+    """
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bulk") as ex:
+        pending: dict = {}
+        it = iter(items)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < concurrency:
+                try:
+                    item = next(it)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[ex.submit(fn, item)] = item
+            if not pending:
+                return
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                yield pending.pop(f), f.result()
+
+
+class Progress:
+    """Правки сообщения-плейсхолдера о ходе пакетной задачи не чаще BULK_PROGRESS_EVERY."""
+
+    def __init__(self, chat_id: int, message_id: int, every: float = BULK_PROGRESS_EVERY) -> None:
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.every = every
+        self._last = time.monotonic()
+
+    def update(self, text: str) -> None:
+        if time.monotonic() - self._last < self.every:
+            return
+        telegram_client.safe_edit_message_text(
+            chat_id=self.chat_id, message_id=self.message_id, text=text, priority=PRIORITY_PROGRESS
+        )
+        self._last = time.monotonic()
+
+
+class CsvResult:
+    """
+    Результаты пакетной задачи в CSV во временном файле: память не растёт с числом строк.
+    send() отправляет файл документом.
+    """
+
+    def __init__(self, header: list[str]) -> None:
+        self._file = tempfile.TemporaryFile()
+        self._text = io.TextIOWrapper(self._file, encoding="utf-8", newline="")
+        self._writer = csv.writer(self._text)
+        self._writer.writerow(header)
+        self.rows = 0
+
+    def add(self, row: list) -> None:
+        self._writer.writerow(row)
+        self.rows += 1
+
+    def send(self, chat_id: int, filename: str, caption: str | None = None, reply_markup: dict | None = None) -> dict:
+        self._text.flush()
+        return telegram_client.sendDocument(chat_id, self._file, filename, caption=caption, reply_markup=reply_markup)
+
+    def close(self) -> None:
+        self._text.close()
+
+    def __enter__(self) -> CsvResult:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
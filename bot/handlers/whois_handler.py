@@ -6,8 +6,13 @@ import re
 
 from bot.handlers.handler import Handler
 from bot.handlers.handler_status import HandlerStatus
-from bot import telegram_client, db_client
+from bot import telegram_client
+from bot.telegram_client import escapeMarkdown
+from bot.edit_coalescer import EditCoalescer
+from bot.governor import Overloaded, getGovernor
 from bot.net_tools import whois as whois_tool
+from bot.net_tools.result_cache import cache_note
+from bot.user_context import UserContext
 
 WHOIS_WAIT_TARGET = "WHOIS_WAIT_TARGET"
 WHOIS_RUNNING = "WHOIS_RUNNING"
@@ -54,23 +59,24 @@ def _result_kb() -> dict:
     return {
         "inline_keyboard": [
             [{"text": "🔁 Повторить", "callback_data": "whois:repeat"}],
+            [{"text": "🔄 Обновить (без кэша)", "callback_data": "whois:refresh"}],
             [{"text": "🏠 Меню", "callback_data": "menu"}],
         ]
     }
 
 class MessageWhois(Handler):
-    def canHandle(self, update: dict, state: str = "", data: dict | None = None) -> bool:
+    callbacks = ("whois:",)
+    states = (WHOIS_WAIT_TARGET, WHOIS_RUNNING)
+
+    def canHandle(self, update: dict, ctx: UserContext) -> bool:
         if "callback_query" in update:
             d = (update["callback_query"].get("data") or "")
             return d.startswith("whois:")
         if "message" in update and "text" in update["message"]:
-            telegram_id = update["message"]["from"]["id"]
-            user = db_client.getUser(telegram_id)
-            st = (user.get("state") if user else "") or ""
-            return st in (WHOIS_WAIT_TARGET, WHOIS_RUNNING)
+            return ctx.state in (WHOIS_WAIT_TARGET, WHOIS_RUNNING)
         return False
 
-    def handle(self, update: dict, state: str = "", data=None) -> HandlerStatus:
+    def handle(self, update: dict, ctx: UserContext) -> HandlerStatus:
         # если RUNNING — вежливо отвечаем и ждём завершения
         def _busy(chat_id: int):
             telegram_client.sendMessage(chat_id=chat_id, text="⏳ Выполняю предыдущий WHOIS. Подождите, пожалуйста…")
@@ -78,14 +84,13 @@ class MessageWhois(Handler):
         # CALLBACKS
         if "callback_query" in update:
             cq = update["callback_query"]
-            from_id = cq["from"]["id"]
             chat_id = cq["message"]["chat"]["id"]
             message_id = cq["message"]["message_id"]
             d = (cq.get("data") or "")
             telegram_client.answerCallbackQuery(cq["id"])
 
             if d == "whois:start":
-                db_client.setUserState(from_id, WHOIS_WAIT_TARGET)
+                ctx.setState(WHOIS_WAIT_TARGET)
                 telegram_client.editMessageText(
                     chat_id=chat_id, message_id=message_id,
                     text="Введите домен (FQDN) или публичный IPv4:",
@@ -94,21 +99,34 @@ class MessageWhois(Handler):
 
             if d == "whois:repeat":
                 # new target
-                db_client.setUserState(from_id, WHOIS_WAIT_TARGET)
+                ctx.setState(WHOIS_WAIT_TARGET)
                 telegram_client.editMessageText(
                     chat_id=chat_id, message_id=message_id,
                     text="Введите домен (FQDN) или публичный IPv4:",
                     reply_markup=_prompt_kb(),
                 )
                 return HandlerStatus.STOP
+
+            if d == "whois:refresh":
+                # та же цель, но мимо кэша результатов
+                target = ctx.data.get("whois_last_target")
+                if not target:
+                    ctx.setState(WHOIS_WAIT_TARGET)
+                    telegram_client.sendMessage(
+                        chat_id=chat_id, text="Введите домен (FQDN) или публичный IPv4:", reply_markup=_prompt_kb()
+                    )
+                    return HandlerStatus.STOP
+                if ctx.state == WHOIS_RUNNING:
+                    _busy(chat_id)
+                    return HandlerStatus.STOP
+                _run(chat_id, ctx, target, use_cache=False)
+                return HandlerStatus.STOP
         # TEXT INPUT
         if "message" in update and "text" in update["message"]:
             msg = update["message"]
             chat_id = msg["chat"]["id"]
-            user_id = msg["from"]["id"]
 
-            st = (db_client.getUser(user_id) or {}).get("state") or ""
-            if st == WHOIS_RUNNING:
+            if ctx.state == WHOIS_RUNNING:
                 _busy(chat_id)
                 return HandlerStatus.STOP
 
@@ -116,51 +134,58 @@ class MessageWhois(Handler):
             ok, why = _validate(target)
             if not ok:
                 telegram_client.sendMessage(chat_id=chat_id, text=f"Некорректный ввод: {why}", reply_markup=_prompt_kb())
-                db_client.setUserState(user_id, WHOIS_WAIT_TARGET)
+                ctx.setState(WHOIS_WAIT_TARGET)
                 return HandlerStatus.STOP
 
-            # RUNNING + плейсхолдер
-            db_client.setUserState(user_id, WHOIS_RUNNING)
-            telegram_client.sendChatAction(chat_id, "typing")
-            placeholder = telegram_client.sendMessage(
-                chat_id=chat_id, text=f"⏳ WHOIS `{target}`…", parse_mode="Markdown"
-            )
-            ph_id = placeholder["message_id"]
-
-            res = whois_tool.lookup(target, timeout=8.0)
-            text = _format_result(res)
-
-            # сохранить цель для Повторить
-            user = db_client.getUser(user_id) or {"data": {}}
-            data_obj = user.get("data") or {}
-            if not isinstance(data_obj, dict):
-                data_obj = {}
-            data_obj["whois_last_target"] = target
-            db_client.setUserData(user_id, data_obj)
-
-            db_client.setUserState(user_id, "")  # выходим из RUNNING
-
-            ok2 = telegram_client.safe_edit_message_text(
-                chat_id=chat_id, message_id=ph_id,
-                text=text, parse_mode="Markdown", reply_markup=_result_kb()
-            )
-            if not ok2:
-                telegram_client.sendMessage(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=_result_kb())
+            _run(chat_id, ctx, target)
             return HandlerStatus.STOP
 
         return HandlerStatus.CONTINUE
 
 
+def _run(chat_id: int, ctx: UserContext, target: str, use_cache: bool = True) -> None:
+    # RUNNING + плейсхолдер
+    ctx.setState(WHOIS_RUNNING)
+    telegram_client.sendChatAction(chat_id, "typing")
+    placeholder = telegram_client.sendMessage(
+        chat_id=chat_id, text=f"⏳ WHOIS `{target}`…", parse_mode="Markdown"
+    )
+    ph_id = placeholder["message_id"]
+
+    # не больше LNH_LIMIT_WHOIS запросов на весь бот; в очереди показываем место
+    editor = EditCoalescer(chat_id, ph_id, parse_mode="Markdown")
+    try:
+        with getGovernor("whois").slot(
+            ctx.telegram_id, lambda pos: editor.update(f"⏳ WHOIS `{target}` — в очереди: {pos}")
+        ):
+            res = whois_tool.lookup(target, timeout=8.0, use_cache=use_cache)
+        text = _format_result(res)
+    except Overloaded as e:
+        text = f"WHOIS `{target}`\n❌ {e}"
+
+    # сохранить цель для Повторить / Обновить
+    ctx.updateData(whois_last_target=target)
+
+    ctx.setState("")  # выходим из RUNNING
+
+    ok2 = editor.finish(text, reply_markup=_result_kb())
+    if not ok2:
+        telegram_client.sendMessage(chat_id=chat_id, text=text, parse_mode="Markdown", reply_markup=_result_kb())
+
+
 def _format_result(res: whois_tool.WhoisResult) -> str:
+    # ошибки, резюме и сырой ответ — текст с WHOIS/RDAP-серверов, экранируем для Markdown
     if not res.ok:
-        return f"WHOIS `{res.target}`\n❌ {res.error or 'ошибка'}"
+        return f"WHOIS `{res.target}`\n❌ {escapeMarkdown(res.error or 'ошибка')}"
 
     head = f"WHOIS `{res.target}`"
-    lines = [head] + res.summary_lines
+    if res.cached_at is not None:
+        head += cache_note(res.cached_at)
+    lines = [head] + [escapeMarkdown(x) for x in res.summary_lines]
 
     # Добавим укороченный RAW блок, чтобы не выбежать за лимит 4096
     if res.raw_text:
-        snippet = _trim(res.raw_text, limit=1800)
+        snippet = _trim(res.raw_text.replace("`", "'"), limit=1800)
         if snippet:
             lines += ["", "```", snippet, "```"]
 
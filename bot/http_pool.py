@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import http.client
+import threading
+import time
+from urllib.parse import urlsplit
+
+# ошибки, по которым переиспользованное keep-alive соединение считаем «протухшим»:
+# сервер закрыл его, пока оно лежало в пуле — повторяем запрос на новом соединении
+_STALE_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+
+class HttpPool:
+    """
+    Пул постоянных HTTP/1.1 соединений к одному хосту (scheme://host:port).
+    - не более max_size соединений одновременно (остальные запросы ждут);
+    - простаивающие дольше idle_timeout соединения закрываются при следующей выдаче;
+    - потокобезопасен.
+    """
+
+    def __init__(self, base_url: str, max_size: int = 16, idle_timeout: float = 60.0, timeout: float = 30.0) -> None:
+        parts = urlsplit(base_url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError(f"unsupported base url: {base_url!r}")
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max(1, int(max_size)))
+        # стек простаивающих соединений: (conn, время возврата в пул)
+        self._idle: list[tuple[http.client.HTTPConnection, float]] = []
+        self._closed = False
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def _checkout(self, timeout: float) -> tuple[http.client.HTTPConnection, bool]:
+        """Возвращает (соединение, reused)."""
+        now = time.monotonic()
+        stale: list[http.client.HTTPConnection] = []
+        conn = None
+        with self._lock:
+            while self._idle:
+                c, last_used = self._idle.pop()
+                if now - last_used > self.idle_timeout:
+                    stale.append(c)
+                    continue
+                conn = c
+                break
+        for c in stale:
+            c.close()
+        if conn is None:
+            return self._new_connection(timeout), False
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+        return conn, True
+
+    def _checkin(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if not self._closed and conn.sock is not None:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def request(
+        self,
+        method: str,
+        path: str,
+        body=None,
+        headers: dict | None = None,
+        timeout: float | None = None,
+    ) -> tuple[int, bytes]:
+        """
+        Выполняет запрос к base_path + path, возвращает (HTTP status, тело ответа).
+        body — bytes или повторно итерируемый объект с кусками bytes (тогда нужен Content-Length).
+        Тело вычитывается полностью, чтобы соединение можно было вернуть в пул.
+        """
+        timeout = self.timeout if timeout is None else timeout
+        url = self.base_path + path
+        hdrs = {"Connection": "keep-alive"}
+        if headers:
+            hdrs.update(headers)
+
+        self._slots.acquire()
+        try:
+            conn, reused = self._checkout(timeout)
+            while True:
+                try:
+                    conn.request(method, url, body=body, headers=hdrs)
+                    resp = conn.getresponse()
+                    data = resp.read()
+                except _STALE_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                    conn, reused = self._new_connection(timeout), False
+                    continue
+                except BaseException:
+                    conn.close()
+                    raise
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._checkin(conn)
+                return resp.status, data
+        finally:
+            self._slots.release()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for c, _ in idle:
+            c.close()
@@ -1,11 +1,24 @@
 import logging
+import os
 import time
-import traceback
 
-from bot.dispatcher import Dispatcher
+from bot.dispatcher import Dispatcher, dispatchSafe, getTelegramId
+from bot.worker_pool import KeyedWorkerPool, OffsetTracker
 import bot.telegram_client
 
-def startLongPolling(dispatcher: Dispatcher) -> None:
+POLL_WORKERS = int(os.getenv("LNH_POLL_WORKERS") or 8)
+POLL_QUEUE_SIZE = int(os.getenv("LNH_POLL_QUEUE_SIZE") or 1000)
+POLL_LIMIT = 100  # апдейтов за один getUpdates (максимум Bot API)
+
+def startLongPolling(dispatcher: Dispatcher, workers: int | None = None, queue_size: int | None = None) -> None:
+    workers = POLL_WORKERS if workers is None else workers
+    queue_size = POLL_QUEUE_SIZE if queue_size is None else queue_size
+    if workers <= 1:
+        _poll_inline(dispatcher)
+    else:
+        _poll_with_pool(dispatcher, workers, queue_size)
+
+def _poll_inline(dispatcher: Dispatcher) -> None:
     next_offset = 0
     while True:
         try:
@@ -18,8 +31,43 @@ def startLongPolling(dispatcher: Dispatcher) -> None:
             continue
         for upd in updates:
             next_offset = max(next_offset, upd["update_id"] + 1)
+            dispatchSafe(dispatcher, upd)
+
+def _poll_with_pool(dispatcher: Dispatcher, workers: int, queue_size: int) -> None:
+    """
+    Апдейты разных пользователей обрабатываются параллельно, одного пользователя — по порядку.
+    offset подтверждает только непрерывный префикс завершённых апдейтов; незавершённые
+    Telegram возвращает повторно — такие пропускаем по update_id. Долгий апдейт держит
+    offset не дальше половины окна POLL_LIMIT (OffsetTracker.committed), приём новых не встаёт.
+    """
+    tracker = OffsetTracker()
+    pool = KeyedWorkerPool(
+        lambda upd: dispatchSafe(dispatcher, upd),
+        workers=workers,
+        queue_size=queue_size,
+        on_done=lambda upd: tracker.markDone(upd["update_id"]),
+    ).start()
+    try:
+        while True:
             try:
-                dispatcher.dispatch(upd)
-            except Exception:
-                traceback.print_exc()
-                pass
\ No newline at end of file
+                updates = bot.telegram_client.getUpdates(
+                    offset=tracker.committed(POLL_LIMIT), timeout=50, limit=POLL_LIMIT
+                )
+            except Exception as e:
+                logging.warning("getUpdates failed: %s", e)
+                time.sleep(2)
+                continue
+
+            fresh = [u for u in updates if tracker.isNew(u["update_id"])]
+            if updates and not fresh:
+                # пришли только уже принятые в работу апдейты: ждём, пока что-то завершится,
+                # иначе getUpdates будет возвращаться мгновенно и крутить цикл впустую
+                tracker.waitProgress(1.0)
+                continue
+
+            for upd in fresh:
+                tracker.markSeen(upd["update_id"])
+                key = getTelegramId(upd) or ("update", upd["update_id"])
+                pool.submit(key, upd)
+    finally:
+        pool.stop(wait=False)
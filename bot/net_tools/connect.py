@@ -0,0 +1,192 @@
+from __future__ import annotations
+
+import errno
+import ipaddress
+import os
+import selectors
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+from dataclasses import dataclass, field
+from typing import List
+
+from bot.net_tools import dns as dns_tool
+
+# RFC 8305 (Happy Eyeballs v2): следующий адрес стартует, если предыдущий не подключился за эту задержку
+CONNECT_ATTEMPT_DELAY_MS = int(os.getenv("LNH_CONNECT_ATTEMPT_DELAY_MS") or 250)
+_RESOLUTION_DELAY = 0.05  # сколько ждать ответ второго семейства после первого ответа с адресами (RFC 8305 §3)
+_IN_PROGRESS = (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN, errno.EALREADY)
+
+
+@dataclass
+class Connected:
+    sock: socket.socket
+    address: str                   # адрес, подключившийся первым
+    port: int
+    connect_ms: float              # от старта гонки до установленного TCP
+    attempts: int                  # сколько адресов успели попробовать
+    candidates: List[str] = field(default_factory=list)
+
+
+class ConnectError(OSError):
+    """Ни один адрес не подключился; errors — [(адрес, причина)]."""
+
+    def __init__(self, message: str, errors: list[tuple[str, str]] | None = None) -> None:
+        super().__init__(message)
+        self.errors = errors or []
+
+
+def _interleave(v6: list[str], v4: list[str]) -> list[tuple[int, str]]:
+    """IPv6 и IPv4 через один, начиная с IPv6 (RFC 8305 §4)."""
+    out = []
+    for i in range(max(len(v6), len(v4))):
+        if i < len(v6):
+            out.append((socket.AF_INET6, v6[i]))
+        if i < len(v4):
+            out.append((socket.AF_INET, v4[i]))
+    return out
+
+def _literal(host: str) -> list[tuple[int, str]] | None:
+    try:
+        ip = ipaddress.ip_address(host.strip("[]"))
+    except ValueError:
+        return None
+    return [(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, str(ip))]
+
+def is_public_address(address: str) -> bool:
+    """Тот же критерий, что у целей пользователя в хэндлерах: не private/loopback/link-local/multicast/reserved."""
+    ip = ipaddress.ip_address(address)
+    return not (ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_reserved)
+
+def _system_addresses(host: str, port: int) -> list[tuple[int, str]]:
+    """Запасной путь через getaddrinfo: имена из /etc/hosts, localhost и т.п."""
+    infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    v6 = list(dict.fromkeys(i[4][0] for i in infos if i[0] == socket.AF_INET6))
+    v4 = list(dict.fromkeys(i[4][0] for i in infos if i[0] == socket.AF_INET))
+    return _interleave(v6, v4)
+
+def resolve_addresses(host: str, port: int, timeout: float = 4.0) -> list[tuple[int, str]]:
+    """
+    [(семейство, адрес)] в порядке попыток. AAAA и A запрашиваются параллельно через DNS-слой бота
+    (кэш + пул upstream'ов); после первого ответа с адресами второй ждём не дольше _RESOLUTION_DELAY.
+    Если DNS-слой адресов не дал — системный getaddrinfo.
+    """
+    literal = _literal(host)
+    if literal:
+        return literal
+
+    futures = dict(zip(dns_tool.lookup_many(host, ("AAAA", "A"), timeout=timeout), ("AAAA", "A")))
+    deadline = time.monotonic() + timeout
+    pending = set(futures)
+    found: dict[str, list[str]] = {"AAAA": [], "A": []}
+    while pending:
+        budget = deadline - time.monotonic()
+        if any(found.values()):
+            budget = min(budget, _RESOLUTION_DELAY)
+        done, pending = wait(pending, timeout=max(0.0, budget), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for f in done:
+            res = f.result()
+            if res.ok:
+                found[futures[f]] = [a.value for a in res.answers]
+
+    addrs = _interleave(found["AAAA"], found["A"])
+    if addrs:
+        return addrs
+    try:
+        return _system_addresses(host, port)
+    except socket.gaierror as e:
+        raise ConnectError(f"не удалось разрешить {host}: {e}") from None
+
+def _describe(err: int) -> str:
+    return os.strerror(err) if err else "timed out"
+
+def connect(host: str, port: int, timeout: float = 7.0,
+            attempt_delay: float = CONNECT_ATTEMPT_DELAY_MS / 1000, public_only: bool = False) -> Connected:
+    """
+    TCP-подключение к host:port по схеме Happy Eyeballs: адреса пробуются по очереди с шагом
+    attempt_delay, не дожидаясь таймаута предыдущих; отказ адреса сразу запускает следующий.
+    Побеждает первый установленный; остальные закрываются. timeout — общий на резолв и гонку,
+    он же ставится на возвращённый сокет (как у socket.create_connection).
+    public_only — только публичные адреса (is_public_address): для хостов, которые назвал не
+    пользователь и не конфиг, а ответ стороннего сервера.
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    addrs = resolve_addresses(host, port, timeout=min(timeout, 4.0))
+    if public_only:
+        rejected = [a for _f, a in addrs if not is_public_address(a)]
+        addrs = [(f, a) for f, a in addrs if is_public_address(a)]
+        if not addrs and rejected:
+            raise ConnectError(f"{host}: только непубличные адреса ({', '.join(rejected)})")
+    if not addrs:
+        raise ConnectError(f"нет адресов для {host}")
+
+    sel = selectors.DefaultSelector()
+    pending: dict[socket.socket, str] = {}
+    errors: list[tuple[str, str]] = []
+    next_start = time.monotonic()
+    i = 0
+
+    def winner(sock: socket.socket, address: str) -> Connected:
+        sock.setblocking(True)
+        sock.settimeout(max(0.05, deadline - time.monotonic()))
+        return Connected(
+            sock=sock, address=address, port=port,
+            connect_ms=(time.monotonic() - started) * 1000, attempts=i,
+            candidates=[a for _f, a in addrs],
+        )
+
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            if i < len(addrs) and (now >= next_start or not pending):
+                family, address = addrs[i]
+                i += 1
+                try:
+                    sock = socket.socket(family, socket.SOCK_STREAM)
+                except OSError as e:
+                    errors.append((address, str(e)))
+                    continue
+                sock.setblocking(False)
+                err = sock.connect_ex((address, port))
+                if err == 0:
+                    return winner(sock, address)
+                if err not in _IN_PROGRESS:
+                    errors.append((address, _describe(err)))
+                    sock.close()
+                    continue
+                sel.register(sock, selectors.EVENT_WRITE)
+                pending[sock] = address
+                next_start = now + attempt_delay
+                continue
+            if not pending:
+                break
+
+            budget = deadline - now
+            if i < len(addrs):
+                budget = min(budget, next_start - now)
+            for key, _ev in sel.select(max(0.0, budget)):
+                sock = key.fileobj
+                address = pending.pop(sock)
+                sel.unregister(sock)
+                err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+                if err == 0:
+                    return winner(sock, address)
+                errors.append((address, _describe(err)))
+                sock.close()
+                next_start = time.monotonic()  # отказ — следующий адрес без ожидания
+    finally:
+        for sock in pending:
+            sock.close()
+        sel.close()
+
+    errors += [(a, "timed out") for a in pending.values()]
+    if not errors or all(reason == "timed out" for _a, reason in errors):
+        raise TimeoutError(f"timed out connecting to {host}:{port}")
+    raise ConnectError(
+        f"не удалось подключиться к {host}:{port}: " + "; ".join(f"{a}: {r}" for a, r in errors), errors
+    )
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, replace
 from typing import List, Optional, Tuple
+import math
+import os
+import threading
+import time
 
 import dns.resolver
 import dns.reversename
 import dns.exception
 import dns.rdatatype
 
+from bot.net_tools.resolver_pool import DNS_BULK_WORKERS, DNS_WORKERS, get_resolver_pool
+
 @dataclass
 class DnsRecord:
     value: str
@@ -22,6 +30,98 @@ class DnsResult:
     cname: Optional[str] = None
     resolver: Optional[str] = None
     error: Optional[str] = None
+    cached: bool = False  # ответ из локального кэша; ttl в answers — оставшийся
+
+DNS_CACHE_SIZE = int(os.getenv("LNH_DNS_CACHE_SIZE") or 4096)
+DNS_CACHE_MIN_TTL = int(os.getenv("LNH_DNS_CACHE_MIN_TTL") or 5)
+DNS_CACHE_MAX_TTL = int(os.getenv("LNH_DNS_CACHE_MAX_TTL") or 3600)
+DNS_NEGATIVE_MAX_TTL = int(os.getenv("LNH_DNS_NEGATIVE_MAX_TTL") or 300)
+_NEGATIVE_DEFAULT_TTL = 60  # если в ответе нет SOA
+
+class _DnsCache:
+    """
+    LRU-кэш ответов по (qname, rrtype) со сроком жизни из TTL записей.
+    NXDOMAIN/NoAnswer кэшируются на min(SOA.ttl, SOA.minimum) (RFC 2308).
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max(0, max_size)
+        self._lock = threading.Lock()
+        self._items: OrderedDict[tuple[str, str], tuple[DnsResult, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple[str, str]) -> DnsResult | None:
+        with self._lock:
+            item = self._items.get(key)
+            now = time.monotonic()
+            if item is None or item[1] <= now:
+                if item is not None:
+                    del self._items[key]
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            res, expires = item
+        left = max(1, math.ceil(expires - now))
+        return replace(
+            res,
+            answers=[DnsRecord(a.value, left if a.ttl is not None else None) for a in res.answers],
+            cached=True,
+        )
+
+    def put(self, key: tuple[str, str], res: DnsResult, ttl: float) -> None:
+        if self.max_size == 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._items[key] = (res, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+_cache = _DnsCache(DNS_CACHE_SIZE)
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+def _clamp(ttl: float, hi: int) -> float:
+    return max(DNS_CACHE_MIN_TTL, min(hi, ttl))
+
+def _negative_ttl(e: Exception) -> float | None:
+    """TTL для кэширования NXDOMAIN/NoAnswer по SOA из authority; None — не кэшируем."""
+    if not isinstance(e, (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer)):
+        return None
+    responses = []
+    try:
+        if isinstance(e, dns.resolver.NXDOMAIN):
+            responses = list(e.responses().values())
+        else:
+            responses = [e.response()]
+    except Exception:
+        pass
+    for resp in responses:
+        for rrset in getattr(resp, "authority", None) or []:
+            if rrset.rdtype == dns.rdatatype.SOA and len(rrset):
+                return _clamp(min(rrset.ttl, rrset[0].minimum), DNS_NEGATIVE_MAX_TTL)
+    return _clamp(_NEGATIVE_DEFAULT_TTL, DNS_NEGATIVE_MAX_TTL)
+
+def _store(key: tuple[str, str], res: DnsResult, error: Exception | None = None) -> None:
+    if res.ok:
+        ttls = [a.ttl for a in res.answers if a.ttl is not None]
+        if ttls:
+            _cache.put(key, res, _clamp(min(ttls), DNS_CACHE_MAX_TTL))
+    elif error is not None:
+        ttl = _negative_ttl(error)
+        if ttl is not None:
+            _cache.put(key, res, ttl)
 
 def _format_txt(rdata) -> str:
     # rdata.strings в dnspython<2.4, rdata.strings-like в новых версиях
@@ -33,16 +133,16 @@ def _format_txt(rdata) -> str:
         except Exception:
             return str(rdata)
 
-def lookup(name: str, rrtype: str, timeout: float = 4.0) -> DnsResult:
+_VALID_TYPES = {"A", "AAAA", "CNAME", "MX", "TXT", "NS", "PTR"}
+
+def _prepare_query(name: str, rrtype: str) -> tuple[str, str, DnsResult | None]:
     """
-    Выполняет DNS-запрос rrtype для name.
-    rrtype ∈ {A, AAAA, CNAME, MX, TXT, NS, PTR}
+    Нормализует (name, rrtype) -> (qname, rrtype, ошибка или None).
     Для PTR name может быть IPv4 — конвертируем в in-addr.arpa.
     """
     rrtype = rrtype.upper().strip()
-    valid_types = {"A", "AAAA", "CNAME", "MX", "TXT", "NS", "PTR"}
-    if rrtype not in valid_types:
-        return DnsResult(False, rrtype, name, [], error="unsupported type")
+    if rrtype not in _VALID_TYPES:
+        return name, rrtype, DnsResult(False, rrtype, name, [], error="unsupported type")
 
     qname = name.strip().rstrip(".")
     if rrtype == "PTR":
@@ -51,51 +151,112 @@ def lookup(name: str, rrtype: str, timeout: float = 4.0) -> DnsResult:
             rev = dns.reversename.from_address(qname)
             qname = rev.to_text().rstrip(".")
         except Exception:
-            return DnsResult(False, rrtype, name, [], error="invalid IPv4 for PTR")
+            return name, rrtype, DnsResult(False, rrtype, name, [], error="invalid IPv4 for PTR")
+    return qname, rrtype, None
 
-    resolver = dns.resolver.Resolver()
-    resolver.lifetime = timeout  # общий таймаут
-    resolver.timeout = timeout   # таймаут на один nameserver
+def _result_from_answer(answer, rrtype: str, qname: str, ns_used: str) -> DnsResult:
+    answers: list[DnsRecord] = []
 
+    # ttl одинаков для набора ответов, но укажем на каждом для удобства
+    ttl = getattr(answer.rrset, "ttl", None)
+    cname = None
     try:
-        answer = resolver.resolve(qname, rrtype, lifetime=timeout)
-        answers: list[DnsRecord] = []
-
-        # ttl одинаков для набора ответов, но укажем на каждом для удобства
-        ttl = getattr(answer.rrset, "ttl", None)
+        cname = answer.canonical_name.to_text().rstrip(".") if answer.canonical_name else None
+    except Exception:
         cname = None
-        try:
-            cname = answer.canonical_name.to_text().rstrip(".") if answer.canonical_name else None
-        except Exception:
-            cname = None
-
-        for rdata in answer:
-            if rrtype == "A":
-                answers.append(DnsRecord(rdata.address, ttl))
-            elif rrtype == "AAAA":
-                answers.append(DnsRecord(rdata.address, ttl))
-            elif rrtype == "CNAME":
-                answers.append(DnsRecord(rdata.target.to_text().rstrip("."), ttl))
-            elif rrtype == "MX":
-                answers.append(DnsRecord(f"{rdata.preference} {rdata.exchange.to_text().rstrip('.')}", ttl))
-            elif rrtype == "TXT":
-                answers.append(DnsRecord(_format_txt(rdata), ttl))
-            elif rrtype == "NS":
-                answers.append(DnsRecord(rdata.target.to_text().rstrip("."), ttl))
-            elif rrtype == "PTR":
-                answers.append(DnsRecord(rdata.target.to_text().rstrip("."), ttl))
-            else:
-                answers.append(DnsRecord(rdata.to_text(), ttl))
-
-        ns_used = ",".join(getattr(resolver, "nameservers", []) or [])
-        return DnsResult(True, rrtype, qname, answers, cname=cname, resolver=ns_used)
-    except dns.resolver.NXDOMAIN:
+
+    for rdata in answer:
+        if rrtype == "A":
+            answers.append(DnsRecord(rdata.address, ttl))
+        elif rrtype == "AAAA":
+            answers.append(DnsRecord(rdata.address, ttl))
+        elif rrtype == "CNAME":
+            answers.append(DnsRecord(rdata.target.to_text().rstrip("."), ttl))
+        elif rrtype == "MX":
+            answers.append(DnsRecord(f"{rdata.preference} {rdata.exchange.to_text().rstrip('.')}", ttl))
+        elif rrtype == "TXT":
+            answers.append(DnsRecord(_format_txt(rdata), ttl))
+        elif rrtype == "NS":
+            answers.append(DnsRecord(rdata.target.to_text().rstrip("."), ttl))
+        elif rrtype == "PTR":
+            answers.append(DnsRecord(rdata.target.to_text().rstrip("."), ttl))
+        else:
+            answers.append(DnsRecord(rdata.to_text(), ttl))
+
+    return DnsResult(True, rrtype, qname, answers, cname=cname, resolver=ns_used)
+
+def _result_from_error(e: Exception, rrtype: str, qname: str) -> DnsResult:
+    if isinstance(e, dns.resolver.NXDOMAIN):
         return DnsResult(False, rrtype, qname, [], error="NXDOMAIN (name does not exist)")
-    except dns.resolver.NoAnswer:
+    if isinstance(e, dns.resolver.NoAnswer):
         return DnsResult(False, rrtype, qname, [], error="No answer")
-    except dns.resolver.Timeout:
+    if isinstance(e, dns.resolver.Timeout):
         return DnsResult(False, rrtype, qname, [], error="Timeout")
-    except dns.exception.DNSException as e:
+    if isinstance(e, dns.exception.DNSException):
         return DnsResult(False, rrtype, qname, [], error=f"DNS error: {e}")
+    return DnsResult(False, rrtype, qname, [], error=f"Unexpected error: {e}")
+
+def lookup(name: str, rrtype: str, timeout: float = 4.0, use_cache: bool = True, bulk: bool = False) -> DnsResult:
+    """
+    Выполняет DNS-запрос rrtype для name.
+    rrtype ∈ {A, AAAA, CNAME, MX, TXT, NS, PTR}
+    Для PTR name может быть IPv4 — конвертируем в in-addr.arpa.
+    Ответы кэшируются на их TTL (см. _DnsCache); use_cache=False — всегда живой запрос.
+    Запрос идёт через общий пул upstream'ов (resolver_pool): timeout — общий на всю гонку.
+    bulk=True — запрос пакетной задачи, в отдельных потоках resolver_pool.
+    """
+    qname, rrtype, err = _prepare_query(name, rrtype)
+    if err:
+        return err
+    key = (qname.lower(), rrtype)
+    if use_cache:
+        hit = _cache.get(key)
+        if hit is not None:
+            return hit
+
+    try:
+        answer, ns_used = get_resolver_pool().resolve(qname, rrtype, timeout, bulk=bulk)
+        res = _result_from_answer(answer, rrtype, qname, ns_used)
+        _store(key, res)
+        return res
+    except Exception as e:
+        res = _result_from_error(e, rrtype, qname)
+        _store(key, res, e)
+        return res
+
+async def lookup_async(name: str, rrtype: str, timeout: float = 4.0, use_cache: bool = True) -> DnsResult:
+    """Асинхронный вариант lookup() на dns.asyncresolver — не занимает поток на время ожидания."""
+    qname, rrtype, err = _prepare_query(name, rrtype)
+    if err:
+        return err
+    key = (qname.lower(), rrtype)
+    if use_cache:
+        hit = _cache.get(key)
+        if hit is not None:
+            return hit
+
+    try:
+        answer, ns_used = await get_resolver_pool().resolve_async(qname, rrtype, timeout)
+        res = _result_from_answer(answer, rrtype, qname, ns_used)
+        _store(key, res)
+        return res
     except Exception as e:
-        return DnsResult(False, rrtype, qname, [], error=f"Unexpected error: {e}")
\ No newline at end of file
+        res = _result_from_error(e, rrtype, qname)
+        _store(key, res, e)
+        return res
+
+# lookup_many: свой пул, т.к. lookup() сам ждёт задач в пуле resolver_pool;
+# у пакетных задач — отдельный и меньший, чтобы загруженный список не вытеснял одиночные запросы
+_many_executor = ThreadPoolExecutor(max_workers=DNS_WORKERS, thread_name_prefix="dns-many")
+_bulk_many_executor = ThreadPoolExecutor(max_workers=max(1, DNS_BULK_WORKERS), thread_name_prefix="dns-many-bulk")
+
+def lookup_many(name: str, rrtypes: Tuple[str, ...], timeout: float = 4.0, use_cache: bool = True,
+                bulk: bool = False) -> list[Future]:
+    """
+    Запускает lookup() по нескольким типам параллельно и сразу возвращает futures
+    (результат каждого — DnsResult). Общее время — как у самого медленного запроса.
+    bulk=True — для пакетных задач: не больше DNS_BULK_WORKERS запросов одновременно,
+    остальные ждут в очереди своего пула, не занимая потоки одиночных запросов.
+    """
+    executor = _bulk_many_executor if bulk else _many_executor
+    return [executor.submit(lookup, name, t, timeout, use_cache, bulk) for t in rrtypes]
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import os
+import select
+import socket
+import struct
+import threading
+import time
+from typing import Callable
+
+_ECHO_REQUEST = 8
+_ECHO_REPLY = 0
+_PAYLOAD = b"little-net-helper"  # 17 байт + 8 байт заголовка ICMP
+
+
+def _checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    s = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    s = (s >> 16) + (s & 0xFFFF)
+    s += s >> 16
+    return ~s & 0xFFFF
+
+def _echo_request(ident: int, seq: int) -> bytes:
+    header = struct.pack("!BBHHH", _ECHO_REQUEST, 0, 0, ident, seq)
+    csum = _checksum(header + _PAYLOAD)
+    return struct.pack("!BBHHH", _ECHO_REQUEST, 0, csum, ident, seq) + _PAYLOAD
+
+def _open_socket() -> tuple[socket.socket, bool]:
+    """
+    (сокет, raw). Сначала непривилегированный ICMP datagram-сокет Linux
+    (net.ipv4.ping_group_range), затем raw (root / CAP_NET_RAW).
+    """
+    try:
+        return socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP), False
+    except OSError:
+        return socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP), True
+
+
+class PingSession:
+    """
+    Один ping: count эхо-запросов к addr с интервалом interval. Пакет без ответа дольше
+    timeout — потерян; по deadline (если задан) сессия завершается, неотправленные не считаются.
+    Все изменения — в потоке движка; читать rtts/transmitted после done.
+    on_event(session, index, rtt_ms | None) вызывается в потоке движка на каждый ответ/потерю.
+    """
+
+    def __init__(
+        self,
+        addr: str,
+        count: int,
+        interval: float,
+        timeout: float,
+        deadline: float | None,
+        on_event: Callable[[PingSession, int, float | None], None] | None = None,
+    ) -> None:
+        self.addr = addr
+        self.count = count
+        self.interval = interval
+        self.timeout = timeout
+        self.started = time.monotonic()
+        self.deadline_at = self.started + deadline if deadline else None
+        self.on_event = on_event
+
+        self.transmitted = 0
+        self.resolved = 0  # пакетов с ответом или истёкшим ожиданием
+        self.rtts: list[float | None] = []  # по номеру пакета; None — потерян
+        self.errors: list[str] = []
+        self.done = threading.Event()
+        self._outstanding = 0
+        self._cb_lock = threading.Lock()
+        self._done_callbacks: list[Callable[[PingSession], None]] = []
+
+    def add_done_callback(self, fn: Callable[[PingSession], None]) -> None:
+        """fn(session) после завершения (сразу, если уже завершена)."""
+        with self._cb_lock:
+            if not self.done.is_set():
+                self._done_callbacks.append(fn)
+                return
+        fn(self)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        return self.done.wait(timeout)
+
+
+class IcmpEngine:
+    """
+    ICMP echo в процессе: один сокет и один поток на все сессии.
+    Ответы сопоставляются по (адрес, seq); seq — общий 16-битный счётчик движка,
+    поэтому параллельные сессии к одному хосту не путаются. Поток ждёт в select()
+    одновременно сокет и ближайший таймер (отправка очередного пакета, истечение ожидания).
+    """
+
+    def __init__(self) -> None:
+        self._sock, self.raw = _open_socket()
+        self._sock.setblocking(False)
+        # для datagram-сокета ядро само подставляет id (локальный «порт» сокета)
+        self._ident = os.getpid() & 0xFFFF if self.raw else 0
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+        self._pending: dict[tuple[str, int], tuple[PingSession, int, float]] = {}
+        self._timers: list[tuple[float, int, Callable[[], None]]] = []
+        self._tie = itertools.count()
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._thread = threading.Thread(target=self._loop, name="icmp", daemon=True)
+        self._thread.start()
+
+    # --- API
+
+    def start(self, session: PingSession) -> PingSession:
+        self._schedule(session.started, lambda: self._send_next(session))
+        if session.deadline_at is not None:
+            self._schedule(session.deadline_at, lambda: self._maybe_finish(session, force=True))
+        return session
+
+    def ping(self, addr: str, count: int = 10, interval: float = 1.0, timeout: float = 2.0,
+             deadline: float | None = None, on_event=None) -> PingSession:
+        return self.start(PingSession(addr, count, interval, timeout, deadline, on_event))
+
+    # --- поток движка
+
+    def _schedule(self, when: float, fn: Callable[[], None]) -> None:
+        with self._lock:
+            heapq.heappush(self._timers, (when, next(self._tie), fn))
+        try:
+            self._wake_w.send(b"\0")
+        except OSError:
+            pass
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                wait = self._timers[0][0] - time.monotonic() if self._timers else 1.0
+            try:
+                readable, _, _ = select.select([self._sock, self._wake_r], [], [], min(1.0, max(0.0, wait)))
+            except OSError:
+                logging.exception("icmp engine select failed")
+                time.sleep(0.1)
+                continue
+            if self._wake_r in readable:
+                try:
+                    while self._wake_r.recv(4096):
+                        pass
+                except BlockingIOError:
+                    pass
+            if self._sock in readable:
+                self._read_replies()
+            self._run_timers()
+
+    def _run_timers(self) -> None:
+        while True:
+            with self._lock:
+                if not self._timers or self._timers[0][0] > time.monotonic():
+                    return
+                _, _, fn = heapq.heappop(self._timers)
+            try:
+                fn()
+            except Exception:
+                logging.exception("icmp engine timer failed")
+
+    def _read_replies(self) -> None:
+        while True:
+            try:
+                data, (src, _port) = self._sock.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError:
+                return
+            now = time.monotonic()
+            if self.raw:
+                data = data[(data[0] & 0x0F) * 4:]  # raw-сокет отдаёт и IP-заголовок
+            if len(data) < 8:
+                continue
+            icmp_type, _code, _csum, ident, seq = struct.unpack("!BBHHH", data[:8])
+            if icmp_type != _ECHO_REPLY or (self.raw and ident != self._ident):
+                continue
+            item = self._pending.pop((src, seq), None)
+            if item is None:
+                continue  # дубликат или ответ после таймаута
+            session, index, sent_at = item
+            self._resolve(session, index, (now - sent_at) * 1000)
+
+    def _send_next(self, s: PingSession) -> None:
+        now = time.monotonic()
+        if s.done.is_set() or s.transmitted >= s.count:
+            return
+
+        index = s.transmitted
+        seq = next(self._seq) & 0xFFFF
+        s.transmitted += 1
+        s.rtts.append(None)
+        try:
+            self._sock.sendto(_echo_request(self._ident, seq), (s.addr, 0))
+        except OSError as e:
+            s.errors.append(str(e))
+            s._outstanding += 1
+            self._resolve(s, index, None)
+        else:
+            s._outstanding += 1
+            self._pending[(s.addr, seq)] = (s, index, now)
+            self._schedule(now + s.timeout, lambda: self._expire(s, seq, index))
+
+        if s.transmitted < s.count:
+            self._schedule(now + s.interval, lambda: self._send_next(s))
+
+    def _expire(self, s: PingSession, seq: int, index: int) -> None:
+        if self._pending.pop((s.addr, seq), None) is not None:
+            self._resolve(s, index, None)
+
+    def _resolve(self, s: PingSession, index: int, rtt_ms: float | None) -> None:
+        if s.done.is_set():
+            return
+        s.rtts[index] = rtt_ms
+        s.resolved += 1
+        s._outstanding -= 1
+        if s.on_event:
+            try:
+                s.on_event(s, index, rtt_ms)
+            except Exception:
+                logging.exception("ping on_event failed")
+        self._maybe_finish(s)
+
+    def _maybe_finish(self, s: PingSession, force: bool = False) -> None:
+        if s.done.is_set():
+            return
+        if not force and (s.transmitted < s.count or s._outstanding > 0):
+            return
+        # по deadline: ждущие ответа пакеты считаем потерянными
+        for key in [k for k, v in self._pending.items() if v[0] is s]:
+            del self._pending[key]
+        with s._cb_lock:
+            s.done.set()
+            callbacks, s._done_callbacks = s._done_callbacks, []
+        for fn in callbacks:
+            try:
+                fn(s)
+            except Exception:
+                logging.exception("ping done callback failed")
+
+
+_engine: IcmpEngine | None = None
+_engine_error: Exception | None = None
+_engine_lock = threading.Lock()
+
+def get_engine() -> IcmpEngine | None:
+    """Общий движок; None, если ICMP-сокет открыть нельзя (нет прав) — тогда нужен /bin/ping."""
+    global _engine, _engine_error
+    if _engine is None and _engine_error is None:
+        with _engine_lock:
+            if _engine is None and _engine_error is None:
+                try:
+                    _engine = IcmpEngine()
+                except OSError as e:
+                    _engine_error = e
+                    logging.warning("ICMP sockets unavailable (%s), falling back to ping binary", e)
+    return _engine
@@ -1,6 +1,19 @@
+import math
+import os
 import re
+import socket
 import subprocess
-from dataclasses import dataclass
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, ContextManager, Iterator
+
+from bot.net_tools import icmp
+
+# native — ICMP-сокеты в процессе (icmp.py); subprocess — /bin/ping. Без прав на ICMP-сокеты
+# native сам откатывается на subprocess.
+PING_ENGINE = (os.getenv("LNH_PING_ENGINE") or "native").strip().lower()
+PING_SWEEP_CONCURRENCY = int(os.getenv("LNH_PING_SWEEP_CONCURRENCY") or 32)
 
 @dataclass
 class PingResult:
@@ -13,33 +26,53 @@ class PingResult:
     max_ms: float | None
     stddev_ms: float | None
     raw_tail: str
+    rtts_ms: list[float | None] = field(default_factory=list)  # по пакетам; None — потерян
+    jitter_ms: float | None = None  # средний |Δrtt| соседних ответов
+    p50_ms: float | None = None
+    p95_ms: float | None = None
 
-def run(host: str, count: int = 10, deadline_s: int | None = None, per_reply_timeout_s: int = 2) -> PingResult:
-    """
-    Выполняет `ping -c <count> -n -W <per_reply_timeout> [-w <deadline>] <host>`
-    Работает на Linux/WSL. Без прав root.
-    """
+def _build_args(host: str, count: int, deadline_s: int | None, per_reply_timeout_s: int) -> list[str]:
     args = ["ping", "-c", str(count), "-n", "-W", str(per_reply_timeout_s)]
     if deadline_s:
         args += ["-w", str(deadline_s)]
     args.append(host)
+    return args
 
-    try:
-        proc = subprocess.run(
-            args,
-            capture_output=True,
-            text=True,
-            timeout=max(5, count * (per_reply_timeout_s + 1)),
-            check=False,
-        )
-    except Exception as e:
-        return PingResult(
-            ok=False, transmitted=0, received=0, loss_pct=100.0,
-            min_ms=None, avg_ms=None, max_ms=None, stddev_ms=None,
-            raw_tail=f"ping failed: {e}"
-        )
+def _failed(reason: str) -> PingResult:
+    return PingResult(
+        ok=False, transmitted=0, received=0, loss_pct=100.0,
+        min_ms=None, avg_ms=None, max_ms=None, stddev_ms=None,
+        raw_tail=reason
+    )
 
-    out = (proc.stdout or "") + (("\n" + proc.stderr) if proc.stderr else "")
+def _percentile(sorted_vals: list[float], q: float) -> float:
+    # nearest-rank
+    return sorted_vals[max(0, math.ceil(q / 100 * len(sorted_vals)) - 1)]
+
+def _summarize(transmitted: int, rtts: list[float | None], raw_tail: str) -> PingResult:
+    """PingResult по списку RTT; min/avg/max/mdev считаются как у iputils ping."""
+    got = [r for r in rtts if r is not None]
+    received = len(got)
+    loss = 100.0 * (transmitted - received) / transmitted if transmitted else 100.0
+    res = PingResult(
+        ok=received > 0, transmitted=transmitted, received=received, loss_pct=round(loss, 1),
+        min_ms=None, avg_ms=None, max_ms=None, stddev_ms=None, raw_tail=raw_tail, rtts_ms=list(rtts),
+    )
+    if got:
+        avg = sum(got) / received
+        res.min_ms, res.avg_ms, res.max_ms = min(got), avg, max(got)
+        res.stddev_ms = math.sqrt(max(0.0, sum(r * r for r in got) / received - avg * avg))
+        ordered = sorted(got)
+        res.p50_ms = _percentile(ordered, 50)
+        res.p95_ms = _percentile(ordered, 95)
+        if received > 1:
+            res.jitter_ms = sum(abs(b - a) for a, b in zip(got, got[1:])) / (received - 1)
+    return res
+
+# 64 bytes from 8.8.8.8: icmp_seq=1 ttl=117 time=29.9 ms
+_REPLY_RE = re.compile(r"icmp_seq=(\d+)\b.*?time[=<]([\d.]+)\s*ms")
+
+def _parse_output(out: str) -> PingResult:
     tail = "\n".join(out.strip().splitlines()[-6:])  # оставим хвост (stat + rtt)
 
     # 10 packets transmitted, 10 received, 0% packet loss, time 9014ms
@@ -54,11 +87,7 @@ def run(host: str, count: int = 10, deadline_s: int | None = None, per_reply_tim
     )
 
     if not m1:
-        return PingResult(
-            ok=False, transmitted=0, received=0, loss_pct=100.0,
-            min_ms=None, avg_ms=None, max_ms=None, stddev_ms=None,
-            raw_tail=tail or out[-500:]
-        )
+        return _failed(tail or out[-500:])
 
     tx = int(m1.group("tx"))
     rx = int(m1.group("rx"))
@@ -71,14 +100,146 @@ def run(host: str, count: int = 10, deadline_s: int | None = None, per_reply_tim
         max_ms = float(m2.group("max"))
         stddev_ms = float(m2.group("std"))
 
-    return PingResult(
-        ok=rx > 0 and loss < 100.0,
-        transmitted=tx,
-        received=rx,
-        loss_pct=loss,
-        min_ms=min_ms,
-        avg_ms=avg_ms,
-        max_ms=max_ms,
-        stddev_ms=stddev_ms,
-        raw_tail=tail,
-    )
\ No newline at end of file
+    rtts: list[float | None] = [None] * tx
+    for m in _REPLY_RE.finditer(out):
+        i = int(m.group(1)) - 1
+        if 0 <= i < tx and rtts[i] is None:
+            rtts[i] = float(m.group(2))
+
+    res = _summarize(tx, rtts, tail)
+    # итоги берём у ping: они точнее распарсенных построчно
+    res.ok = rx > 0 and loss < 100.0
+    res.received = rx
+    res.loss_pct = loss
+    res.min_ms, res.avg_ms, res.max_ms, res.stddev_ms = min_ms, avg_ms, max_ms, stddev_ms
+    return res
+
+def _native_tail(host: str, addr: str, s: icmp.PingSession, res: PingResult) -> str:
+    """Хвост в духе вывода ping: последние ответы + итог."""
+    lines = []
+    for i, rtt in list(enumerate(s.rtts))[-4:]:
+        lines.append(f"icmp_seq={i + 1} " + (f"time={rtt:.2f} ms" if rtt is not None else "timeout"))
+    lines.extend(s.errors[-1:])
+    lines.append(
+        f"--- {host} ({addr}) ---\n"
+        f"{res.transmitted} packets transmitted, {res.received} received, {res.loss_pct:g}% packet loss"
+    )
+    if res.avg_ms is not None:
+        lines.append(
+            f"rtt min/avg/max/mdev = {res.min_ms:.3f}/{res.avg_ms:.3f}/{res.max_ms:.3f}/{res.stddev_ms:.3f} ms"
+        )
+    return "\n".join(lines)
+
+def _native_result(host: str, addr: str, s: icmp.PingSession) -> PingResult:
+    res = _summarize(s.transmitted, s.rtts, "")
+    res.raw_tail = _native_tail(host, addr, s, res)
+    return res
+
+def _partial(s: icmp.PingSession) -> PingResult:
+    """Промежуточный итог: только пакеты, по которым уже ясно — ответ или потеря."""
+    got = [r for r in s.rtts if r is not None]
+    return _summarize(s.resolved, got + [None] * (s.resolved - len(got)), "")
+
+def _resolve_ipv4(host: str) -> str:
+    return socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_RAW)[0][4][0]
+
+def _engine() -> icmp.IcmpEngine | None:
+    return icmp.get_engine() if PING_ENGINE == "native" else None
+
+def run(
+    host: str,
+    count: int = 10,
+    deadline_s: int | None = None,
+    per_reply_timeout_s: int = 2,
+    on_progress: Callable[[PingResult], None] | None = None,
+) -> PingResult:
+    """
+    ping host: count пакетов раз в секунду, ожидание ответа per_reply_timeout_s, всего не дольше deadline_s.
+    Через движок icmp (ICMP-сокеты в процессе, один сокет на все пинги), если он доступен;
+    иначе `ping -c <count> -n -W <per_reply_timeout> [-w <deadline>] <host>` (Linux/WSL, без root).
+    on_progress(промежуточный PingResult) вызывается на каждый ответ/потерю — возможно из
+    другого потока, поэтому он должен быть быстрым и не ждать сеть (см. EditCoalescer).
+    """
+    engine = _engine()
+    if engine is not None:
+        try:
+            addr = _resolve_ipv4(host)
+        except OSError as e:
+            return _failed(f"ping: {host}: {e}")
+        on_event = (lambda s, _i, _rtt: on_progress(_partial(s))) if on_progress else None
+        s = engine.ping(addr, count=count, timeout=per_reply_timeout_s, deadline=deadline_s, on_event=on_event)
+        s.wait()
+        return _native_result(host, addr, s)
+    if on_progress:
+        return _stream_subprocess(host, count, deadline_s, per_reply_timeout_s, on_progress)
+    return _run_subprocess(host, count, deadline_s, per_reply_timeout_s)
+
+def _stream_subprocess(host: str, count: int, deadline_s: int | None, per_reply_timeout_s: int,
+                       on_progress: Callable[[PingResult], None]) -> PingResult:
+    """/bin/ping с построчным чтением вывода: прогресс по каждой строке с icmp_seq."""
+    args = _build_args(host, count, deadline_s, per_reply_timeout_s)
+    try:
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    except Exception as e:
+        return _failed(f"ping failed: {e}")
+    killer = threading.Timer(max(5, count * (per_reply_timeout_s + 1)), proc.kill)
+    killer.start()
+    out: list[str] = []
+    rtts: dict[int, float] = {}
+    try:
+        for line in proc.stdout:
+            out.append(line)
+            m = _REPLY_RE.search(line)
+            if m:
+                rtts.setdefault(int(m.group(1)), float(m.group(2)))
+                sent = max(rtts)
+                on_progress(_summarize(sent, [rtts.get(i) for i in range(1, sent + 1)], ""))
+        proc.wait()
+    finally:
+        killer.cancel()
+    return _parse_output("".join(out))
+
+def _run_subprocess(host: str, count: int, deadline_s: int | None, per_reply_timeout_s: int) -> PingResult:
+    args = _build_args(host, count, deadline_s, per_reply_timeout_s)
+
+    try:
+        proc = subprocess.run(
+            args,
+            capture_output=True,
+            text=True,
+            timeout=max(5, count * (per_reply_timeout_s + 1)),
+            check=False,
+        )
+    except Exception as e:
+        return _failed(f"ping failed: {e}")
+
+    out = (proc.stdout or "") + (("\n" + proc.stderr) if proc.stderr else "")
+    return _parse_output(out)
+
+# общий на процесс: одновременно идёт не больше PING_SWEEP_CONCURRENCY пингов из sweep(),
+# сколько бы пользователей ни проверяли списки
+_sweep_executor = ThreadPoolExecutor(max_workers=PING_SWEEP_CONCURRENCY, thread_name_prefix="ping-sweep")
+
+def sweep(
+    hosts: list[str],
+    count: int = 5,
+    deadline_s: int | None = 8,
+    per_reply_timeout_s: int = 1,
+    gate: Callable[[], ContextManager] | None = None,
+) -> Iterator[tuple[str, PingResult]]:
+    """
+    Пингует hosts параллельно (в пределах общего лимита); (host, PingResult) — по мере готовности.
+    gate() — контекст допуска для каждого пинга (например, слот governor'а); его ошибка — результат пинга.
+    """
+    def one(host: str) -> PingResult:
+        if gate is None:
+            return run(host, count, deadline_s, per_reply_timeout_s)
+        try:
+            with gate():
+                return run(host, count, deadline_s, per_reply_timeout_s)
+        except Exception as e:
+            return _failed(str(e))
+
+    futures = {_sweep_executor.submit(one, h): h for h in hosts}
+    for f in as_completed(futures):
+        yield futures[f], f.result()
@@ -0,0 +1,275 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import dns.asyncresolver
+import dns.exception
+import dns.resolver
+
+# список upstream через запятую; пусто — nameserver'ы из /etc/resolv.conf
+DNS_UPSTREAMS = os.getenv("LNH_DNS_UPSTREAMS") or ""
+DNS_FANOUT = int(os.getenv("LNH_DNS_FANOUT") or 2)          # сколько upstream опрашивать одновременно
+DNS_HEDGE_MS = int(os.getenv("LNH_DNS_HEDGE_MS") or 150)    # через сколько мс без ответа спросить следующий
+DNS_WORKERS = int(os.getenv("LNH_DNS_WORKERS") or 32)
+DNS_BULK_WORKERS = int(os.getenv("LNH_DNS_BULK_WORKERS") or 8)  # потоки пакетных запросов, отдельно от DNS_WORKERS
+
+_FALLBACK_UPSTREAMS = ("1.1.1.1", "8.8.8.8")
+_EWMA_ALPHA = 0.2
+_ERROR_PENALTY = 1.0    # секунд к оценке upstream при error_rate = 1
+_PROBE_INTERVAL = 30.0  # upstream без запросов дольше — снова пробуем первым
+
+# ответ upstream'а, который окончательный: другой сервер скажет то же самое
+_DEFINITIVE = (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer, dns.resolver.YXDOMAIN)
+
+
+class Upstream:
+    """Один upstream-резолвер: свой Resolver (конфиг читается один раз) и статистика."""
+
+    def __init__(self, address: str) -> None:
+        self.address = address
+        self.resolver = dns.resolver.Resolver(configure=False)
+        self.resolver.nameservers = [address]
+        self.async_resolver = dns.asyncresolver.Resolver(configure=False)
+        self.async_resolver.nameservers = [address]
+
+        self._lock = threading.Lock()
+        self.latency: float | None = None  # EWMA, секунды
+        self.error_rate = 0.0              # EWMA доли ошибок (таймауты, SERVFAIL, REFUSED…)
+        self.queries = 0
+        self.errors = 0
+        self.last_used = 0.0
+        self._inflight: list[float] = []   # время старта незавершённых запросов
+
+    def begin(self) -> float:
+        started = time.monotonic()
+        with self._lock:
+            self._inflight.append(started)
+        return started
+
+    def record(self, started: float, ok: bool) -> None:
+        elapsed = time.monotonic() - started
+        with self._lock:
+            self._inflight.remove(started)
+            self.queries += 1
+            self.last_used = time.monotonic()
+            if not ok:
+                self.errors += 1
+            self.latency = elapsed if self.latency is None else (
+                self.latency + _EWMA_ALPHA * (elapsed - self.latency)
+            )
+            self.error_rate += _EWMA_ALPHA * ((0.0 if ok else 1.0) - self.error_rate)
+
+    def score(self, now: float) -> float:
+        """
+        Меньше — лучше. Незавершённый запрос считается не быстрее уже прошедшего времени,
+        иначе зависший upstream без истории оставался бы первым. Новые и давно
+        не опрошенные upstream'ы идут первыми — так отстающий может вернуться наверх.
+        """
+        with self._lock:
+            pending = now - self._inflight[0] if self._inflight else 0.0
+            if self.latency is None or now - self.last_used > _PROBE_INTERVAL:
+                return pending
+            return max(self.latency, pending) + self.error_rate * _ERROR_PENALTY
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "upstream": self.address,
+                "queries": self.queries,
+                "errors": self.errors,
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+            }
+
+
+class ResolverPool:
+    """
+    Общий пул upstream-резолверов для net_tools.dns.
+    Запрос уходит лучшему по статистике upstream'у; если за hedge_delay ответа нет
+    (или он упал с ошибкой) — следующему, не более fanout одновременно. Побеждает первый
+    валидный ответ; NXDOMAIN/NoAnswer считаются валидными. Проигравшие запросы
+    дорабатывают в фоне и пополняют статистику, поэтому медленный upstream уходит вниз.
+    Запросы пакетных задач (bulk=True) идут в своём пуле потоков: загруженный список
+    не занимает потоки одиночных запросов пользователей.
+    """
+
+    def __init__(
+        self,
+        upstreams: list[str],
+        fanout: int = DNS_FANOUT,
+        hedge_delay: float = DNS_HEDGE_MS / 1000,
+        workers: int = DNS_WORKERS,
+        bulk_workers: int = DNS_BULK_WORKERS,
+    ) -> None:
+        if not upstreams:
+            raise ValueError("no DNS upstreams configured")
+        self.upstreams = [Upstream(a) for a in upstreams]
+        self.fanout = max(1, fanout)
+        self.hedge_delay = max(0.0, hedge_delay)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="dns")
+        self._bulk_executor = ThreadPoolExecutor(max_workers=max(1, bulk_workers), thread_name_prefix="dns-bulk")
+
+    def ranked(self) -> list[Upstream]:
+        now = time.monotonic()
+        return sorted(self.upstreams, key=lambda u: u.score(now))
+
+    @staticmethod
+    def _query(up: Upstream, qname: str, rrtype: str, lifetime: float):
+        started = up.begin()
+        try:
+            answer = up.resolver.resolve(qname, rrtype, lifetime=lifetime)
+        except _DEFINITIVE:
+            up.record(started, True)
+            raise
+        except Exception:
+            up.record(started, False)
+            raise
+        up.record(started, True)
+        return answer
+
+    def resolve(self, qname: str, rrtype: str, timeout: float, bulk: bool = False):
+        """(answer, адрес upstream'а). Исключение — ошибка последнего upstream'а или Timeout."""
+        executor = self._bulk_executor if bulk else self._executor
+        deadline = time.monotonic() + timeout
+        queue = self.ranked()
+        owner = {}
+        pending: set = set()
+        last_error: Exception | None = None
+
+        def launch() -> None:
+            up = queue.pop(0)
+            f = executor.submit(self._query, up, qname, rrtype, max(0.05, deadline - time.monotonic()))
+            owner[f] = up
+            pending.add(f)
+
+        launch()
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            hedge = queue and len(pending) < self.fanout
+            done, pending = wait(
+                pending,
+                timeout=min(remaining, self.hedge_delay) if hedge else remaining,
+                return_when=FIRST_COMPLETED,
+            )
+            if not done:
+                if hedge:
+                    launch()
+                continue
+            for f in done:
+                try:
+                    return f.result(), owner[f].address
+                except _DEFINITIVE:
+                    raise
+                except Exception as e:
+                    last_error = e
+            # упавший upstream сразу заменяем следующим
+            while queue and len(pending) < self.fanout:
+                launch()
+
+        if last_error is not None and not pending:
+            raise last_error
+        raise dns.exception.Timeout(timeout=timeout)
+
+    @staticmethod
+    async def _query_async(up: Upstream, qname: str, rrtype: str, lifetime: float):
+        started = up.begin()
+        try:
+            answer = await up.async_resolver.resolve(qname, rrtype, lifetime=lifetime)
+        except asyncio.CancelledError:
+            # проиграл гонку (ответ не быстрее прошедшего времени) или истёк общий таймаут
+            up.record(started, time.monotonic() - started < lifetime)
+            raise
+        except _DEFINITIVE:
+            up.record(started, True)
+            raise
+        except Exception:
+            up.record(started, False)
+            raise
+        up.record(started, True)
+        return answer
+
+    async def resolve_async(self, qname: str, rrtype: str, timeout: float):
+        """Асинхронный вариант resolve(): те же правила гонки, проигравшие задачи отменяются."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        queue = self.ranked()
+        owner = {}
+        pending: set = set()
+        last_error: Exception | None = None
+
+        def launch() -> None:
+            up = queue.pop(0)
+            t = asyncio.ensure_future(
+                self._query_async(up, qname, rrtype, max(0.05, deadline - loop.time()))
+            )
+            owner[t] = up
+            pending.add(t)
+
+        launch()
+        try:
+            while pending:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                hedge = queue and len(pending) < self.fanout
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=min(remaining, self.hedge_delay) if hedge else remaining,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    if hedge:
+                        launch()
+                    continue
+                for t in done:
+                    try:
+                        return t.result(), owner[t].address
+                    except _DEFINITIVE:
+                        raise
+                    except Exception as e:
+                        last_error = e
+                while queue and len(pending) < self.fanout:
+                    launch()
+        finally:
+            for t in pending:
+                t.cancel()
+
+        if last_error is not None and not pending:
+            raise last_error
+        raise dns.exception.Timeout(timeout=timeout)
+
+    def stats(self) -> list[dict]:
+        return [u.stats() for u in self.ranked()]
+
+
+def _configured_upstreams() -> list[str]:
+    upstreams = [a.strip() for a in DNS_UPSTREAMS.split(",") if a.strip()]
+    if upstreams:
+        return upstreams
+    try:
+        return [str(ns) for ns in dns.resolver.Resolver().nameservers]
+    except Exception as e:
+        logging.warning("Cannot read system resolvers (%s), using %s", e, ", ".join(_FALLBACK_UPSTREAMS))
+        return list(_FALLBACK_UPSTREAMS)
+
+
+_pool: ResolverPool | None = None
+_pool_lock = threading.Lock()
+
+def get_resolver_pool() -> ResolverPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ResolverPool(_configured_upstreams())
+    return _pool
+
+def upstream_stats() -> list[dict]:
+    return get_resolver_pool().stats()
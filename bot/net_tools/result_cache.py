@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable
+
+# сколько секунд результат инструмента считается свежим; 0 — не кэшировать
+RESULT_TTL = {
+    "whois": int(os.getenv("LNH_CACHE_TTL_WHOIS") or 6 * 3600),
+    "rdap": int(os.getenv("LNH_CACHE_TTL_RDAP") or 24 * 3600),
+    "tls": int(os.getenv("LNH_CACHE_TTL_TLS") or 3600),
+}
+RESULT_CACHE_SIZE = int(os.getenv("LNH_RESULT_CACHE_SIZE") or 2048)           # L1: записей на инструмент
+RESULT_CACHE_MAX_ROWS = int(os.getenv("LNH_RESULT_CACHE_MAX_ROWS") or 100000)  # L2: строк на все инструменты
+_PRUNE_EVERY = 256  # записей в L2 между чистками таблицы
+
+_l2_lock = threading.Lock()
+_l2_disabled = False
+_l2_writes = 0
+
+
+def _l2(call: Callable[[Any], Any]) -> Any:
+    """call(db_client) или None, если L2 недоступен: ошибка SQLite не должна ломать сам инструмент."""
+    global _l2_disabled
+    if _l2_disabled:
+        return None
+    try:
+        from bot import db_client
+        return call(db_client)
+    except RuntimeError as e:  # SQLITE_DB_PATH не задан — работаем только с L1
+        _l2_disabled = True
+        logging.warning("result cache: L2 disabled (%s)", e)
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            _l2_disabled = True
+            logging.warning("result cache: L2 disabled (%s), run `python -m bot.recreate_database`", e)
+        else:
+            logging.warning("result cache: SQLite error: %s", e)
+    except sqlite3.Error as e:
+        logging.warning("result cache: SQLite error: %s", e)
+    return None
+
+def _maybe_prune(now: float) -> None:
+    global _l2_writes
+    with _l2_lock:
+        _l2_writes += 1
+        if _l2_writes % _PRUNE_EVERY:
+            return
+    deleted = _l2(lambda db: db.pruneCachedResults(now, RESULT_CACHE_MAX_ROWS))
+    if deleted:
+        logging.info("result cache: pruned %d rows", deleted)
+
+
+class ResultCache:
+    """
+    Кэш результатов одного инструмента. L1 — LRU в памяти процесса, L2 — таблица result_cache
+    в SQLite: переживает перезапуск и общая для всех пользователей. put() пишет в оба уровня,
+    get() читает L1, при промахе — L2 с подъёмом в L1. Значения хранятся как JSON
+    (encode: результат -> dict, decode: dict -> результат), так что каждый get() отдаёт
+    новый объект и менять его снаружи можно.
+    """
+
+    def __init__(self, tool: str, encode: Callable[[Any], dict], decode: Callable[[dict], Any],
+                 ttl: float | None = None, max_size: int = RESULT_CACHE_SIZE) -> None:
+        self.tool = tool
+        self.encode = encode
+        self.decode = decode
+        self.ttl = RESULT_TTL.get(tool, 0) if ttl is None else ttl
+        self.max_size = max(0, max_size)
+        self._lock = threading.Lock()
+        # key -> (JSON, stored_at, expires_at), время — unix (как в L2)
+        self._items: OrderedDict[str, tuple[str, float, float]] = OrderedDict()
+        self.hits = 0
+        self.l2_hits = 0
+        self.misses = 0
+        with _caches_lock:
+            _caches[tool] = self
+
+    def _remember(self, key: str, payload: str, stored_at: float, expires_at: float) -> None:
+        if self.max_size == 0:
+            return
+        self._items[key] = (payload, stored_at, expires_at)
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def get(self, key: str) -> tuple[Any, float] | None:
+        """(результат, время записи unix) или None."""
+        if self.ttl <= 0:
+            return None
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[2] <= now:
+                del self._items[key]
+                item = None
+            if item is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+        if item is None:
+            item = _l2(lambda db: db.getCachedResult(self.tool, key, now))
+            if item is not None:
+                with self._lock:
+                    self.l2_hits += 1
+                    self._remember(key, *item)
+        if item is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            return self.decode(json.loads(item[0])), item[1]
+        except Exception:
+            logging.warning("result cache: cannot decode %s entry %r", self.tool, key, exc_info=True)
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        if self.ttl <= 0:
+            return
+        payload = json.dumps(self.encode(value), ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._remember(key, payload, now, now + self.ttl)
+        _l2(lambda db: db.putCachedResult(self.tool, key, payload, now, now + self.ttl))
+        _maybe_prune(now)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "l2_hits": self.l2_hits,
+                "misses": self.misses,
+            }
+
+
+_caches: dict[str, ResultCache] = {}
+_caches_lock = threading.Lock()
+
+def cache_stats() -> dict[str, dict]:
+    return {tool: c.stats() for tool, c in list(_caches.items())}
+
+def cache_note(cached_at: float) -> str:
+    """Пометка к заголовку ответа из кэша: « (из кэша, 12 мин назад)»."""
+    minutes = int(max(0.0, time.time() - cached_at) // 60)
+    if minutes == 0:
+        return " (из кэша, только что)"
+    age = f"{minutes} мин" if minutes < 120 else f"{minutes // 60} ч"
+    return f" (из кэша, {age} назад)"
@@ -1,12 +1,39 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from typing import List, Optional
+import hashlib
+import logging
+import os
 import socket
 import ssl
+import threading
+import time
 import datetime as dt
-import tempfile
-import os
+
+from bot.net_tools import connect, x509
+from bot.net_tools.result_cache import ResultCache
+
+TLS_CERT_CACHE_SIZE = int(os.getenv("LNH_TLS_CERT_CACHE_SIZE") or 512)
+TLS_EXPIRY_WARN_DAYS = int(os.getenv("LNH_TLS_EXPIRY_WARN_DAYS") or 21)
+TLS_SCAN_CONCURRENCY = int(os.getenv("LNH_TLS_SCAN_CONCURRENCY") or 16)  # хэндшейков скана одновременно, на весь бот
+
+_WEAK_SIG_ALGS = ("md5WithRSAEncryption", "sha1WithRSAEncryption", "ecdsa-with-SHA1", "dsa-with-SHA1")
+
+@dataclass
+class ChainLink:
+    """Один сертификат из присланной сервером цепочки (в порядке отправки)."""
+    subject: str
+    issuer: str
+    not_after: Optional[str] = None    # YYYY-MM-DD (UTC)
+    days_left: Optional[int] = None
+    key: Optional[str] = None          # "RSA 2048", "EC P-256"
+    sig_alg: Optional[str] = None
+    fingerprint: Optional[str] = None  # SHA-256, hex
+    self_signed: bool = False
+    issues: List[str] | None = None    # проблемы именно этого звена
 
 @dataclass
 class TlsInfo:
@@ -15,6 +42,8 @@ class TlsInfo:
     port: int
 
     # параметры сеанса
+    address: Optional[str] = None      # адрес, выигравший Happy Eyeballs
+    connect_ms: Optional[float] = None
     protocol: Optional[str] = None
     cipher: Optional[str] = None
 
@@ -24,6 +53,9 @@ class TlsInfo:
     issuer_full: Optional[str] = None
     serial: Optional[str] = None
     san: List[str] | None = None
+    key_type: Optional[str] = None     # RSA | EC P-256 | Ed25519 …
+    key_bits: Optional[int] = None
+    sig_alg: Optional[str] = None
 
     not_before: Optional[str] = None   # YYYY-MM-DD (UTC)
     not_after: Optional[str] = None    # YYYY-MM-DD (UTC)
@@ -34,155 +66,463 @@ class TlsInfo:
     ocsp_urls: List[str] | None = None
     ca_issuers: List[str] | None = None
 
+    # цепочка как её прислал сервер; chain_issues — проблемы порядка/полноты
+    chain: List[ChainLink] | None = None
+    chain_issues: List[str] | None = None
+
     error: Optional[str] = None
+    cached_at: Optional[float] = None  # unix-время записи, если ответ из кэша
 
+def _info_from_dict(d: dict) -> TlsInfo:
+    chain = d.pop("chain", None)
+    return TlsInfo(**d, chain=[ChainLink(**c) for c in chain] if chain is not None else None)
 
-_OPENSSL_TIME_FMT = "%b %d %H:%M:%S %Y %Z"  # e.g. "Jun  1 12:00:00 2025 GMT"
+# сводки по host:port — в result_cache (TTL LNH_CACHE_TTL_TLS), ошибки хэндшейка не кэшируются
+_results = ResultCache("tls", asdict, _info_from_dict)
 
-def _parse_cert_time(s: str | None) -> Optional[dt.datetime]:
-    if not s:
-        return None
-    try:
-        return dt.datetime.strptime(s, _OPENSSL_TIME_FMT)
-    except Exception:
+def _cache_key(host: str, port: int) -> str:
+    return f"{host.lower().rstrip('.')}:{port}"
+
+def _from_cache(hit: tuple[TlsInfo, float] | None, host: str) -> TlsInfo | None:
+    if hit is None:
         return None
+    info, stored_at = hit
+    info.host, info.cached_at = host, stored_at  # ключ без регистра — показываем имя, как его ввели
+    return info
+
 
 def _fmt_date_utc(d: Optional[dt.datetime]) -> Optional[str]:
     if not d:
         return None
     return d.strftime("%Y-%m-%d")
 
-def _decode_cert_via_file(der_bytes: bytes) -> Optional[dict]:
-    """
-    Надёжный способ получить разбор сертификата, даже при CERT_NONE:
-    сохраняем PEM во временный файл и просим CPython его декодировать.
-    """
-    try:
-        pem = ssl.DER_cert_to_PEM_cert(der_bytes)
-        with tempfile.NamedTemporaryFile("w", delete=False) as f:
-            f.write(pem)
-            path = f.name
-        try:
-            # внутренний декодер CPython (стабилен для диагностики)
-            return ssl._ssl._test_decode_cert(path)  # type: ignore[attr-defined]
-        finally:
-            try:
-                os.remove(path)
-            except Exception:
-                pass
-    except Exception:
-        return None
-
-def _extract_fields(cert: dict) -> dict:
-    # subject CN
-    cn = None
-    for rdn in cert.get("subject", []):
-        for k, v in rdn:
-            if k.lower() == "commonname":
-                cn = v
-                break
-
-    # issuer CN + полный DN
-    issuer_cn = None
-    issuer_full_parts: list[str] = []
-    for rdn in cert.get("issuer", []):
-        for k, v in rdn:
-            if k.lower() == "commonname":
-                issuer_cn = v
-            issuer_full_parts.append(f"{k}={v}")
-    issuer_full = ", ".join(issuer_full_parts) if issuer_full_parts else None
-
-    # SAN
-    san_entries = []
-    for k, v in cert.get("subjectAltName", []):
-        if k.lower() in ("dns", "ip address"):
-            san_entries.append(v)
-
-    serial = cert.get("serialNumber")
-
-    ocsp_raw = cert.get("OCSP")
-    ocsp_urls = list(ocsp_raw) if isinstance(ocsp_raw, (list, tuple)) else ([ocsp_raw] if isinstance(ocsp_raw, str) else [])
-    ca_issuers_raw = cert.get("caIssuers")
-    ca_issuers = list(ca_issuers_raw) if isinstance(ca_issuers_raw, (list, tuple)) else ([ca_issuers_raw] if isinstance(ca_issuers_raw, str) else [])
-
-    nb_dt = _parse_cert_time(cert.get("notBefore"))
-    na_dt = _parse_cert_time(cert.get("notAfter"))
-    days_left = (na_dt - dt.datetime.utcnow()).days if na_dt else None
+def _extract_fields(cert: x509.Certificate) -> dict:
+    issuer_full = ", ".join(f"{k}={v}" for k, v in cert.issuer)
+    san_entries = [v for k, v in cert.san if k in ("DNS", "IP Address")]
+    days_left = (cert.not_after - dt.datetime.utcnow()).days if cert.not_after else None
+    key_type = f"{cert.key_type} {cert.curve}" if cert.curve else cert.key_type
 
     return dict(
-        subject_cn=cn,
-        issuer_cn=issuer_cn,
+        subject_cn=cert.subject_cn,
+        issuer_cn=cert.issuer_cn,
         issuer_full=issuer_full or None,
         san=san_entries or None,
-        serial=serial,
-        not_before=_fmt_date_utc(nb_dt),
-        not_after=_fmt_date_utc(na_dt),
+        serial=cert.serial,
+        not_before=_fmt_date_utc(cert.not_before),
+        not_after=_fmt_date_utc(cert.not_after),
         days_left=days_left,
-        ocsp_urls=ocsp_urls or None,
-        ca_issuers=ca_issuers or None,
+        ocsp_urls=cert.ocsp_urls or None,
+        ca_issuers=cert.ca_issuers or None,
+        key_type=key_type,
+        key_bits=cert.key_bits,
+        sig_alg=cert.signature_algorithm,
     )
 
-def fetch(host: str, port: int = 443, timeout: float = 7.0) -> TlsInfo:
+class _CertCache:
     """
-    TLS-хэндшейк с SNI и извлечение полной информации о сертификате (leaf).
-    Проверка цепочки отключена — нужна диагностическая сводка даже для self-signed.
+    LRU разобранных сертификатов по SHA-256 от DER. Промежуточные и корни у большинства
+    сайтов одни и те же, поэтому каждый разбирается один раз. Объекты — только для чтения.
     """
+
+    def __init__(self, max_size: int) -> None:
+        self.max_size = max(0, max_size)
+        self._lock = threading.Lock()
+        self._items: OrderedDict[str, x509.Certificate] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, fingerprint: str) -> x509.Certificate | None:
+        with self._lock:
+            cert = self._items.get(fingerprint)
+            if cert is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(fingerprint)
+            self.hits += 1
+            return cert
+
+    def put(self, fingerprint: str, cert: x509.Certificate) -> None:
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._items[fingerprint] = cert
+            self._items.move_to_end(fingerprint)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+_cert_cache = _CertCache(TLS_CERT_CACHE_SIZE)
+
+def cert_cache_stats() -> dict:
+    return _cert_cache.stats()
+
+
+_roots: dict[tuple, list[x509.Certificate]] | None = None
+_roots_lock = threading.Lock()
+
+def _trust_roots() -> dict[tuple, list[x509.Certificate]]:
+    """Системные доверенные корни, по subject. Читаются один раз."""
+    global _roots
+    if _roots is None:
+        with _roots_lock:
+            if _roots is None:
+                roots: dict[tuple, list[x509.Certificate]] = {}
+                try:
+                    ders = ssl.create_default_context().get_ca_certs(binary_form=True)
+                except Exception as e:
+                    logging.warning("Cannot load system CA store (%s)", e)
+                    ders = []
+                for der in ders:
+                    try:
+                        cert = x509.parse(der)
+                    except x509.CertificateError:
+                        continue
+                    roots.setdefault(tuple(cert.subject), []).append(cert)
+                _roots = roots
+    return _roots
+
+def _trusted_issuer(cert: x509.Certificate) -> x509.Certificate | None:
+    for root in _trust_roots().get(tuple(cert.issuer), ()):
+        if cert.issued_by(root):
+            return root
+    return None
+
+def _is_trusted_root(cert: x509.Certificate) -> bool:
+    return any(
+        root.serial == cert.serial and root.ski == cert.ski
+        for root in _trust_roots().get(tuple(cert.subject), ())
+    )
+
+def _peer_chain(ssock) -> list[bytes]:
+    """DER всех сертификатов, присланных сервером, в порядке отправки (leaf первым)."""
+    # Python 3.13+: публичный get_unverified_chain(); 3.10–3.12 — у внутреннего _sslobj
+    getter = getattr(ssock, "get_unverified_chain", None) or getattr(
+        getattr(ssock, "_sslobj", None), "get_unverified_chain", None
+    )
+    if getter is not None:
+        try:
+            ders = [
+                c if isinstance(c, bytes) else c.public_bytes(ssl._ssl.ENCODING_DER)  # type: ignore[attr-defined]
+                for c in getter() or ()
+            ]
+            if ders:
+                return ders
+        except Exception:
+            logging.debug("get_unverified_chain failed", exc_info=True)
+    der = ssock.getpeercert(binary_form=True)
+    return [der] if der else []
+
+def _parse_chain(ders: list[bytes]) -> list[tuple[Optional[x509.Certificate], str, Optional[str]]]:
+    """[(сертификат | None, отпечаток, ошибка разбора)]; leaf у каждого сайта свой и в кэш не идёт."""
+    out = []
+    for i, der in enumerate(ders):
+        fp = hashlib.sha256(der).hexdigest()
+        cert = _cert_cache.get(fp) if i else None
+        if cert is None:
+            try:
+                cert = x509.parse(der)
+            except x509.CertificateError as e:
+                out.append((None, fp, str(e)))
+                continue
+            if i:
+                _cert_cache.put(fp, cert)
+        out.append((cert, fp, None))
+    return out
+
+def _short_name(name: list[tuple[str, str]]) -> str:
+    for k, v in reversed(name):
+        if k == "commonName":
+            return v
+    return ", ".join(f"{k}={v}" for k, v in name) or "?"
+
+def _key_label(cert: x509.Certificate) -> Optional[str]:
+    if cert.curve:
+        return f"{cert.key_type} {cert.curve}"
+    if cert.key_type and cert.key_bits:
+        return f"{cert.key_type} {cert.key_bits}"
+    return cert.key_type
+
+def _link_issues(cert: x509.Certificate, index: int, now: dt.datetime) -> list[str]:
+    issues = []
+    if cert.not_after and cert.not_after < now:
+        issues.append("истёк")
+    elif cert.not_after and (cert.not_after - now).days < TLS_EXPIRY_WARN_DAYS:
+        issues.append(f"истекает через {(cert.not_after - now).days} дн.")
+    if cert.not_before and cert.not_before > now:
+        issues.append("ещё не действует")
+    if cert.key_type in ("RSA", "DSA") and cert.key_bits and cert.key_bits < 2048:
+        issues.append(f"слабый ключ {cert.key_type} {cert.key_bits}")
+    elif cert.key_type == "EC" and cert.key_bits and cert.key_bits < 256:
+        issues.append(f"слабый ключ EC {cert.key_bits}")
+    # подпись самоподписанного корня не проверяется — её алгоритм неважен
+    if cert.signature_algorithm in _WEAK_SIG_ALGS and not cert.self_issued:
+        issues.append(f"слабая подпись {cert.signature_algorithm}")
+    if index > 0 and cert.is_ca is False:
+        issues.append("не CA (basicConstraints), но стоит в цепочке")
+    return issues
+
+def _analyze_chain(parsed: list[tuple[Optional[x509.Certificate], str, Optional[str]]]) -> tuple[list[ChainLink], list[str]]:
+    """Звенья цепочки и общие проблемы: порядок, недостающий промежуточный, лишние сертификаты."""
+    now = dt.datetime.utcnow()
+    links: list[ChainLink] = []
+    issues: list[str] = []
+    certs = [c for c, _fp, _err in parsed]
+
+    for i, (cert, fp, err) in enumerate(parsed):
+        if cert is None:
+            links.append(ChainLink(subject="?", issuer="?", fingerprint=fp, issues=[f"не разобран: {err}"]))
+            continue
+        links.append(ChainLink(
+            subject=_short_name(cert.subject),
+            issuer=_short_name(cert.issuer),
+            not_after=_fmt_date_utc(cert.not_after),
+            days_left=(cert.not_after - now).days if cert.not_after else None,
+            key=_key_label(cert),
+            sig_alg=cert.signature_algorithm,
+            fingerprint=fp,
+            self_signed=cert.self_issued,
+            issues=_link_issues(cert, i, now) or None,
+        ))
+
+    if not certs or certs[0] is None:
+        return links, issues
+
+    # путь от leaf: следующим должен идти издатель предыдущего
+    path = [0]
+    cur = 0
+    while not certs[cur].self_issued:
+        nxt = cur + 1
+        if not (nxt < len(certs) and certs[nxt] is not None and certs[cur].issued_by(certs[nxt])):
+            nxt = next(
+                (j for j, c in enumerate(certs) if j not in path and c is not None and certs[cur].issued_by(c)),
+                None,
+            )
+            if nxt is None:
+                break
+            issues.append(f"неверный порядок: издатель #{cur} прислан под номером #{nxt}")
+        if nxt in path:
+            break
+        path.append(nxt)
+        cur = nxt
+
+    last = certs[path[-1]]
+    if last.self_issued:
+        if len(path) > 1 and not _is_trusted_root(last):
+            issues.append(f"корень «{_short_name(last.subject)}» не найден в системном хранилище")
+        elif len(path) == 1:
+            issues.append("самоподписанный сертификат")
+    elif _trusted_issuer(last) is None:
+        issues.append(
+            f"нет сертификата издателя «{_short_name(last.issuer)}»: "
+            "цепочка неполная (не прислан промежуточный) или корень не доверенный"
+        )
+
+    extra = [f"#{j}" for j in range(len(certs)) if j not in path]
+    if extra:
+        issues.append("лишние сертификаты вне пути: " + ", ".join(extra))
+    return links, issues
+
+def _make_context() -> ssl.SSLContext:
     ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
     ctx.check_hostname = False
     ctx.verify_mode = ssl.CERT_NONE
+    return ctx
 
+def _read_session(ssock) -> tuple[Optional[str], Optional[str], list[bytes]]:
+    """(protocol, cipher, DER цепочки) из SSLSocket/SSLObject — всё из одного хэндшейка."""
+    # версия TLS и шифр
     try:
-        with socket.create_connection((host, port), timeout=timeout) as sock:
-            with ctx.wrap_socket(sock, server_hostname=host) as ssock:
-                # версия TLS и шифр
-                try:
-                    protocol = ssock.version()
-                except Exception:
-                    protocol = None
-                try:
-                    cipher = ssock.cipher()
-                    cipher_name = cipher[0] if cipher else None
-                except Exception:
-                    cipher_name = None
-
-                # Пытаемся получить "богатый" словарь
-                cert_dict = ssock.getpeercert()
-                # Если он пустой/урезанный — сделаем разбор из DER
-                if not cert_dict or not cert_dict.get("subject"):
-                    der = ssock.getpeercert(binary_form=True)
-                    if der:
-                        decoded = _decode_cert_via_file(der)
-                        if decoded:
-                            cert_dict = decoded
-    except Exception as e:
-        return TlsInfo(ok=False, host=host, port=port, error=f"Handshake error: {e}")
+        protocol = ssock.version()
+    except Exception:
+        protocol = None
+    try:
+        cipher = ssock.cipher()
+        cipher_name = cipher[0] if cipher else None
+    except Exception:
+        cipher_name = None
 
-    # Если даже после попытки декодирования данных нет — вернём хоть сессию
-    if not cert_dict:
+    # при CERT_NONE getpeercert() пуст — берём DER и разбираем сами, в памяти
+    return protocol, cipher_name, _peer_chain(ssock)
+
+def _build_info(host: str, port: int, protocol: Optional[str], cipher_name: Optional[str], ders: list[bytes]) -> TlsInfo:
+    parsed = _parse_chain(ders)
+    cert, _fp, cert_error = parsed[0] if parsed else (None, None, None)
+    # Если сертификата нет — вернём хоть сессию
+    if cert is None:
         return TlsInfo(
             ok=True, host=host, port=port,
             protocol=protocol, cipher=cipher_name,
-            error="Не удалось получить данные сертификата (peercert empty)"
+            error=f"Не удалось разобрать сертификат: {cert_error}" if cert_error
+            else "Не удалось получить данные сертификата (peercert empty)"
         )
 
-    fields = _extract_fields(cert_dict)
-
-    # Проверка совпадения имени хоста (без верификации цепочки)
-    hostname_ok: Optional[bool]
-    try:
-        ssl.match_hostname(cert_dict, host)
-        hostname_ok = True
-    except ssl.CertificateError:
-        hostname_ok = False
-    except Exception:
-        hostname_ok = None
-
+    chain, chain_issues = _analyze_chain(parsed)
     return TlsInfo(
         ok=True,
         host=host,
         port=port,
         protocol=protocol,
         cipher=cipher_name,
-        hostname_ok=hostname_ok,
-        **fields,
+        # совпадение имени хоста (без верификации цепочки)
+        hostname_ok=cert.matches_hostname(host),
+        chain=chain,
+        chain_issues=chain_issues or None,
+        **_extract_fields(cert),
+    )
+
+def fetch(host: str, port: int = 443, timeout: float = 7.0, use_cache: bool = True) -> TlsInfo:
+    """
+    TLS-хэндшейк с SNI и извлечение полной информации о сертификате (leaf) и присланной цепочке.
+    Проверка цепочки при хэндшейке отключена — нужна диагностическая сводка даже для self-signed;
+    порядок и полнота цепочки оцениваются после, в _analyze_chain.
+    Успешная сводка кэшируется (result_cache); use_cache=False — всегда новый хэндшейк.
+    """
+    if use_cache:
+        cached = _from_cache(_results.get(_cache_key(host, port)), host)
+        if cached is not None:
+            return cached
+    ctx = _make_context()
+
+    try:
+        conn = connect.connect(host, port, timeout=timeout)
+        with conn.sock as sock:
+            with ctx.wrap_socket(sock, server_hostname=host) as ssock:
+                session = _read_session(ssock)
+    except Exception as e:
+        return TlsInfo(ok=False, host=host, port=port, error=f"Handshake error: {e}")
+
+    info = _build_info(host, port, *session)
+    info.address, info.connect_ms = conn.address, conn.connect_ms
+    if info.error is None:
+        _results.put(_cache_key(host, port), info)
+    return info
+
+
+# --- скан версий и шифров
+
+@dataclass
+class ScanProbe:
+    label: str                         # "TLS 1.2" или группа шифров
+    accepted: Optional[bool] = None    # None — не проверено (не умеет локальный OpenSSL или сетевая ошибка)
+    cipher: Optional[str] = None       # набор, выбранный сервером
+    protocol: Optional[str] = None
+    weak: bool = False                 # принято, но устарело/небезопасно
+    error: Optional[str] = None
+
+@dataclass
+class TlsScan:
+    ok: bool
+    host: str
+    port: int
+    address: Optional[str] = None
+    versions: List[ScanProbe] | None = None
+    ciphers: List[ScanProbe] | None = None
+    elapsed: Optional[float] = None    # секунд на весь скан
+    error: Optional[str] = None
+
+# (метка, версия, устаревшая)
+_SCAN_VERSIONS = (
+    ("TLS 1.3", ssl.TLSVersion.TLSv1_3, False),
+    ("TLS 1.2", ssl.TLSVersion.TLSv1_2, False),
+    ("TLS 1.1", ssl.TLSVersion.TLSv1_1, True),
+    ("TLS 1.0", ssl.TLSVersion.TLSv1, True),
+)
+_NO_PSK = ":!PSK:!SRP:!aNULL:!eNULL"
+# группы наборов для TLS ≤ 1.2 (строки шифров OpenSSL): (метка, строка, небезопасная).
+# Наборы TLS 1.3 из Python не выбрать — для 1.3 показывается выбранный сервером.
+_SCAN_CIPHER_GROUPS = (
+    ("ECDHE AES-GCM", "ECDHE+AESGCM" + _NO_PSK, False),
+    ("ECDHE ChaCha20", "ECDHE+CHACHA20" + _NO_PSK, False),
+    ("ECDHE AES-CBC", "ECDHE+AES:!AESGCM:!AESCCM" + _NO_PSK, False),
+    ("DHE AES-GCM", "DHE+AESGCM" + _NO_PSK, False),
+    ("DHE ChaCha20", "DHE+CHACHA20" + _NO_PSK, False),
+    ("DHE AES-CBC", "DHE+AES:!AESGCM:!AESCCM" + _NO_PSK, False),
+    ("AES-CCM", "AESCCM" + _NO_PSK, False),
+    ("CAMELLIA/ARIA", "CAMELLIA:ARIA" + _NO_PSK, False),
+    ("RSA kx (без PFS)", "kRSA" + _NO_PSK, True),
+    ("3DES", "3DES" + _NO_PSK, True),
+    ("RC4", "RC4" + _NO_PSK, True),
+    ("anon (aNULL)", "aNULL:!eNULL:!PSK:!SRP", True),
+    ("NULL-шифр", "eNULL:!PSK:!SRP", True),
+)
+
+_scan_executor = ThreadPoolExecutor(max_workers=max(1, TLS_SCAN_CONCURRENCY), thread_name_prefix="tls-scan")
+
+def _probe_context(min_v: ssl.TLSVersion, max_v: ssl.TLSVersion, ciphers: Optional[str]) -> ssl.SSLContext:
+    ctx = _make_context()
+    ctx.minimum_version = min_v
+    ctx.maximum_version = max_v
+    # SECLEVEL=0: иначе OpenSSL 3 сам не предложит TLS 1.0/1.1 и слабые наборы, а их и надо найти
+    ctx.set_ciphers((ciphers or "ALL") + ":@SECLEVEL=0")
+    return ctx
+
+def _probe(address: tuple, host: str, label: str, ctx_args: tuple, weak: bool, timeout: float) -> ScanProbe:
+    try:
+        ctx = _probe_context(*ctx_args)
+    except (ssl.SSLError, ValueError) as e:
+        return ScanProbe(label, error=f"не поддерживается локально: {e}")
+    try:
+        with socket.create_connection(address, timeout=timeout) as sock:
+            with ctx.wrap_socket(sock, server_hostname=host) as ssock:
+                cipher = ssock.cipher()
+                return ScanProbe(
+                    label, accepted=True, weak=weak,
+                    cipher=cipher[0] if cipher else None, protocol=ssock.version(),
+                )
+    except ssl.SSLError as e:
+        reason = getattr(e, "reason", None) or ""
+        if reason in ("NO_PROTOCOLS_AVAILABLE", "NO_CIPHERS_AVAILABLE", "UNSUPPORTED_PROTOCOL"):
+            return ScanProbe(label, error=f"не поддерживается локально: {reason}")
+        # alert handshake_failure / protocol_version / внезапный EOF — сервер отказал
+        return ScanProbe(label, accepted=False, error=reason or str(e))
+    except ConnectionResetError:
+        return ScanProbe(label, accepted=False, error="connection reset")
+    except OSError as e:
+        return ScanProbe(label, error=str(e))
+
+def _resolve_once(host: str, port: int, timeout: float) -> tuple:
+    """
+    Один адрес на весь скан: все хэндшейки идут к одному серверу и без повторных DNS-запросов.
+    Берём победителя Happy Eyeballs — мёртвые A/AAAA-записи отсеиваются до скана.
+    """
+    conn = connect.connect(host, port, timeout=timeout)
+    conn.sock.close()
+    return (conn.address, port)
+
+def scan(host: str, port: int = 443, timeout: float = 5.0) -> TlsScan:
+    """
+    Какие версии TLS (1.0–1.3) и группы наборов шифров (для TLS ≤ 1.2) принимает сервер.
+    Один хэндшейк на версию/группу, все параллельно в общем пуле (LNH_TLS_SCAN_CONCURRENCY),
+    так что скан длится примерно как самый медленный хэндшейк, а не как их сумма.
+    """
+    started = time.monotonic()
+    try:
+        address = _resolve_once(host, port, timeout)
+    except OSError as e:
+        return TlsScan(ok=False, host=host, port=port, error=f"Connect error: {e}")
+
+    version_jobs = [
+        _scan_executor.submit(_probe, address, host, label, (v, v, None), weak, timeout)
+        for label, v, weak in _SCAN_VERSIONS
+    ]
+    cipher_jobs = [
+        _scan_executor.submit(
+            _probe, address, host, label, (ssl.TLSVersion.TLSv1, ssl.TLSVersion.TLSv1_2, ciphers), weak, timeout
+        )
+        for label, ciphers, weak in _SCAN_CIPHER_GROUPS
+    ]
+    versions = [f.result() for f in version_jobs]
+    ciphers = [f.result() for f in cipher_jobs]
+
+    if not any(p.accepted for p in versions + ciphers) and all(p.accepted is None for p in versions):
+        # ни одного ответа TLS: порт закрыт, фильтруется или это не TLS
+        err = next((p.error for p in versions if p.error), "нет ответа")
+        return TlsScan(ok=False, host=host, port=port, address=address[0], error=f"Handshake error: {err}")
+
+    return TlsScan(
+        ok=True, host=host, port=port, address=address[0],
+        versions=versions, ciphers=ciphers, elapsed=time.monotonic() - started,
     )
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import List, Optional, Literal
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional, Literal
 import json
 import datetime as dt
 import re
@@ -10,6 +10,9 @@ import ipaddress
 import whois as domain_whois
 from ipwhois import IPWhois
 
+from bot.net_tools import whois_client
+from bot.net_tools.result_cache import ResultCache
+
 
 @dataclass
 class WhoisResult:
@@ -19,6 +22,25 @@ class WhoisResult:
     summary_lines: List[str]
     raw_text: Optional[str] = None
     error: Optional[str] = None
+    cached_at: Optional[float] = None  # unix-время записи, если ответ из кэша
+
+
+# WHOIS доменов и RDAP адресов кэшируются раздельно: у них разные TTL (LNH_CACHE_TTL_WHOIS / _RDAP)
+_whois_cache = ResultCache("whois", asdict, lambda d: WhoisResult(**d))
+_rdap_cache = ResultCache("rdap", asdict, lambda d: WhoisResult(**d))
+
+def _cached(cache: ResultCache, target: str, key: str, use_cache: bool, run: Callable[[], WhoisResult]) -> WhoisResult:
+    """Ответ из кэша или run(); в кэш попадают только успешные ответы."""
+    if use_cache:
+        hit = cache.get(key)
+        if hit is not None:
+            res, stored_at = hit
+            res.target, res.cached_at = target, stored_at
+            return res
+    res = run()
+    if res.ok:
+        cache.put(key, res)
+    return res
 
 
 def _norm_date(v) -> str | None:
@@ -40,54 +62,93 @@ def _join_ns(v) -> str | None:
     return None
 
 
-# ---- NEW: фильтр «воды» из сырого WHOIS (ICANN/VeriSign notices, terms, last update и т.д.)
+# фильтр «воды» из сырого WHOIS (ICANN/VeriSign notices, terms, last update и т.д.)
+# блочные уведомления (многострочные) — вырезаются до пустой строки/конца
+_NOTICE_BLOCK_RE = re.compile(
+    r"\s*(?:NOTICE:|TERMS OF USE:|By submitting a WHOIS query|For more information on Whois status codes)",
+    re.IGNORECASE,
+)
+# разовые строки
+_NOTICE_LINE_RE = re.compile(
+    r"\s*(?:>>> Last update of whois database:|The Registry database contains ONLY)", re.IGNORECASE
+)
+
 def _clean_whois_text(t: str | None) -> str | None:
+    """Один проход по строкам: блоки уведомлений и разовые строки выбрасываются, пустые строки схлопываются."""
     if not t:
         return t
-    # Блочные уведомления (многострочные) — вырезаем до пустой строки/конца
-    block_patterns = [
-        r'^\s*NOTICE:.*?(?=^\s*$|\Z)',
-        r'^\s*TERMS OF USE:.*?(?=^\s*$|\Z)',
-        r'^\s*By submitting a WHOIS query.*?(?=^\s*$|\Z)',
-        r'^\s*For more information on Whois status codes.*?(?=^\s*$|\Z)',
-    ]
-    for p in block_patterns:
-        t = re.sub(p, "", t, flags=re.IGNORECASE | re.MULTILINE | re.DOTALL)
-
-    # Разовые строки
-    line_patterns = [
-        r'^\s*>>> Last update of whois database:.*$',
-        r'^\s*The Registry database contains ONLY.*$',
-    ]
-    for p in line_patterns:
-        t = re.sub(p, "", t, flags=re.IGNORECASE | re.MULTILINE)
-
-    # Убираем «лишние» пустые строки
-    t = re.sub(r'\n{3,}', '\n\n', t, flags=re.MULTILINE).strip()
-    return t
-
-def lookup(target: str, timeout: float = 8.0) -> WhoisResult:
+    out: list[str] = []
+    in_block = False
+    for line in t.splitlines():
+        blank = not line.strip()
+        if in_block:
+            if not blank:
+                continue
+            in_block = False
+        elif _NOTICE_BLOCK_RE.match(line):
+            in_block = True
+            continue
+        elif _NOTICE_LINE_RE.match(line):
+            blank = True
+        if blank:
+            if out and out[-1]:
+                out.append("")
+            continue
+        out.append(line.rstrip())
+    return "\n".join(out).strip()
+
+def lookup(target: str, timeout: float = 8.0, use_cache: bool = True) -> WhoisResult:
+    """
+    WHOIS домена или RDAP публичного IPv4. Успешные ответы кэшируются (result_cache:
+    память + SQLite, общий для всех пользователей); use_cache=False — всегда живой запрос.
+    """
     t = (target or "").strip()
     # IP (IPv4 public) → RDAP через ipwhois
     try:
         ip = ipaddress.ip_address(t)
         if ip.version == 4 and (not ip.is_private and not ip.is_loopback and not ip.is_link_local and not ip.is_multicast and not ip.is_reserved):
-            return _lookup_ip(str(ip), timeout)
+            return _cached(_rdap_cache, str(ip), str(ip), use_cache, lambda: _lookup_ip(str(ip), timeout))
         else:
             # IPv6/приватные/прочее тут не поддерживаем
             return WhoisResult(False, "ip", t, [], error="Поддерживается только публичный IPv4 (не приватный/loopback/link-local)")
     except ValueError:
         pass
 
-    # Домены -> python-whois
-    return _lookup_domain(t)
+    # Домены -> свой клиент порта 43 (whois_client), разбор полей — парсером python-whois
+    return _cached(_whois_cache, t, t.lower().rstrip("."), use_cache, lambda: _lookup_domain(t, timeout))
+
+
+# ответы реестров об отсутствии домена (начало строки); python-whois сообщает о них
+# исключением, у которого и тип, и текст зависят от версии
+_NOT_FOUND_RE = re.compile(
+    r"^[ \t]*(?:No match for|NOT FOUND|Domain not found|No entries found|No Data Found|No Object Found"
+    r"|The queried object does not exist|Status:[ \t]*(?:free|available)\b)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+def _servers_line(resp: whois_client.WhoisResponse) -> str:
+    hops = []
+    for h in resp.hops:
+        if h.error:
+            hops.append(f"{h.server} (❌ {h.error})")
+        else:
+            hops.append(f"{h.server} ({h.ms:.0f} ms" + (", обрезан" if h.truncated else "") + ")")
+    return "Servers: " + " → ".join(hops)
 
 
-def _lookup_domain(domain: str) -> WhoisResult:
+def _lookup_domain(domain: str, timeout: float) -> WhoisResult:
     try:
-        w = domain_whois.whois(domain)
-    except Exception as e:
+        resp = whois_client.lookup_domain(domain, timeout=timeout)
+    except OSError as e:
         return WhoisResult(False, "domain", domain, [], error=f"WHOIS error: {e}")
+    if _NOT_FOUND_RE.search(resp.text):
+        return WhoisResult(False, "domain", domain, [], error=f"WHOIS error: домен не найден. {_servers_line(resp)}")
+    try:
+        w = domain_whois.parser.WhoisEntry.load(resp.domain, resp.text)
+    except Exception as e:
+        # текст исключений python-whois — обычно весь ответ сервера, поэтому только тип
+        why = f"не удалось разобрать ответ ({type(e).__name__})"
+        return WhoisResult(False, "domain", domain, [], error=f"WHOIS error: {why}. {_servers_line(resp)}")
 
     # Пытаемся собрать краткое резюме
     dn = (w.get("domain_name") if isinstance(w, dict) else getattr(w, "domain_name", None))
@@ -108,17 +169,11 @@ def _lookup_domain(domain: str) -> WhoisResult:
     if expires: lines.append(f"Expires: {expires}")
     if ns: lines.append(f"Name servers: {ns}")
     if status: lines.append(f"Status: {status}")
+    lines = (lines or ["(нет краткого резюме)"]) + [_servers_line(resp)]
 
-    raw_text = None
-    try:
-        raw_text = getattr(w, "text", None)
-        if not raw_text:
-            raw_text = json.dumps(w, ensure_ascii=False, default=str)
-    except Exception:
-        raw_text = None
-    raw_text = _clean_whois_text(raw_text)
-
-    return WhoisResult(True, "domain", domain, lines or ["(нет краткого резюме)"], raw_text=raw_text)
+    raw_text = _clean_whois_text(resp.text) or None
+
+    return WhoisResult(True, "domain", domain, lines, raw_text=raw_text)
 
 
 def _lookup_ip(ip: str, timeout: float) -> WhoisResult:
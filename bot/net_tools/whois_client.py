@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from bot.net_tools import connect
+from bot.net_tools.result_cache import ResultCache
+
+WHOIS_IANA_SERVER = os.getenv("LNH_WHOIS_IANA_SERVER") or "whois.iana.org"
+WHOIS_HOP_TIMEOUT = float(os.getenv("LNH_WHOIS_HOP_TIMEOUT") or 5.0)      # секунд на один сервер
+WHOIS_MAX_BYTES = int(os.getenv("LNH_WHOIS_MAX_BYTES") or 256 * 1024)      # ответ одного сервера, дальше обрезается
+WHOIS_SERVER_TTL = int(os.getenv("LNH_WHOIS_SERVER_TTL") or 7 * 86400)     # сколько помнить сервер зоны из IANA
+WHOIS_PORT = 43
+_MAX_REFERRALS = 2  # реестр -> регистратор -> (реселлер)
+
+# серверы, которым нужен свой синтаксис запроса
+_QUERY_FORMAT = {
+    "whois.verisign-grs.com": "domain {}",  # иначе в ответ попадают и одноимённые NS-хосты
+    "whois.denic.de": "-T dn,ace {}",
+    "whois.jprs.jp": "{}/e",               # английские названия полей
+}
+
+# IANA: «refer:» на запрос домена, «whois:» на запрос зоны
+_IANA_RE = re.compile(r"^[ \t]*(?:refer|whois):[ \t]*(\S+)", re.IGNORECASE | re.MULTILINE)
+# реестр -> регистратор (gTLD thick/thin, ARIN-подобные)
+_REFERRAL_RE = re.compile(
+    r"^[ \t]*(?:Registrar WHOIS Server|Whois Server|ReferralServer):[ \t]*(\S+)", re.IGNORECASE | re.MULTILINE
+)
+
+
+@dataclass
+class Hop:
+    server: str                      # host[:port]
+    ms: Optional[float] = None
+    size: int = 0                    # длина ответа, символов
+    truncated: bool = False          # ответ длиннее WHOIS_MAX_BYTES
+    error: Optional[str] = None
+
+@dataclass
+class WhoisResponse:
+    domain: str                      # в ACE (punycode), без точки в конце
+    text: str                        # ответы серверов по порядку запросов
+    hops: List[Hop] = field(default_factory=list)
+
+
+class WhoisError(OSError):
+    """WHOIS-сервер не найден или не ответил."""
+
+
+def _split_server(server: str) -> tuple[str, int]:
+    host, sep, port = server.rpartition(":")
+    if sep and port.isdigit() and host and ":" not in host:
+        return host, int(port)
+    return server, WHOIS_PORT
+
+def _normalize_server(s: str) -> str | None:
+    s = s.strip().rstrip("/").lower()
+    if "://" in s:
+        scheme, _, s = s.partition("://")
+        if scheme != "whois":
+            return None  # rwhois:// и http(s):// — не порт 43
+    return s or None
+
+def _decode(buf: bytes) -> str:
+    try:
+        return buf.decode("utf-8")
+    except UnicodeDecodeError:
+        return buf.decode("latin-1")  # часть ccTLD-серверов отвечает в однобайтовой кодировке
+
+def query(server: str, q: str, timeout: float = WHOIS_HOP_TIMEOUT, max_bytes: int = WHOIS_MAX_BYTES,
+          public_only: bool = False) -> tuple[str, bool]:
+    """
+    Один запрос к WHOIS-серверу (host или host:port, по умолчанию порт 43): строка запроса, ответ — до
+    закрытия соединения. timeout — на весь запрос, включая подключение. Ответ читается в буфер не
+    больше max_bytes, лишнее отбрасывается. Возвращает (текст, обрезан ли).
+    public_only — не подключаться к непубличным адресам (см. connect.connect).
+    """
+    host, port = _split_server(server)
+    deadline = time.monotonic() + timeout
+    conn = connect.connect(host, port, timeout=timeout, public_only=public_only)
+    buf = bytearray()
+    with conn.sock as sock:
+        sock.sendall(q.encode("utf-8") + b"\r\n")
+        while len(buf) < max_bytes:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise TimeoutError(f"{server}: timed out reading response")
+            sock.settimeout(left)
+            chunk = sock.recv(min(65536, max_bytes - len(buf)))
+            if not chunk:
+                return _decode(bytes(buf)), False
+            buf += chunk
+    return _decode(bytes(buf)), True
+
+
+# индекс «зона -> WHOIS-сервер» из ответов IANA; "" — у зоны нет WHOIS-сервера
+_servers = ResultCache("whois_server", lambda s: {"server": s}, lambda d: d["server"], ttl=WHOIS_SERVER_TTL)
+
+def server_for(tld: str, timeout: float = WHOIS_HOP_TIMEOUT) -> str:
+    tld = tld.lower()
+    hit = _servers.get(tld)
+    if hit is not None:
+        return hit[0]
+    text, _truncated = query(WHOIS_IANA_SERVER, tld, timeout=timeout)
+    m = _IANA_RE.search(text)
+    server = (_normalize_server(m.group(1)) if m else None) or ""
+    _servers.put(tld, server)
+    return server
+
+def server_index_stats() -> dict:
+    return _servers.stats()
+
+def _referral(text: str, visited: set[str]) -> str | None:
+    # ссылку задаёт ответ стороннего сервера: только порт 43, иначе бот можно направить на любой сервис
+    for m in _REFERRAL_RE.finditer(text):
+        server = _normalize_server(m.group(1))
+        if server and server not in visited and _split_server(server)[1] == WHOIS_PORT:
+            return server
+    return None
+
+def lookup_domain(domain: str, timeout: float = 8.0) -> WhoisResponse:
+    """
+    WHOIS домена по порту 43: сервер зоны — из индекса (при промахе спрашиваем IANA), дальше
+    ссылки реестр -> регистратор, не больше _MAX_REFERRALS: только на порт 43 и только на
+    публичные адреса. На каждый сервер — не больше WHOIS_HOP_TIMEOUT и не дольше общего timeout.
+    Если регистратор не ответил, возвращается ответ реестра (ошибка — в hops).
+    """
+    deadline = time.monotonic() + timeout
+    name = domain.strip().rstrip(".").lower()
+    try:
+        name = name.encode("idna").decode("ascii")
+    except UnicodeError:
+        raise WhoisError(f"некорректное имя: {domain}") from None
+    tld = name.rsplit(".", 1)[-1]
+
+    def budget() -> float:
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError(f"WHOIS {name}: timed out")
+        return min(WHOIS_HOP_TIMEOUT, left)
+
+    try:
+        server = server_for(tld, timeout=budget())
+    except OSError as e:
+        raise WhoisError(f"IANA ({WHOIS_IANA_SERVER}): {e}") from None
+    if not server:
+        raise WhoisError(f"для зоны .{tld} нет WHOIS-сервера")
+
+    hops: list[Hop] = []
+    texts: list[str] = []
+    visited = {server}
+    while server:
+        started = time.monotonic()
+        try:
+            text, truncated = query(
+                server, _QUERY_FORMAT.get(server, "{}").format(name), timeout=budget(), public_only=bool(hops)
+            )
+        except OSError as e:
+            hops.append(Hop(server, error=str(e)))
+            if not texts:
+                raise WhoisError(f"{server}: {e}") from None
+            break
+        hops.append(Hop(server, (time.monotonic() - started) * 1000, len(text), truncated))
+        texts.append(text)
+        server = _referral(text, visited) if len(hops) <= _MAX_REFERRALS else None
+        if server:
+            visited.add(server)
+    return WhoisResponse(name, "\n\n".join(texts), hops)
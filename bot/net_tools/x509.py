@@ -0,0 +1,436 @@
+from __future__ import annotations
+
+import datetime as dt
+import ipaddress
+from dataclasses import dataclass, field
+from typing import Iterator
+
+# Минимальный разбор DER X.509 прямо по байтам getpeercert(binary_form=True):
+# без временных файлов и без приватного ssl._ssl._test_decode_cert.
+# Строки декодируются только у нужных полей, остальное — срезы memoryview без копий.
+
+_SEQUENCE = 0x30
+_SET = 0x31
+_INTEGER = 0x02
+_BIT_STRING = 0x03
+_OCTET_STRING = 0x04
+_OID = 0x06
+_BOOLEAN = 0x01
+_UTC_TIME = 0x17
+_GENERALIZED_TIME = 0x18
+_CTX_0 = 0xA0  # [0] EXPLICIT version
+_CTX_3 = 0xA3  # [3] EXPLICIT extensions
+
+# GeneralName (IMPLICIT-теги)
+_GN_EMAIL = 0x81
+_GN_DNS = 0x82
+_GN_URI = 0x86
+_GN_IP = 0x87
+
+
+def _encode_oid(dotted: str) -> bytes:
+    parts = [int(p) for p in dotted.split(".")]
+    out = bytearray()
+    for n in [parts[0] * 40 + parts[1], *parts[2:]]:
+        chunk = [n & 0x7F]
+        n >>= 7
+        while n:
+            chunk.append(0x80 | (n & 0x7F))
+            n >>= 7
+        out += bytes(reversed(chunk))
+    return bytes(out)
+
+def _oid_table(names: dict[str, str]) -> dict[bytes, str]:
+    """{DER-содержимое OID: имя} — известные OID сравниваются как байты, без перевода в строку."""
+    return {_encode_oid(k): v for k, v in names.items()}
+
+# имена атрибутов — как в словаре ssl.getpeercert()
+_NAME_ATTRS = _oid_table({
+    "2.5.4.3": "commonName",
+    "2.5.4.4": "surname",
+    "2.5.4.5": "serialNumber",
+    "2.5.4.6": "countryName",
+    "2.5.4.7": "localityName",
+    "2.5.4.8": "stateOrProvinceName",
+    "2.5.4.9": "streetAddress",
+    "2.5.4.10": "organizationName",
+    "2.5.4.11": "organizationalUnitName",
+    "2.5.4.12": "title",
+    "2.5.4.42": "givenName",
+    "2.5.4.15": "businessCategory",
+    "2.5.4.17": "postalCode",
+    "2.5.4.43": "initials",
+    "2.5.4.44": "generationQualifier",
+    "2.5.4.46": "dnQualifier",
+    "2.5.4.65": "pseudonym",
+    "2.5.4.97": "organizationIdentifier",
+    "1.3.6.1.4.1.311.60.2.1.1": "jurisdictionLocalityName",
+    "1.3.6.1.4.1.311.60.2.1.2": "jurisdictionStateOrProvinceName",
+    "1.3.6.1.4.1.311.60.2.1.3": "jurisdictionCountryName",
+    "0.9.2342.19200300.100.1.1": "userId",
+    "1.2.840.113549.1.9.1": "emailAddress",
+    "0.9.2342.19200300.100.1.25": "domainComponent",
+})
+
+# имена алгоритмов подписи — как у OpenSSL
+_SIG_ALGS = _oid_table({
+    "1.2.840.113549.1.1.4": "md5WithRSAEncryption",
+    "1.2.840.113549.1.1.5": "sha1WithRSAEncryption",
+    "1.2.840.113549.1.1.10": "rsassaPss",
+    "1.2.840.113549.1.1.11": "sha256WithRSAEncryption",
+    "1.2.840.113549.1.1.12": "sha384WithRSAEncryption",
+    "1.2.840.113549.1.1.13": "sha512WithRSAEncryption",
+    "1.2.840.113549.1.1.14": "sha224WithRSAEncryption",
+    "1.2.840.10045.4.1": "ecdsa-with-SHA1",
+    "1.2.840.10045.4.3.1": "ecdsa-with-SHA224",
+    "1.2.840.10045.4.3.2": "ecdsa-with-SHA256",
+    "1.2.840.10045.4.3.3": "ecdsa-with-SHA384",
+    "1.2.840.10045.4.3.4": "ecdsa-with-SHA512",
+    "1.2.840.10040.4.3": "dsa-with-SHA1",
+    "2.16.840.1.101.3.4.3.2": "dsa-with-SHA256",
+    "1.3.101.112": "ED25519",
+    "1.3.101.113": "ED448",
+})
+
+_KEY_RSA = _encode_oid("1.2.840.113549.1.1.1")
+_KEY_RSA_PSS = _encode_oid("1.2.840.113549.1.1.10")
+_KEY_EC = _encode_oid("1.2.840.10045.2.1")
+_KEY_DSA = _encode_oid("1.2.840.10040.4.1")
+_KEY_FIXED = _oid_table({"1.3.101.112": "Ed25519", "1.3.101.113": "Ed448", "1.3.101.110": "X25519", "1.3.101.111": "X448"})
+_KEY_FIXED_BITS = {"Ed25519": 256, "Ed448": 456, "X25519": 253, "X448": 448}
+
+# кривая EC: (имя, бит)
+_CURVES = {
+    _encode_oid("1.2.840.10045.3.1.7"): ("P-256", 256),
+    _encode_oid("1.3.132.0.34"): ("P-384", 384),
+    _encode_oid("1.3.132.0.35"): ("P-521", 521),
+    _encode_oid("1.3.132.0.10"): ("secp256k1", 256),
+    _encode_oid("1.2.840.10045.3.1.1"): ("P-192", 192),
+    _encode_oid("1.3.132.0.33"): ("P-224", 224),
+}
+
+_EXT_SAN = _encode_oid("2.5.29.17")
+_EXT_AIA = _encode_oid("1.3.6.1.5.5.7.1.1")
+_EXT_SKI = _encode_oid("2.5.29.14")
+_EXT_AKI = _encode_oid("2.5.29.35")
+_EXT_BASIC = _encode_oid("2.5.29.19")
+_EXTENSIONS = (_EXT_SAN, _EXT_AIA, _EXT_SKI, _EXT_AKI, _EXT_BASIC)
+_AD_OCSP = _encode_oid("1.3.6.1.5.5.7.48.1")
+_AD_CA_ISSUERS = _encode_oid("1.3.6.1.5.5.7.48.2")
+
+
+class CertificateError(ValueError):
+    """Байты не похожи на DER-сертификат X.509."""
+
+
+@dataclass
+class Certificate:
+    version: int                                       # 1..3
+    serial: str                                        # HEX, как serialNumber в ssl
+    subject: list[tuple[str, str]]                     # [(атрибут, значение)] в порядке DN
+    issuer: list[tuple[str, str]]
+    not_before: dt.datetime | None                     # UTC, naive
+    not_after: dt.datetime | None
+    signature_algorithm: str | None = None
+    key_type: str | None = None                        # RSA | EC | DSA | Ed25519 …
+    key_bits: int | None = None
+    curve: str | None = None                           # для EC: P-256 …
+    san: list[tuple[str, str]] = field(default_factory=list)  # [("DNS"|"IP Address"|"email"|"URI", значение)]
+    ocsp_urls: list[str] = field(default_factory=list)
+    ca_issuers: list[str] = field(default_factory=list)
+    is_ca: bool | None = None                          # basicConstraints; None — расширения нет
+    ski: bytes | None = None                           # Subject Key Identifier
+    aki: bytes | None = None                           # Authority Key Identifier (keyIdentifier)
+
+    @property
+    def self_issued(self) -> bool:
+        return self.subject == self.issuer and (self.aki is None or self.ski is None or self.aki == self.ski)
+
+    def issued_by(self, other: Certificate) -> bool:
+        """other — издатель: имя издателя совпадает с его subject, а AKI (если есть) — с его SKI."""
+        if self.issuer != other.subject:
+            return False
+        return self.aki is None or other.ski is None or self.aki == other.ski
+
+    def name_attr(self, which: list[tuple[str, str]], attr: str) -> str | None:
+        """Последнее значение атрибута (как выбирает CN OpenSSL)."""
+        value = None
+        for k, v in which:
+            if k == attr:
+                value = v
+        return value
+
+    @property
+    def subject_cn(self) -> str | None:
+        return self.name_attr(self.subject, "commonName")
+
+    @property
+    def issuer_cn(self) -> str | None:
+        return self.name_attr(self.issuer, "commonName")
+
+    def matches_hostname(self, host: str) -> bool:
+        """
+        Проверка имени по RFC 6125 (замена удалённого в Python 3.12 ssl.match_hostname):
+        IP — только среди IP в SAN; имя — среди DNS в SAN, CN лишь при отсутствии DNS в SAN.
+        Звёздочка допускается только целой левой меткой.
+        """
+        host = host.rstrip(".").lower()
+        try:
+            ip = ipaddress.ip_address(host)
+        except ValueError:
+            ip = None
+        if ip is not None:
+            return any(k == "IP Address" and _same_ip(v, ip) for k, v in self.san)
+
+        names = [v for k, v in self.san if k == "DNS"]
+        if not names and self.subject_cn:
+            names = [self.subject_cn]
+        return any(_dns_match(n, host) for n in names)
+
+
+def _same_ip(value: str, ip) -> bool:
+    try:
+        return ipaddress.ip_address(value) == ip
+    except ValueError:
+        return False
+
+def _dns_match(pattern: str, host: str) -> bool:
+    pattern = pattern.rstrip(".").lower()
+    if not pattern.startswith("*."):
+        return pattern == host
+    # *.example.com: ровно одна метка вместо звёздочки
+    head, _, rest = host.partition(".")
+    return bool(head) and rest == pattern[2:] and "." in rest
+
+
+# --- DER
+
+def _tlv(buf: memoryview, pos: int, end: int) -> tuple[int, int, int]:
+    """(тег, начало содержимого, конец содержимого) элемента по смещению pos."""
+    if pos + 2 > end:
+        raise CertificateError("truncated DER")
+    tag = buf[pos]
+    n = buf[pos + 1]
+    pos += 2
+    if n & 0x80:
+        k = n & 0x7F
+        if not 0 < k <= 4 or pos + k > end:
+            raise CertificateError("bad DER length")
+        n = int.from_bytes(buf[pos:pos + k], "big")
+        pos += k
+    if pos + n > end:
+        raise CertificateError("truncated DER")
+    return tag, pos, pos + n
+
+def _items(buf: memoryview, pos: int, end: int) -> Iterator[tuple[int, int, int]]:
+    while pos < end:
+        tag, s, e = _tlv(buf, pos, end)
+        yield tag, s, e
+        pos = e
+
+def _expect(buf: memoryview, pos: int, end: int, tag: int) -> tuple[int, int]:
+    t, s, e = _tlv(buf, pos, end)
+    if t != tag:
+        raise CertificateError(f"unexpected DER tag 0x{t:02x}")
+    return s, e
+
+def _oid_str(raw: bytes) -> str:
+    parts: list[int] = []
+    n = 0
+    for b in raw:
+        n = (n << 7) | (b & 0x7F)
+        if not b & 0x80:
+            parts.append(n)
+            n = 0
+    if not parts:
+        return ""
+    first = parts[0]
+    head = [min(first // 40, 2), first - 40 * min(first // 40, 2)]
+    return ".".join(map(str, head + parts[1:]))
+
+def _string(tag: int, raw: memoryview) -> str:
+    if tag == 0x1E:  # BMPString
+        return str(raw, "utf-16-be", "replace")
+    if tag == 0x1C:  # UniversalString
+        return str(raw, "utf-32-be", "replace")
+    if tag == 0x14:  # T61String — на практике latin-1
+        return str(raw, "latin-1")
+    return str(raw, "utf-8", "replace")
+
+def _name(buf: memoryview, s: int, e: int) -> list[tuple[str, str]]:
+    out = []
+    for tag, rs, re_ in _items(buf, s, e):
+        if tag != _SET:
+            raise CertificateError("bad Name")
+        for _t, as_, ae in _items(buf, rs, re_):
+            os_, oe = _expect(buf, as_, ae, _OID)
+            vtag, vs, ve = _tlv(buf, oe, ae)
+            raw = bytes(buf[os_:oe])
+            out.append((_NAME_ATTRS.get(raw) or _oid_str(raw), _string(vtag, buf[vs:ve])))
+    return out
+
+def _time(tag: int, raw: memoryview) -> dt.datetime | None:
+    # YYMMDDHHMMSSZ / YYYYMMDDHHMMSSZ; strptime здесь заметно дороже всего остального разбора
+    s = bytes(raw)
+    try:
+        if tag == _UTC_TIME:
+            year = int(s[0:2])
+            year += 1900 if year >= 50 else 2000  # RFC 5280
+            s = s[2:]
+        elif tag == _GENERALIZED_TIME:
+            year = int(s[0:4])
+            s = s[4:]
+        else:
+            return None
+        return dt.datetime(year, int(s[0:2]), int(s[2:4]), int(s[4:6]), int(s[6:8]), int(s[8:10]))
+    except ValueError:
+        return None
+
+def _algorithm(buf: memoryview, s: int, e: int) -> tuple[bytes, int, int]:
+    """AlgorithmIdentifier -> (OID, границы параметров)."""
+    os_, oe = _expect(buf, s, e, _OID)
+    return bytes(buf[os_:oe]), oe, e
+
+def _int_bits(raw: memoryview) -> int:
+    i = 0
+    while i < len(raw) - 1 and raw[i] == 0:
+        i += 1
+    return (len(raw) - i - 1) * 8 + raw[i].bit_length() if len(raw) else 0
+
+def _public_key(cert: Certificate, buf: memoryview, s: int, e: int) -> None:
+    _t, as_, ae = _tlv(buf, s, e)
+    oid, ps, pe = _algorithm(buf, as_, ae)
+    bs, be = _expect(buf, ae, e, _BIT_STRING)
+    key_start = bs + 1  # первый байт BIT STRING — число неиспользуемых бит
+    if oid in (_KEY_RSA, _KEY_RSA_PSS):
+        cert.key_type = "RSA"
+        ks, ke = _expect(buf, key_start, be, _SEQUENCE)
+        ms, me = _expect(buf, ks, ke, _INTEGER)
+        cert.key_bits = _int_bits(buf[ms:me])
+    elif oid == _KEY_EC:
+        cert.key_type = "EC"
+        if ps < pe:
+            ptag, cs, ce = _tlv(buf, ps, pe)
+            if ptag == _OID:
+                cert.curve, cert.key_bits = _CURVES.get(bytes(buf[cs:ce]), (_oid_str(bytes(buf[cs:ce])), None))
+    elif oid == _KEY_DSA:
+        cert.key_type = "DSA"
+        if ps < pe:
+            ds, de = _expect(buf, ps, pe, _SEQUENCE)
+            p_s, p_e = _expect(buf, ds, de, _INTEGER)
+            cert.key_bits = _int_bits(buf[p_s:p_e])
+    elif oid in _KEY_FIXED:
+        cert.key_type = _KEY_FIXED[oid]
+        cert.key_bits = _KEY_FIXED_BITS[cert.key_type]
+    else:
+        cert.key_type = _oid_str(oid)
+
+def _general_name(tag: int, raw: memoryview) -> tuple[str, str] | None:
+    if tag == _GN_DNS:
+        return "DNS", str(raw, "ascii", "replace")
+    if tag == _GN_IP:
+        if len(raw) in (4, 16):
+            return "IP Address", str(ipaddress.ip_address(bytes(raw)))
+        return None
+    if tag == _GN_EMAIL:
+        return "email", str(raw, "ascii", "replace")
+    if tag == _GN_URI:
+        return "URI", str(raw, "ascii", "replace")
+    return None
+
+def _extensions(cert: Certificate, buf: memoryview, s: int, e: int) -> None:
+    ss, se = _expect(buf, s, e, _SEQUENCE)
+    for _t, xs, xe in _items(buf, ss, se):
+        os_, oe = _expect(buf, xs, xe, _OID)
+        oid = buf[os_:oe]
+        if oid not in _EXTENSIONS:
+            continue
+        tag, vs, ve = _tlv(buf, oe, xe)
+        if tag == _BOOLEAN:  # critical
+            tag, vs, ve = _tlv(buf, ve, xe)
+        if tag != _OCTET_STRING:
+            raise CertificateError("bad extension")
+        if oid == _EXT_SKI:
+            ks, ke = _expect(buf, vs, ve, _OCTET_STRING)
+            cert.ski = bytes(buf[ks:ke])
+            continue
+        seq_s, seq_e = _expect(buf, vs, ve, _SEQUENCE)
+        if oid == _EXT_SAN:
+            for gtag, gs, ge in _items(buf, seq_s, seq_e):
+                item = _general_name(gtag, buf[gs:ge])
+                if item:
+                    cert.san.append(item)
+        elif oid == _EXT_AKI:
+            for ktag, ks, ke in _items(buf, seq_s, seq_e):
+                if ktag == 0x80:  # [0] keyIdentifier
+                    cert.aki = bytes(buf[ks:ke])
+        elif oid == _EXT_BASIC:
+            cert.is_ca = False
+            for btag, bs, be in _items(buf, seq_s, seq_e):
+                if btag == _BOOLEAN:
+                    cert.is_ca = be > bs and buf[bs] != 0
+        else:
+            for _t2, ads, ade in _items(buf, seq_s, seq_e):
+                ms, me = _expect(buf, ads, ade, _OID)
+                gtag, gs, ge = _tlv(buf, me, ade)
+                if gtag != _GN_URI:
+                    continue
+                url = str(buf[gs:ge], "ascii", "replace")
+                method = buf[ms:me]
+                if method == _AD_OCSP:
+                    cert.ocsp_urls.append(url)
+                elif method == _AD_CA_ISSUERS:
+                    cert.ca_issuers.append(url)
+
+def parse(der: bytes | bytearray | memoryview) -> Certificate:
+    """Разбор DER-сертификата. CertificateError, если структура не X.509."""
+    buf = memoryview(der)
+    end = len(buf)
+    try:
+        cs, ce = _expect(buf, 0, end, _SEQUENCE)
+        tbs_tag, ts, te = _tlv(buf, cs, ce)
+        if tbs_tag != _SEQUENCE:
+            raise CertificateError("bad TBSCertificate")
+        _t, sas, sae = _tlv(buf, te, ce)
+        sig_oid, _ps, _pe = _algorithm(buf, sas, sae)
+
+        fields = _items(buf, ts, te)
+        tag, s, e = next(fields)
+        version = 1
+        if tag == _CTX_0:
+            vs, ve = _expect(buf, s, e, _INTEGER)
+            version = int.from_bytes(buf[vs:ve], "big") + 1
+            tag, s, e = next(fields)
+        if tag != _INTEGER:
+            raise CertificateError("bad serial")
+        serial = bytes(buf[s:e]).lstrip(b"\0").hex().upper() or "00"
+
+        next(fields)  # signature (повторяет внешний signatureAlgorithm)
+        _t, is_, ie = next(fields)
+        issuer = _name(buf, is_, ie)
+        _t, vs, ve = next(fields)
+        validity = list(_items(buf, vs, ve))
+        if len(validity) != 2:
+            raise CertificateError("bad Validity")
+        _t, ss, se = next(fields)
+        subject = _name(buf, ss, se)
+
+        cert = Certificate(
+            version=version,
+            serial=serial,
+            subject=subject,
+            issuer=issuer,
+            not_before=_time(validity[0][0], buf[validity[0][1]:validity[0][2]]),
+            not_after=_time(validity[1][0], buf[validity[1][1]:validity[1][2]]),
+            signature_algorithm=_SIG_ALGS.get(sig_oid) or _oid_str(sig_oid),
+        )
+        _t, ks, ke = next(fields)
+        _public_key(cert, buf, ks, ke)
+        for tag, s, e in fields:
+            if tag == _CTX_3:
+                _extensions(cert, buf, s, e)
+        return cert
+    except CertificateError:
+        raise
+    except (StopIteration, IndexError, ValueError) as e:
+        raise CertificateError(f"malformed certificate: {e}") from None
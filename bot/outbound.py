@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+# приоритеты: меньше — раньше
+PRIORITY_INTERACTIVE = 0   # ответы пользователю: плейсхолдеры, результаты
+PRIORITY_PROGRESS = 1      # промежуточные правки, "печатает…"
+
+GLOBAL_RATE = float(os.getenv("LNH_TG_GLOBAL_RATE") or 30)      # сообщений/с на бота
+CHAT_RATE = float(os.getenv("LNH_TG_CHAT_RATE") or 1)           # сообщений/с в один чат
+CHAT_BURST = float(os.getenv("LNH_TG_CHAT_BURST") or 3)
+MAX_RETRIES = int(os.getenv("LNH_TG_MAX_RETRIES") or 3)
+MAX_RETRY_AFTER = 60.0
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def _refill(self, now: float) -> None:
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def waitTime(self, now: float) -> float:
+        """Через сколько секунд будет доступен токен (0 — уже есть)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, seconds: float) -> None:
+        """После 429: не выдавать токены seconds секунд."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+    def isIdle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity and now >= self.paused_until
+
+
+class _Ticket:
+    __slots__ = ("key", "chat_id", "granted", "cancelled")
+
+    def __init__(self, priority: int, seq: int, chat_id: int | None) -> None:
+        self.key = (priority, seq)
+        self.chat_id = chat_id
+        self.granted = False
+        self.cancelled = False
+
+    def __lt__(self, other: _Ticket) -> bool:
+        return self.key < other.key
+
+
+class OutboundScheduler:
+    """
+    Очередь исходящих запросов к Telegram с лимитами:
+    - глобальный token bucket (GLOBAL_RATE/с) и bucket на каждый чат (CHAT_RATE/с, всплеск CHAT_BURST);
+    - среди ожидающих первым идёт запрос с меньшим priority, при равенстве — пришедший раньше;
+      запрос в «занятый» чат не задерживает запросы в другие чаты;
+    - на 429 чат (или весь бот) ставится на паузу retry_after, и запрос повторяется.
+
+    Ожидающие лежат в куче; токены раздаёт тот поток, что держит lock (_grant), остальные спят
+    до notify_all или до момента, когда пополнится bucket, который их держит.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        chat_burst: float = CHAT_BURST,
+        max_retries: int = MAX_RETRIES,
+    ) -> None:
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+
+        self._cond = threading.Condition()
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[int, TokenBucket] = {}
+        self._waiting: list[_Ticket] = []  # куча по (priority, seq)
+        self._seq = itertools.count()
+        self._acquired = 0
+
+    def _chat(self, chat_id: int) -> TokenBucket:
+        b = self._chats.get(chat_id)
+        if b is None:
+            b = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return b
+
+    def _prune(self, now: float) -> None:
+        waiting = {t.chat_id for t in self._waiting}
+        for chat_id in [c for c, b in self._chats.items() if c not in waiting and b.isIdle(now)]:
+            del self._chats[chat_id]
+
+    def _grant(self, now: float) -> float | None:
+        """
+        Раздаёт токены ожидающим, пока они есть. Возвращает, через сколько секунд bucket, который
+        держит очередь, пополнится (None — ждать нечего). Вызывается под lock.
+        """
+        granted = False
+        wait: float | None = None
+        while self._waiting:
+            wait = self._global.waitTime(now)
+            if wait > 0:
+                break
+            # лучший ожидающий, чей чат сейчас может отправлять; занятые чаты возвращаются в кучу
+            wait = None
+            blocked: list[_Ticket] = []
+            chosen: _Ticket | None = None
+            while self._waiting:
+                t = heapq.heappop(self._waiting)
+                if t.cancelled:
+                    continue
+                w = self._chat(t.chat_id).waitTime(now) if t.chat_id is not None else 0.0
+                if w <= 0:
+                    chosen = t
+                    break
+                blocked.append(t)
+                wait = w if wait is None else min(wait, w)
+            for t in blocked:
+                heapq.heappush(self._waiting, t)
+            if chosen is None:
+                break
+            self._global.take(now)
+            if chosen.chat_id is not None:
+                self._chat(chosen.chat_id).take(now)
+            chosen.granted = True
+            granted = True
+            self._acquired += 1
+            if self._acquired % 1000 == 0:
+                self._prune(now)
+        if granted:
+            self._cond.notify_all()
+        return wait
+
+    def tryAcquire(self, chat_id: int | None) -> bool:
+        """Токен без ожидания: только если очереди нет и оба bucket'а готовы."""
+        with self._cond:
+            now = time.monotonic()
+            if self._waiting or self._global.waitTime(now) > 0:
+                return False
+            if chat_id is not None and self._chat(chat_id).waitTime(now) > 0:
+                return False
+            self._global.take(now)
+            if chat_id is not None:
+                self._chat(chat_id).take(now)
+            return True
+
+    def acquire(self, chat_id: int | None, priority: int = PRIORITY_INTERACTIVE) -> None:
+        with self._cond:
+            ticket = _Ticket(priority, next(self._seq), chat_id)
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    wait = self._grant(time.monotonic())
+                    if ticket.granted:
+                        return
+                    self._cond.wait(max(wait, 0.001) if wait is not None else None)
+            except BaseException:
+                if not ticket.granted:
+                    ticket.cancelled = True  # из кучи уберёт _grant
+                    self._cond.notify_all()
+                raise
+
+    def pause(self, chat_id: int | None, seconds: float) -> None:
+        with self._cond:
+            bucket = self._chat(chat_id) if chat_id is not None else self._global
+            bucket.pause(seconds)
+            self._cond.notify_all()
+
+    def _pauseAfter429(self, chat_id: int | None, retry_after: float, attempt: int) -> None:
+        delay = min(float(retry_after), MAX_RETRY_AFTER)
+        logging.warning("Telegram 429 for chat %s, retry in %.0fs (attempt %d)", chat_id, delay, attempt)
+        self.pause(chat_id, delay)
+        # своя причина у 429 бывает только в группах (лимит ~20 сообщений/мин на группу); в личный
+        # чат мы и так шлём в пределах CHAT_RATE, значит сработал общий лимит бота — ждут все чаты
+        if chat_id is not None and chat_id > 0:
+            self.pause(None, delay)
+
+    def call(self, chat_id: int | None, fn: Callable[[], T], priority: int = PRIORITY_INTERACTIVE) -> T:
+        attempt = 0
+        while True:
+            self.acquire(chat_id, priority)
+            try:
+                return fn()
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._pauseAfter429(chat_id, retry_after, attempt)
+
+    async def callAsync(self, chat_id: int | None, fn: Callable[[], Awaitable[T]], priority: int = PRIORITY_INTERACTIVE) -> T:
+        """
+        call() для event loop: те же лимиты и очередь, что у потоковых отправок. Свободный токен
+        берётся сразу, ожидание очереди (acquire блокирующий) — в потоке.
+        """
+        attempt = 0
+        while True:
+            if not self.tryAcquire(chat_id):
+                await asyncio.to_thread(self.acquire, chat_id, priority)
+            try:
+                return await fn()
+            except Exception as e:
+                retry_after = getattr(e, "retry_after", None)
+                if retry_after is None or attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self._pauseAfter429(chat_id, retry_after, attempt)
+
+
+_scheduler: OutboundScheduler | None = None
+_scheduler_lock = threading.Lock()
+
+def getScheduler() -> OutboundScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = OutboundScheduler()
+    return _scheduler
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Sequence
+
+if TYPE_CHECKING:
+    from bot.user_context import UserContext
+
+
+class Router:
+    """
+    Индекс хэндлеров по маршрутам, которые они объявляют (Handler.commands/callbacks/states).
+    candidates() возвращает в порядке регистрации только тех, кому апдейт может подойти:
+    хэндлеры без маршрутов (общая цепочка) + найденные по индексу.
+    Окончательное решение по-прежнему за canHandle — он дешёвый, без обращений к БД.
+    """
+
+    def __init__(self, handlers: Sequence) -> None:
+        self._handlers = list(handlers)
+        self._fallback: list[int] = []
+        self._by_command: dict[str, list[int]] = {}
+        self._by_callback: dict[str, list[int]] = {}
+        self._by_callback_prefix: dict[str, list[int]] = {}
+        self._by_state: dict[str, list[int]] = {}
+
+        for i, h in enumerate(self._handlers):
+            commands = tuple(getattr(h, "commands", ()) or ())
+            callbacks = tuple(getattr(h, "callbacks", ()) or ())
+            states = tuple(getattr(h, "states", ()) or ())
+            if not (commands or callbacks or states):
+                self._fallback.append(i)
+                continue
+            for c in commands:
+                self._by_command.setdefault(c, []).append(i)
+            for c in callbacks:
+                # "ping:" — префикс callback_data, "menu" — точное значение
+                index = self._by_callback_prefix if c.endswith(":") else self._by_callback
+                index.setdefault(c, []).append(i)
+            for st in states:
+                self._by_state.setdefault(st, []).append(i)
+
+    def candidates(self, update: dict, ctx: UserContext) -> list:
+        found: set[int] = set(self._fallback)
+
+        if "callback_query" in update:
+            d = update["callback_query"].get("data") or ""
+            found.update(self._by_callback.get(d, ()))
+            if ":" in d:
+                found.update(self._by_callback_prefix.get(d[: d.index(":") + 1], ()))
+        elif "message" in update:
+            txt = (update["message"].get("text") or "").strip()
+            if txt.startswith("/"):
+                found.update(self._by_command.get(txt, ()))
+            if ctx.state:
+                found.update(self._by_state.get(ctx.state, ()))
+
+        return [self._handlers[i] for i in sorted(found)]
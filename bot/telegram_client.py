@@ -1,48 +1,100 @@
-import urllib.request
 import os
 import json
+import re
+import threading
+import urllib.request
+import uuid
+from typing import IO
 from dotenv import load_dotenv
 
+from bot.http_pool import HttpPool
+from bot.outbound import PRIORITY_INTERACTIVE, PRIORITY_PROGRESS, getScheduler
+
 load_dotenv()
 
+HTTP_POOL_SIZE = int(os.getenv("LNH_HTTP_POOL_SIZE") or 16)
+HTTP_IDLE_TIMEOUT = float(os.getenv("LNH_HTTP_IDLE_TIMEOUT") or 60)
+
+_pool: HttpPool | None = None
+_pool_lock = threading.Lock()
+
+def _getPool() -> HttpPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = HttpPool(
+                    os.getenv("TELEGRAM_BASE_URI") or "",
+                    max_size=HTTP_POOL_SIZE,
+                    idle_timeout=HTTP_IDLE_TIMEOUT,
+                )
+    return _pool
+
+class TelegramAPIError(RuntimeError):
+    """Ответ Bot API с ok=false; retry_after задан для 429 Too Many Requests."""
+
+    def __init__(self, message: str, error_code: int | None = None, description: str | None = None, retry_after: float | None = None) -> None:
+        super().__init__(message)
+        self.error_code = error_code
+        self.description = description
+        self.retry_after = retry_after
+
+def apiError(method: str, body: str, data) -> TelegramAPIError:
+    data = data if isinstance(data, dict) else {}
+    error_code = data.get("error_code")
+    params = data.get("parameters") or {}
+    return TelegramAPIError(
+        f"Telegram API error {method}: {body}",
+        error_code=error_code,
+        description=data.get("description"),
+        retry_after=params.get("retry_after") if error_code == 429 else None,
+    )
+
 def makeRequest(method: str, **param) -> dict:
     json_data = json.dumps(param).encode("utf-8")
-    request = urllib.request.Request(
-        method="POST",
-        url=f"{os.getenv('TELEGRAM_BASE_URI')}/{method}",
-        data=json_data,
-        headers={"Content-Type": "application/json"},
-    )
+    # long polling держит соединение timeout секунд — сокету нужен запас сверху
+    timeout = 30.0
+    if method == "getUpdates" and param.get("timeout"):
+        timeout = max(timeout, float(param["timeout"]) + 10)
+    return _call(method, json_data, {"Content-Type": "application/json"}, timeout)
+
+def _call(method: str, body, headers: dict, timeout: float) -> dict:
     try:
-        with urllib.request.urlopen(request, timeout=30) as response:
-            body = response.read().decode("utf-8")
-            data = json.loads(body)
+        _status, raw = _getPool().request(
+            "POST", f"/{method}",
+            body=body,
+            headers=headers,
+            timeout=timeout,
+        )
+        body = raw.decode("utf-8")
+        data = json.loads(body)
     except Exception as e:
         raise RuntimeError(f"HTTP error calling {method}: {e}") from e
 
     if not isinstance(data, dict) or not data.get("ok"):
-        raise RuntimeError(f"Telegram API error {method}: {body}")
+        raise apiError(method, body, data)
 
     return data["result"]
 
 def getUpdates(**params) -> list[dict]:
     return makeRequest('getUpdates', **params)
 
-def sendMessage(chat_id: int, text: str, reply_markup: dict | None = None, parse_mode: str | None = None) -> dict:
+# отправки в чат идут через OutboundScheduler: лимиты Telegram, приоритеты, повтор после 429
+def sendMessage(chat_id: int, text: str, reply_markup: dict | None = None, parse_mode: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> dict:
     payload = {"chat_id": chat_id, "text": text}
     if reply_markup:
         payload["reply_markup"] = reply_markup
     if parse_mode:
         payload["parse_mode"] = parse_mode
-    return makeRequest("sendMessage", **payload)
+    return getScheduler().call(chat_id, lambda: makeRequest("sendMessage", **payload), priority)
 
-def editMessageText(chat_id: int, message_id: int, text: str, reply_markup: dict | None = None, parse_mode: str | None = None) -> dict:
+def editMessageText(chat_id: int, message_id: int, text: str, reply_markup: dict | None = None, parse_mode: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> dict:
     payload = {"chat_id": chat_id, "message_id": message_id, "text": text}
     if reply_markup:
         payload["reply_markup"] = reply_markup
     if parse_mode:
         payload["parse_mode"] = parse_mode
-    return makeRequest("editMessageText", **payload)
+    return getScheduler().call(chat_id, lambda: makeRequest("editMessageText", **payload), priority)
 
 def answerCallbackQuery(callback_query_id: str, text: str | None = None, show_alert: bool = False) -> dict:
     payload = {"callback_query_id": callback_query_id, "show_alert": show_alert}
@@ -71,24 +123,107 @@ def deleteMessage(chat_id: int, message_id: int) -> dict:
 
 # "пишет..." / имитация активности
 def sendChatAction(chat_id: int, action: str = "typing") -> dict:
-    return makeRequest("sendChatAction", chat_id=chat_id, action=action)
+    return getScheduler().call(chat_id, lambda: makeRequest("sendChatAction", chat_id=chat_id, action=action), PRIORITY_PROGRESS)
 
 # безопасное редактирование — игнорирует "message is not modified" и похожие 400
-def safe_edit_message_text(chat_id: int, message_id: int, *, text: str, reply_markup: dict | None = None, parse_mode: str | None = None) -> bool:
+def safe_edit_message_text(chat_id: int, message_id: int, *, text: str, reply_markup: dict | None = None, parse_mode: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> bool:
     try:
-        editMessageText(chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode)
+        editMessageText(chat_id=chat_id, message_id=message_id, text=text, reply_markup=reply_markup, parse_mode=parse_mode, priority=priority)
         return True
     except RuntimeError as e:
-        s = str(e).lower()
-        benign = (
-            "message is not modified" in s or
-            "message to edit not found" in s or
-            "bad request: not found" in s or
-            "message can't be edited" in s
-        )
-        if benign:
+        if isBenignEditError(e):
             return False
         raise
 
+def isBenignEditError(e: Exception) -> bool:
+    s = str(e).lower()
+    return (
+        "message is not modified" in s or
+        "message to edit not found" in s or
+        "bad request: not found" in s or
+        "message can't be edited" in s
+    )
+
+# экранирование для parse_mode="Markdown": текст с чужого сервера (имена из сертификатов,
+# ответы WHOIS, тексты ошибок) вне блока кода
+def escapeMarkdown(text: str) -> str:
+    return re.sub(r"([_*`\[])", r"\\\1", text)
+
 def getFile(file_id: str) -> dict:
-    return makeRequest("getFile", file_id=file_id)
\ No newline at end of file
+    return makeRequest("getFile", file_id=file_id)
+
+def openFile(file_path: str, timeout: float = 60.0) -> IO[bytes]:
+    """
+    Поток для чтения файла, полученного через getFile (file_path из ответа).
+    Читается по мере надобности — файл целиком в память не загружается. Закрыть после чтения.
+    """
+    # https://api.telegram.org/bot<token> -> https://api.telegram.org/file/bot<token>/<file_path>
+    root, _, bot_part = (os.getenv("TELEGRAM_BASE_URI") or "").rstrip("/").rpartition("/")
+    return urllib.request.urlopen(f"{root}/file/{bot_part}/{file_path}", timeout=timeout)
+
+class _MultipartBody:
+    """
+    Тело multipart/form-data с одним файлом. Файл не читается в память: http.client
+    итерирует тело кусками. Итерировать можно повторно (повтор запроса на новом соединении).
+    """
+
+    def __init__(self, fields: dict, file_field: str, filename: str, fileobj: IO[bytes]) -> None:
+        self.boundary = uuid.uuid4().hex
+        head = b"".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{k}"\r\n\r\n{v}\r\n'.encode("utf-8")
+            for k, v in fields.items()
+        )
+        self.head = head + (
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        self.tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+        self.fileobj = fileobj
+        fileobj.seek(0, os.SEEK_END)
+        self.file_size = fileobj.tell()
+
+    def __len__(self) -> int:
+        return len(self.head) + self.file_size + len(self.tail)
+
+    def __iter__(self):
+        yield self.head
+        self.fileobj.seek(0)
+        while chunk := self.fileobj.read(64 * 1024):
+            yield chunk
+        yield self.tail
+
+    @property
+    def headers(self) -> dict:
+        return {
+            "Content-Type": f"multipart/form-data; boundary={self.boundary}",
+            "Content-Length": str(len(self)),
+        }
+
+def sendDocument(chat_id: int, document: IO[bytes], filename: str, caption: str | None = None, reply_markup: dict | None = None, parse_mode: str | None = None, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """
+    https://core.telegram.org/bots/api#senddocument
+    document — открытый бинарный файл (например, tempfile), отправляется потоково.
+    """
+    fields = {"chat_id": chat_id}
+    if caption:
+        fields["caption"] = caption
+    if reply_markup:
+        fields["reply_markup"] = json.dumps(reply_markup)
+    if parse_mode:
+        fields["parse_mode"] = parse_mode
+    body = _MultipartBody(fields, "document", filename, document)
+    return getScheduler().call(chat_id, lambda: _call("sendDocument", body, body.headers, 120.0), priority)
+
+def setWebhook(url: str, secret_token: str | None = None, **params) -> dict:
+    """
+    https://core.telegram.org/bots/api#setwebhook
+    """
+    if secret_token:
+        params["secret_token"] = secret_token
+    return makeRequest("setWebhook", url=url, **params)
+
+def deleteWebhook(drop_pending_updates: bool = False) -> dict:
+    """
+    https://core.telegram.org/bots/api#deletewebhook
+    """
+    return makeRequest("deleteWebhook", drop_pending_updates=drop_pending_updates)
\ No newline at end of file
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+from bot import db_client
+
+JOURNAL_BATCH_SIZE = int(os.getenv("LNH_JOURNAL_BATCH_SIZE") or 200)
+JOURNAL_FLUSH_MS = int(os.getenv("LNH_JOURNAL_FLUSH_MS") or 500)
+JOURNAL_MAX_BUFFER = int(os.getenv("LNH_JOURNAL_MAX_BUFFER") or 10000)
+
+
+class UpdateJournal:
+    """
+    Отложенная пакетная запись telegram_updates.
+    append() только кладёт апдейт в буфер; фоновый поток пишет пачкой через persistUpdates,
+    когда накопилось batch_size апдейтов или прошло flush_ms с первого непросохшего.
+    Если буфер переполнен (БД не успевает), новые апдейты отбрасываются и считаются в dropped.
+    """
+
+    def __init__(self, batch_size: int = JOURNAL_BATCH_SIZE, flush_ms: int = JOURNAL_FLUSH_MS, max_buffer: int = JOURNAL_MAX_BUFFER) -> None:
+        self.batch_size = max(1, batch_size)
+        self.flush_s = max(0, flush_ms) / 1000
+        self.max_buffer = max(self.batch_size, max_buffer)
+
+        self._cond = threading.Condition()
+        self._buf: deque[dict] = deque()
+        self._oldest: float | None = None
+        self._writing = 0
+        self._closed = False
+
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+        self._thread = threading.Thread(target=self._run, name="lnh-update-journal", daemon=True)
+        self._thread.start()
+
+    @property
+    def buffered(self) -> int:
+        with self._cond:
+            return len(self._buf) + self._writing
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "buffered": len(self._buf) + self._writing,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def append(self, update: dict) -> bool:
+        with self._cond:
+            if self._closed or len(self._buf) >= self.max_buffer:
+                self.dropped += 1
+                return False
+            was_empty = not self._buf
+            if was_empty:
+                self._oldest = time.monotonic()
+            self._buf.append(update)
+            # писатель с пустым буфером ждёт без таймаута: будим его, чтобы он завёл таймер flush_ms.
+            # notify_all — на этом же условии ждут и flush(), одиночный notify() мог достаться им
+            if was_empty or len(self._buf) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+
+    def _take_batch(self) -> list[dict] | None:
+        """Ждёт, пока пора писать; None — журнал закрыт и пуст."""
+        with self._cond:
+            while True:
+                if self._buf:
+                    due = self._oldest + self.flush_s
+                    now = time.monotonic()
+                    if self._closed or len(self._buf) >= self.batch_size or now >= due:
+                        break
+                    self._cond.wait(due - now)
+                elif self._closed:
+                    return None
+                else:
+                    self._cond.wait()
+            n = min(len(self._buf), self.batch_size)
+            batch = [self._buf.popleft() for _ in range(n)]
+            self._oldest = time.monotonic() if self._buf else None
+            self._writing = n
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            try:
+                db_client.persistUpdates(batch)
+                ok = True
+            except Exception:
+                logging.exception("update journal: failed to persist %d updates", len(batch))
+                ok = False
+            with self._cond:
+                self._writing = 0
+                if ok:
+                    self.written += len(batch)
+                else:
+                    self.failed += len(batch)
+                self._cond.notify_all()
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Просит записать всё накопленное и ждёт до timeout. True — буфер пуст."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._oldest = time.monotonic() - self.flush_s if self._buf else None
+            self._cond.notify_all()
+            while self._buf or self._writing:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._cond.wait(left)
+            return True
+
+    def close(self, timeout: float | None = 10.0) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+
+_journal: UpdateJournal | None = None
+_journal_lock = threading.Lock()
+
+def getJournal() -> UpdateJournal:
+    global _journal
+    if _journal is None:
+        with _journal_lock:
+            if _journal is None:
+                _journal = UpdateJournal()
+    return _journal
+
+def closeJournal() -> None:
+    """Дописывает буфер и останавливает фоновый поток (при остановке бота)."""
+    global _journal
+    with _journal_lock:
+        journal, _journal = _journal, None
+    if journal is not None:
+        journal.close()
+        stats = journal.stats()
+        if stats["dropped"] or stats["failed"] or stats["buffered"]:
+            logging.warning("update journal closed: %s", stats)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+MISSING = object()
+
+
+class UserCache:
+    """
+    LRU-кэш строк users с TTL. Хранит и «пользователя нет» (None), чтобы не перечитывать
+    неизвестных пользователей. Возвращает копии: изменения снаружи не портят кэш.
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300.0) -> None:
+        self.max_size = max(0, int(max_size))
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._items: OrderedDict[int, tuple[dict | None, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, telegram_id: int):
+        """Пользователь (dict), None — известно, что его нет, либо MISSING — нет в кэше."""
+        with self._lock:
+            item = self._items.get(telegram_id)
+            if item is None or item[1] < time.monotonic():
+                if item is not None:
+                    del self._items[telegram_id]
+                self.misses += 1
+                return MISSING
+            self._items.move_to_end(telegram_id)
+            self.hits += 1
+            return copy.deepcopy(item[0])
+
+    def put(self, telegram_id: int, user: dict | None) -> None:
+        if self.max_size == 0:
+            return
+        with self._lock:
+            self._items[telegram_id] = (copy.deepcopy(user), time.monotonic() + self.ttl)
+            self._items.move_to_end(telegram_id)
+            while len(self._items) > self.max_size:
+                self._items.popitem(last=False)
+
+    def update(self, telegram_id: int, **fields) -> None:
+        """Обновляет поля закэшированного пользователя; если его нет в кэше — забывает запись."""
+        with self._lock:
+            item = self._items.get(telegram_id)
+            if item is None or item[0] is None:
+                self._items.pop(telegram_id, None)
+                return
+            user = item[0]
+            for k, v in fields.items():
+                user[k] = copy.deepcopy(v)
+
+    def isKnown(self, telegram_id: int) -> bool:
+        """True, если пользователь точно есть в БД (закэширован как существующий)."""
+        with self._lock:
+            item = self._items.get(telegram_id)
+            return item is not None and item[0] is not None and item[1] >= time.monotonic()
+
+    def invalidate(self, telegram_id: int) -> None:
+        with self._lock:
+            self._items.pop(telegram_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import copy
+
+from bot import db_client
+
+
+class UserContext:
+    """
+    Состояние пользователя на время обработки одного апдейта.
+    Загружается из БД один раз в Dispatcher и передаётся в canHandle/handle.
+    Изменения копятся в памяти и записываются одной транзакцией в flush().
+    """
+
+    def __init__(self, telegram_id: int | None, state: str = "", data: dict | None = None, exists: bool = False) -> None:
+        self.telegram_id = telegram_id
+        self._state = state or ""
+        self._data = data if isinstance(data, dict) else {}
+        self.exists = exists
+        self._create = False
+        self._dirty = False
+
+    @classmethod
+    def load(cls, telegram_id: int | None) -> "UserContext":
+        user = db_client.getUser(telegram_id) if telegram_id else None
+        if not user:
+            return cls(telegram_id)
+        return cls(telegram_id, user.get("state") or "", user.get("data"), exists=True)
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def data(self) -> dict:
+        """Копия data: меняйте через setData/updateData/popData, чтобы изменения попали в flush()."""
+        return copy.deepcopy(self._data)
+
+    def setState(self, state: str) -> None:
+        if state != self._state:
+            self._state = state
+            self._dirty = True
+
+    def setData(self, data: dict) -> None:
+        data = data if isinstance(data, dict) else {}
+        if data != self._data:
+            self._data = copy.deepcopy(data)
+            self._dirty = True
+
+    def updateData(self, **values) -> None:
+        data = self.data
+        data.update(values)
+        self.setData(data)
+
+    def popData(self, *keys: str) -> None:
+        data = self.data
+        for k in keys:
+            data.pop(k, None)
+        self.setData(data)
+
+    def ensureExists(self) -> None:
+        if not self.exists:
+            self._create = True
+
+    @property
+    def isDirty(self) -> bool:
+        return self._dirty or (self._create and not self.exists)
+
+    def flush(self) -> None:
+        if self.telegram_id is None or not self.isDirty:
+            return
+        if self._dirty:
+            db_client.saveUser(self.telegram_id, self._state, self._data)
+        else:
+            db_client.ensureUserExists(self.telegram_id)
+        self.exists = True
+        self._create = False
+        self._dirty = False
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import hmac
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bot.dispatcher import Dispatcher, dispatchSafe, getTelegramId
+from bot.long_polling import POLL_QUEUE_SIZE, POLL_WORKERS
+from bot.worker_pool import KeyedWorkerPool
+import bot.telegram_client
+
+WEBHOOK_LISTEN = os.getenv("LNH_WEBHOOK_LISTEN") or "0.0.0.0"
+WEBHOOK_PORT = int(os.getenv("LNH_WEBHOOK_PORT") or 8080)
+WEBHOOK_PATH = os.getenv("LNH_WEBHOOK_PATH") or "/telegram/webhook"
+WEBHOOK_SECRET = os.getenv("LNH_WEBHOOK_SECRET") or ""
+# полный публичный https-URL для setWebhook; пусто — вебхук регистрируется вручную
+WEBHOOK_URL = os.getenv("LNH_WEBHOOK_URL") or ""
+
+_MAX_BODY = 1 << 20  # апдейт Telegram заведомо меньше 1 МБ
+_SUBMIT_TIMEOUT = 2.0
+
+
+class _RecentIds:
+    """Последние принятые update_id: Telegram повторяет доставку, если не получил 200 вовремя."""
+
+    def __init__(self, size: int = 10000) -> None:
+        self._size = size
+        self._ids: OrderedDict[int, None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, update_id: int) -> bool:
+        with self._lock:
+            if update_id in self._ids:
+                return False
+            self._ids[update_id] = None
+            if len(self._ids) > self._size:
+                self._ids.popitem(last=False)
+            return True
+
+    def discard(self, update_id: int) -> None:
+        with self._lock:
+            self._ids.pop(update_id, None)
+
+
+def _make_request_handler(pool: KeyedWorkerPool, path: str, secret: str, recent: _RecentIds):
+    class WebhookRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _reply(self, code: int) -> None:
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def do_POST(self) -> None:
+            if self.path != path:
+                self._reply(404)
+                return
+            got = self.headers.get("X-Telegram-Bot-Api-Secret-Token") or ""
+            if not hmac.compare_digest(got.encode(), secret.encode()):
+                self._reply(403)
+                return
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+            except ValueError:
+                length = -1
+            if length <= 0 or length > _MAX_BODY:
+                self._reply(400)
+                return
+            try:
+                upd = json.loads(self.rfile.read(length))
+                update_id = int(upd["update_id"])
+            except Exception:
+                self._reply(400)
+                return
+
+            if recent.add(update_id):
+                key = getTelegramId(upd) or ("update", update_id)
+                if not pool.submit(key, upd, timeout=_SUBMIT_TIMEOUT):
+                    # очередь переполнена — пусть Telegram повторит доставку позже
+                    recent.discard(update_id)
+                    self._reply(503)
+                    return
+            # подтверждаем сразу: обработка идёт в пуле воркеров
+            self._reply(200)
+
+        def log_message(self, format: str, *args) -> None:
+            logging.debug("webhook: " + format, *args)
+
+    return WebhookRequestHandler
+
+
+def startWebhook(
+    dispatcher: Dispatcher,
+    listen: str | None = None,
+    port: int | None = None,
+    path: str | None = None,
+    secret: str | None = None,
+    workers: int | None = None,
+    queue_size: int | None = None,
+) -> None:
+    """
+    HTTP-сервер для приёма апдейтов через вебхук.
+    Проверяет X-Telegram-Bot-Api-Secret-Token, сразу отвечает 200 и передаёт апдейт
+    в тот же KeyedWorkerPool/Dispatcher, что и long polling.
+    """
+    listen = WEBHOOK_LISTEN if listen is None else listen
+    port = WEBHOOK_PORT if port is None else port
+    path = WEBHOOK_PATH if path is None else path
+    secret = WEBHOOK_SECRET if secret is None else secret
+    if not secret:
+        raise RuntimeError("LNH_WEBHOOK_SECRET is not set")
+
+    pool = KeyedWorkerPool(
+        lambda upd: dispatchSafe(dispatcher, upd),
+        workers=max(1, POLL_WORKERS if workers is None else workers),
+        queue_size=POLL_QUEUE_SIZE if queue_size is None else queue_size,
+    ).start()
+
+    if WEBHOOK_URL:
+        bot.telegram_client.setWebhook(WEBHOOK_URL, secret_token=secret)
+
+    server = ThreadingHTTPServer((listen, port), _make_request_handler(pool, path, secret, _RecentIds()))
+    server.daemon_threads = True
+    logging.info("webhook listening on %s:%s%s", listen, port, path)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        pool.stop(wait=False)
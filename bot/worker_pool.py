@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import logging
+import threading
+import traceback
+from collections import deque
+from typing import Callable, Hashable
+
+
+class KeyedWorkerPool:
+    """
+    Пул потоков для обработки апдейтов.
+    Задачи с разными ключами (telegram_id) выполняются параллельно,
+    задачи с одинаковым ключом — строго по очереди, в порядке submit().
+    """
+
+    def __init__(
+        self,
+        fn: Callable[[dict], None],
+        workers: int = 8,
+        queue_size: int = 1000,
+        on_done: Callable[[dict], None] | None = None,
+    ) -> None:
+        self._fn = fn
+        self._on_done = on_done
+        self._workers = max(1, int(workers))
+        self._slots = threading.BoundedSemaphore(max(1, int(queue_size)))
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        # ключ -> очередь ещё не начатых задач этого ключа
+        self._pending: dict[Hashable, deque[dict]] = {}
+        # ключи, готовые к выполнению (ни один воркер их сейчас не держит)
+        self._ready: deque[Hashable] = deque()
+        self._stopping = False
+        self._threads: list[threading.Thread] = []
+
+    def start(self) -> "KeyedWorkerPool":
+        for i in range(self._workers):
+            t = threading.Thread(target=self._worker, name=f"lnh-worker-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def submit(self, key: Hashable, item: dict, timeout: float | None = None) -> bool:
+        """
+        Ставит задачу в очередь ключа. Если в пуле уже queue_size незавершённых задач,
+        ждёт освобождения места (backpressure) не дольше timeout; по таймауту — False.
+        """
+        if not self._slots.acquire(timeout=timeout):
+            return False
+        with self._cond:
+            q = self._pending.get(key)
+            if q is None:
+                self._pending[key] = deque([item])
+                self._ready.append(key)
+                self._cond.notify()
+            else:
+                # ключ уже в работе или в очереди — задача выполнится после предыдущих
+                q.append(item)
+        return True
+
+    def stop(self, wait: bool = True) -> None:
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if wait:
+            for t in self._threads:
+                t.join()
+
+    def _worker(self) -> None:
+        while True:
+            with self._cond:
+                while not self._ready and not self._stopping:
+                    self._cond.wait()
+                if not self._ready:
+                    return
+                key = self._ready.popleft()
+                item = self._pending[key][0]
+
+            try:
+                self._fn(item)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self._cond:
+                    q = self._pending[key]
+                    q.popleft()
+                    if q:
+                        self._ready.append(key)
+                        self._cond.notify()
+                    else:
+                        del self._pending[key]
+                self._slots.release()
+                if self._on_done is not None:
+                    try:
+                        self._on_done(item)
+                    except Exception:
+                        logging.exception("on_done callback failed")
+
+
+class OffsetTracker:
+    """
+    Считает offset для getUpdates при обработке не по порядку.
+    Подтверждаем (offset) только апдейты, для которых завершены все предыдущие:
+    при падении процесса незавершённые апдейты Telegram пришлёт снова.
+    Исключение — долгий апдейт, за которым уже принято больше половины окна getUpdates (см. committed()).
+    """
+
+    def __init__(self, offset: int = 0) -> None:
+        self._cond = threading.Condition()
+        self._in_flight: set[int] = set()
+        self._max_seen = offset - 1
+
+    def isNew(self, update_id: int) -> bool:
+        with self._cond:
+            return update_id > self._max_seen
+
+    def markSeen(self, update_id: int) -> None:
+        with self._cond:
+            self._in_flight.add(update_id)
+            self._max_seen = max(self._max_seen, update_id)
+
+    def markDone(self, update_id: int) -> None:
+        with self._cond:
+            self._in_flight.discard(update_id)
+            self._cond.notify_all()
+
+    def committed(self, window: int | None = None) -> int:
+        """
+        offset для следующего getUpdates с limit=window. Пока самый старый незавершённый апдейт
+        отстаёт от последнего принятого меньше чем на половину окна, offset держится на нём. Дальше
+        ответ getUpdates почти целиком состоял бы из уже принятых апдейтов и один долгий
+        апдейт (ping, пакетная проверка) остановил бы приём для всего бота — тогда offset
+        сдвигается за последний принятый; такой апдейт после падения процесса не повторится.
+        """
+        with self._cond:
+            if self._in_flight:
+                oldest = min(self._in_flight)
+                if window is None or self._max_seen + 1 - oldest < max(1, window // 2):
+                    return oldest
+            return self._max_seen + 1
+
+    def waitProgress(self, timeout: float) -> None:
+        with self._cond:
+            self._cond.wait(timeout)
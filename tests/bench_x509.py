@@ -0,0 +1,53 @@
+"""
+Сравнение x509.parse с прежним путём через временный PEM-файл и ssl._ssl._test_decode_cert.
+Запуск из корня репозитория: python -m tests.bench_x509 [-n 5000] [файл.pem ...]
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import ssl
+import tempfile
+import time
+
+from bot.net_tools import x509
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _decode_via_file(der: bytes) -> dict:
+    # как было в tls.py до x509.py
+    pem = ssl.DER_cert_to_PEM_cert(der)
+    fd, path = tempfile.mkstemp(suffix=".pem")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(pem)
+        return ssl._ssl._test_decode_cert(path)
+    finally:
+        os.unlink(path)
+
+def _per_call_us(fn, der: bytes, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn(der)
+    return (time.perf_counter() - started) / n * 1e6
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("-n", type=int, default=5000)
+    ap.add_argument("files", nargs="*")
+    args = ap.parse_args()
+    files = args.files or [os.path.join(FIXTURES, f) for f in sorted(os.listdir(FIXTURES)) if f.endswith(".pem")]
+    for path in files:
+        with open(path) as f:
+            der = ssl.PEM_cert_to_DER_cert(f.read())
+        cert = x509.parse(der)
+        label = f"{cert.key_type} {cert.curve or cert.key_bits}"
+        tmp = _per_call_us(_decode_via_file, der, args.n)
+        new = _per_call_us(x509.parse, der, args.n)
+        print(f"{os.path.basename(path):18} {label:12} {len(der):5} B: "
+              f"tempfile {tmp:6.0f} us, x509.parse {new:5.0f} us ({tmp / new:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# тесты не трогают рабочую базу: кэш результатов (result_cache) без SQLITE_DB_PATH живёт только в памяти
+os.environ.pop("SQLITE_DB_PATH", None)
@@ -0,0 +1,137 @@
+import http.client
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from bot.http_pool import HttpPool
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+        try:
+            if self.path.endswith("/slow"):
+                time.sleep(0.2)
+            body = f"{self.path} {self.client_address[1]}".encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            # «протухшее» соединение: сервер закрывает его, не предупредив клиента
+            self.close_connection = self.path.endswith("/drop")
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers["Content-Length"]))
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.daemon_threads = True
+    srv.lock = threading.Lock()
+    srv.connections = srv.active = srv.peak = 0
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _pool(server, **kw) -> HttpPool:
+    return HttpPool(f"http://127.0.0.1:{server.server_address[1]}/bot", timeout=5, **kw)
+
+
+def test_reuses_connection(server):
+    pool = _pool(server)
+    ports = set()
+    for i in range(5):
+        status, body = pool.request("GET", f"/m{i}")
+        assert status == 200
+        path, port = body.decode().split()
+        assert path == f"/bot/m{i}"
+        ports.add(port)
+    pool.close()
+    assert server.connections == 1
+    assert len(ports) == 1
+
+
+def test_post_body(server):
+    pool = _pool(server)
+    assert pool.request("POST", "/x", body=b'{"a": 1}', headers={"Content-Type": "application/json"}) == (200, b'{"a": 1}')
+    pool.close()
+
+
+def test_stale_connection_is_retried(server):
+    pool = _pool(server)
+    assert pool.request("GET", "/drop")[0] == 200
+    time.sleep(0.1)  # сервер успевает закрыть сокет, пока соединение лежит в пуле
+    status, body = pool.request("GET", "/after")
+    pool.close()
+    assert status == 200
+    assert body.startswith(b"/bot/after ")
+    assert server.connections == 2
+
+
+def test_fresh_connection_error_is_not_retried():
+    # сервер принимает соединение и закрывает его, не ответив
+    lsock = socket.create_server(("127.0.0.1", 0))
+    accepted = []
+
+    def serve():
+        while True:
+            try:
+                c, _ = lsock.accept()
+            except OSError:
+                return
+            accepted.append(c)
+            c.recv(65536)
+            c.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    pool = HttpPool(f"http://127.0.0.1:{lsock.getsockname()[1]}", timeout=5)
+    with pytest.raises(http.client.RemoteDisconnected):
+        pool.request("GET", "/")
+    lsock.close()
+    assert len(accepted) == 1
+
+
+def test_idle_connections_are_evicted(server):
+    pool = _pool(server, idle_timeout=0.05)
+    pool.request("GET", "/a")
+    time.sleep(0.1)
+    pool.request("GET", "/b")
+    pool.close()
+    assert server.connections == 2
+
+
+def test_pool_size_is_bounded(server):
+    pool = _pool(server, max_size=2)
+    threads = [threading.Thread(target=pool.request, args=("GET", "/slow")) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    pool.close()
+    assert server.peak == 2
+    assert server.connections == 2
@@ -0,0 +1,53 @@
+import pytest
+
+from bot.net_tools import icmp, ping
+
+engine = icmp.get_engine()
+pytestmark = pytest.mark.skipif(
+    engine is None, reason="нет прав на ICMP-сокеты (net.ipv4.ping_group_range / CAP_NET_RAW)"
+)
+
+
+def test_loopback_echo():
+    s = engine.ping("127.0.0.1", count=3, interval=0.05, timeout=1.0)
+    assert s.wait(5)
+    assert s.transmitted == 3
+    assert len(s.rtts) == 3
+    assert all(r is not None and r >= 0 for r in s.rtts)
+
+
+def test_event_per_packet():
+    events = []
+    s = engine.ping("127.0.0.1", count=3, interval=0.05, timeout=1.0,
+                    on_event=lambda _s, index, rtt: events.append((index, rtt)))
+    assert s.wait(5)
+    assert sorted(i for i, _rtt in events) == [0, 1, 2]
+    assert all(rtt is not None for _i, rtt in events)
+
+
+def test_parallel_sessions_share_socket():
+    # ответы сопоставляются по (адрес, seq): сессии к одному хосту не забирают чужие ответы
+    sessions = [engine.ping("127.0.0.1", count=5, interval=0.02, timeout=1.0) for _ in range(8)]
+    for s in sessions:
+        assert s.wait(5)
+    assert all(s.transmitted == 5 and None not in s.rtts for s in sessions)
+
+
+def test_done_callback_after_finish():
+    s = engine.ping("127.0.0.1", count=1, timeout=1.0)
+    assert s.wait(5)
+    seen = []
+    s.add_done_callback(seen.append)
+    assert seen == [s]
+
+
+def test_run_summary(monkeypatch):
+    monkeypatch.setattr(ping, "PING_ENGINE", "native")
+    progress = []
+    res = ping.run("127.0.0.1", count=2, per_reply_timeout_s=1, on_progress=progress.append)
+    assert res.ok
+    assert (res.transmitted, res.received, res.loss_pct) == (2, 2, 0.0)
+    assert res.min_ms <= res.p50_ms <= res.p95_ms <= res.max_ms
+    assert res.jitter_ms is not None
+    assert "2 packets transmitted, 2 received" in res.raw_tail
+    assert progress and progress[-1].received == 2
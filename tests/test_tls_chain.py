@@ -0,0 +1,106 @@
+import os
+import socket
+import ssl
+import threading
+
+import pytest
+
+from bot.net_tools import tls
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def _pem(name: str) -> str:
+    with open(os.path.join(FIXTURES, f"{name}.pem")) as f:
+        return f.read()
+
+def _der(name: str) -> bytes:
+    return ssl.PEM_cert_to_DER_cert(_pem(name))
+
+def _issues(*names: str) -> list[str]:
+    _links, issues = tls._analyze_chain(tls._parse_chain([_der(n) for n in names]))
+    return issues
+
+
+def test_incomplete_chain():
+    issues = _issues("leaf")
+    assert len(issues) == 1
+    assert "нет сертификата издателя «LNH Test Intermediate»" in issues[0]
+
+
+def test_untrusted_root():
+    assert _issues("leaf", "intermediate", "root") == ["корень «LNH Test Root» не найден в системном хранилище"]
+
+
+def test_wrong_order():
+    assert _issues("leaf", "root", "intermediate") == [
+        "неверный порядок: издатель #0 прислан под номером #2",
+        "неверный порядок: издатель #2 прислан под номером #1",
+        "корень «LNH Test Root» не найден в системном хранилище",
+    ]
+
+
+def test_extra_certificate():
+    issues = _issues("leaf", "intermediate", "root", "ed25519")
+    assert issues[-1] == "лишние сертификаты вне пути: #3"
+
+
+def test_self_signed_leaf():
+    assert _issues("ed25519") == ["самоподписанный сертификат"]
+
+
+def test_links():
+    links, _issues = tls._analyze_chain(tls._parse_chain([_der("leaf"), _der("intermediate")]))
+    assert [(l.subject, l.issuer, l.key) for l in links] == [
+        ("lnh.test", "LNH Test Intermediate", "RSA 3072"),
+        ("LNH Test Intermediate", "LNH Test Root", "RSA 2048"),
+    ]
+    assert links[1].sig_alg == "ecdsa-with-SHA384"
+    assert not any(l.issues for l in links)
+    assert all(l.days_left > 365 for l in links)
+
+
+def test_intermediates_cached_by_fingerprint():
+    ders = [_der("leaf"), _der("intermediate")]
+    first = tls._parse_chain(ders)
+    second = tls._parse_chain(ders)
+    assert second[1][0] is first[1][0]      # промежуточный — из кэша
+    assert second[0][0] is not first[0][0]  # leaf разбирается заново
+
+
+@pytest.fixture
+def tls_server(tmp_path):
+    chain = tmp_path / "chain.pem"
+    chain.write_text(_pem("leaf") + _pem("intermediate"))
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.load_cert_chain(str(chain), os.path.join(FIXTURES, "leaf.key"))
+    lsock = socket.create_server(("127.0.0.1", 0))
+
+    def serve():
+        while True:
+            try:
+                conn, _ = lsock.accept()
+            except OSError:
+                return
+            try:
+                with ctx.wrap_socket(conn, server_side=True) as s:
+                    s.recv(1)
+            except OSError:
+                pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield lsock.getsockname()[1]
+    lsock.close()
+
+
+def test_fetch_local_server(tls_server):
+    info = tls.fetch("127.0.0.1", tls_server, timeout=5, use_cache=False)
+    assert info.ok and info.error is None
+    assert info.address == "127.0.0.1"
+    assert info.protocol in ("TLSv1.2", "TLSv1.3")
+    assert info.subject_cn == "lnh.test"
+    assert info.issuer_cn == "LNH Test Intermediate"
+    assert info.hostname_ok  # 127.0.0.1 есть в SAN
+    assert info.ocsp_urls == ["http://ocsp.lnh.test/"]
+    assert [l.subject for l in info.chain] == ["lnh.test", "LNH Test Intermediate"]
+    assert len(info.chain_issues) == 1 and "LNH Test Root" in info.chain_issues[0]
@@ -0,0 +1,160 @@
+import socket
+import threading
+import time
+
+import pytest
+
+from bot.net_tools import connect, whois_client
+
+
+class _WhoisServer:
+    """Порт-43-подобный сервер на 127.0.0.1: читает строку запроса, отвечает reply(запрос) и закрывает."""
+
+    def __init__(self, reply, delay: float = 0.0) -> None:
+        self.reply = reply
+        self.delay = delay
+        self.queries: list[str] = []
+        self._sock = socket.create_server(("127.0.0.1", 0))
+        self.port = self._sock.getsockname()[1]
+        self.addr = f"127.0.0.1:{self.port}"
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self) -> None:
+        while True:
+            try:
+                conn, _ = self._sock.accept()
+            except OSError:
+                return
+            with conn:
+                buf = b""
+                while not buf.endswith(b"\r\n"):
+                    chunk = conn.recv(1024)
+                    if not chunk:
+                        break
+                    buf += chunk
+                q = buf.decode().strip()
+                self.queries.append(q)
+                time.sleep(self.delay)
+                try:
+                    data = self.reply(q)
+                    conn.sendall(data.encode() if isinstance(data, str) else data)
+                except OSError:
+                    pass
+
+    def close(self) -> None:
+        self._sock.close()
+
+
+@pytest.fixture
+def servers():
+    started = []
+
+    def make(reply, delay: float = 0.0) -> _WhoisServer:
+        srv = _WhoisServer(reply if callable(reply) else (lambda _q: reply), delay)
+        started.append(srv)
+        return srv
+
+    yield make
+    for srv in started:
+        srv.close()
+
+
+def _registry_chain(make, referral: str):
+    registrar = make(lambda q: f"Domain Name: {q.upper()}\nRegistrant Organization: Example Ltd\n")
+    registry = make(lambda q: f"Domain Name: {q.upper()}\n   Registrar WHOIS Server: {referral.format(registrar.port)}\n")
+    iana = make(lambda q: f"% IANA WHOIS server\n\ndomain:       {q.upper()}\nwhois:        {registry.addr}\n")
+    return iana, registry, registrar
+
+
+def test_follows_registrar_referral(servers, monkeypatch):
+    iana, registry, registrar = _registry_chain(servers, "127.0.0.1:{}")
+    monkeypatch.setattr(whois_client, "WHOIS_IANA_SERVER", iana.addr)
+    # стенд на loopback и не на порту 43: разрешаем ровно его
+    monkeypatch.setattr(whois_client, "WHOIS_PORT", registrar.port)
+    monkeypatch.setattr(connect, "is_public_address", lambda a: True)
+
+    res = whois_client.lookup_domain("Example.T1.")
+    assert res.domain == "example.t1"
+    assert [h.server for h in res.hops] == [registry.addr, registrar.addr]
+    assert all(h.error is None and h.ms is not None for h in res.hops)
+    assert iana.queries == ["t1"]
+    assert registry.queries == registrar.queries == ["example.t1"]
+    assert "Registrant Organization: Example Ltd" in res.text
+    assert res.text.index("Registrar WHOIS Server") < res.text.index("Registrant Organization")
+
+
+def test_server_index_is_cached(servers, monkeypatch):
+    iana, registry, registrar = _registry_chain(servers, "")
+    monkeypatch.setattr(whois_client, "WHOIS_IANA_SERVER", iana.addr)
+    whois_client.lookup_domain("a.t2")
+    whois_client.lookup_domain("b.t2")
+    assert iana.queries == ["t2"]
+    assert registry.queries == ["a.t2", "b.t2"]
+
+
+def test_ignores_referral_to_other_port(servers, monkeypatch):
+    iana, registry, registrar = _registry_chain(servers, "127.0.0.1:{}")
+    monkeypatch.setattr(whois_client, "WHOIS_IANA_SERVER", iana.addr)
+    monkeypatch.setattr(connect, "is_public_address", lambda a: True)
+
+    res = whois_client.lookup_domain("example.t3")
+    assert [h.server for h in res.hops] == [registry.addr]
+    assert registrar.queries == []
+
+
+@pytest.mark.parametrize("scheme", ["rwhois://", "http://"])
+def test_ignores_non_whois_scheme(servers, monkeypatch, scheme):
+    iana, registry, registrar = _registry_chain(servers, scheme + "127.0.0.1:{}")
+    monkeypatch.setattr(whois_client, "WHOIS_IANA_SERVER", iana.addr)
+    monkeypatch.setattr(whois_client, "WHOIS_PORT", registrar.port)
+    monkeypatch.setattr(connect, "is_public_address", lambda a: True)
+
+    res = whois_client.lookup_domain(f"example.t4{scheme[0]}")
+    assert len(res.hops) == 1
+    assert registrar.queries == []
+
+
+def test_rejects_referral_to_private_address(servers, monkeypatch):
+    iana, registry, registrar = _registry_chain(servers, "127.0.0.1:{}")
+    monkeypatch.setattr(whois_client, "WHOIS_IANA_SERVER", iana.addr)
+    monkeypatch.setattr(whois_client, "WHOIS_PORT", registrar.port)
+
+    res = whois_client.lookup_domain("example.t5")
+    assert [h.server for h in res.hops] == [registry.addr, registrar.addr]
+    assert "непубличные" in res.hops[1].error
+    assert registrar.queries == []
+    assert res.text.startswith("Domain Name: EXAMPLE.T5")  # ответ реестра остаётся
+
+
+def test_hop_timeout(servers, monkeypatch):
+    slow = servers("Domain Name: SLOW.T6\n", delay=2.0)
+    iana = servers(f"whois: {slow.addr}\n")
+    monkeypatch.setattr(whois_client, "WHOIS_IANA_SERVER", iana.addr)
+    monkeypatch.setattr(whois_client, "WHOIS_HOP_TIMEOUT", 0.3)
+
+    started = time.monotonic()
+    with pytest.raises(whois_client.WhoisError, match="timed out"):
+        whois_client.lookup_domain("slow.t6")
+    assert time.monotonic() - started < 1.5
+
+
+def test_zone_without_server(servers, monkeypatch):
+    iana = servers("% IANA WHOIS server\n\ndomain:       T7\nstatus:       ACTIVE\n")
+    monkeypatch.setattr(whois_client, "WHOIS_IANA_SERVER", iana.addr)
+    with pytest.raises(whois_client.WhoisError, match="нет WHOIS-сервера"):
+        whois_client.lookup_domain("example.t7")
+
+
+def test_response_is_truncated(servers):
+    big = servers("x" * 10000)
+    text, truncated = whois_client.query(big.addr, "q", timeout=5, max_bytes=1000)
+    assert truncated and len(text) == 1000
+    text, truncated = whois_client.query(big.addr, "q", timeout=5)
+    assert not truncated and len(text) == 10000
+
+
+def test_latin1_response(servers):
+    # часть ccTLD-серверов отвечает не в UTF-8
+    srv = servers(b"Titulaire: Soci\xe9t\xe9\n")
+    text, _ = whois_client.query(srv.addr, "q", timeout=5)
+    assert text == "Titulaire: Société\n"
@@ -0,0 +1,100 @@
+import datetime as dt
+import ipaddress
+import os
+import ssl
+
+import pytest
+
+from bot.net_tools import x509
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+CERTS = ["root", "intermediate", "leaf", "ed25519"]
+
+
+def _path(name: str) -> str:
+    return os.path.join(FIXTURES, f"{name}.pem")
+
+def _der(name: str) -> bytes:
+    with open(_path(name)) as f:
+        return ssl.PEM_cert_to_DER_cert(f.read())
+
+def _ssl_time(s: str) -> dt.datetime:
+    return dt.datetime.utcfromtimestamp(ssl.cert_time_to_seconds(s))
+
+def _san(kind: str, value: str) -> tuple[str, str]:
+    if kind == "IP Address":
+        value = str(ipaddress.ip_address(value.strip()))  # ssl пишет IPv6 без сокращений
+    return kind, value
+
+
+@pytest.mark.skipif(not hasattr(ssl._ssl, "_test_decode_cert"), reason="нет ssl._ssl._test_decode_cert")
+@pytest.mark.parametrize("name", CERTS)
+def test_matches_ssl_decoder(name):
+    ref = ssl._ssl._test_decode_cert(_path(name))
+    cert = x509.parse(_der(name))
+    assert cert.version == ref["version"]
+    assert cert.serial == ref["serialNumber"]
+    assert cert.subject == [rdn[0] for rdn in ref["subject"]]
+    assert cert.issuer == [rdn[0] for rdn in ref["issuer"]]
+    assert cert.not_before == _ssl_time(ref["notBefore"])
+    assert cert.not_after == _ssl_time(ref["notAfter"])
+    assert cert.san == [_san(k, v) for k, v in ref.get("subjectAltName", ())]
+    assert cert.ocsp_urls == list(ref.get("OCSP", ()))
+    assert cert.ca_issuers == list(ref.get("caIssuers", ()))
+
+
+def test_leaf_fields():
+    cert = x509.parse(_der("leaf"))
+    assert (cert.key_type, cert.key_bits, cert.curve) == ("RSA", 3072, None)
+    assert cert.signature_algorithm == "sha256WithRSAEncryption"
+    assert cert.subject_cn == "lnh.test"
+    assert cert.name_attr(cert.subject, "organizationalUnitName") == "Тест"
+    assert cert.is_ca is False
+    assert not cert.self_issued
+
+
+def test_key_types():
+    root = x509.parse(_der("root"))
+    assert (root.key_type, root.key_bits, root.curve) == ("EC", 256, "P-256")
+    ed = x509.parse(_der("ed25519"))
+    assert (ed.key_type, ed.key_bits) == ("Ed25519", 256)
+    assert ed.self_issued
+
+
+def test_issued_by():
+    root, inter, leaf = (x509.parse(_der(n)) for n in ("root", "intermediate", "leaf"))
+    assert leaf.issued_by(inter)
+    assert inter.issued_by(root)
+    assert not leaf.issued_by(root)
+    assert root.self_issued and root.is_ca
+
+
+@pytest.mark.parametrize("host, ok", [
+    ("lnh.test", True),
+    ("LNH.test.", True),
+    ("www.lnh.test", True),
+    ("a.b.lnh.test", False),
+    ("lnh.test.evil", False),
+    ("127.0.0.1", True),
+    ("2001:db8:0::1", True),
+    ("127.0.0.2", False),
+])
+def test_matches_hostname(host, ok):
+    assert x509.parse(_der("leaf")).matches_hostname(host) is ok
+
+
+def test_accepts_memoryview():
+    der = _der("leaf")
+    assert x509.parse(memoryview(der)) == x509.parse(der)
+
+
+@pytest.mark.parametrize("data", [b"", b"\x30\x03\x02\x01", b"not a certificate", b"\x30\x82\xff\xff" + b"\0" * 16])
+def test_malformed_input(data):
+    with pytest.raises(x509.CertificateError):
+        x509.parse(data)
+
+
+def test_truncated_certificate():
+    der = _der("leaf")
+    with pytest.raises(x509.CertificateError):
+        x509.parse(der[: len(der) // 2])